@@ -0,0 +1,105 @@
+"""
+Measure the per-block cost of setting up a deflate compressor.
+
+For each level, reports the microseconds it takes to create a compressor and
+to copy a template, with and without a 32 KiB preset dictionary. For each
+block size and level, it also reports the time compress_block takes per
+block with a new dictionary for every block against one dictionary repeated,
+which new_compressor serves from a per-thread template:
+
+    python benchmarks/bench_compressobj.py --repeats 2000
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from pigz_python.backends import BACKENDS, get_backend
+from pigz_python.compressor import DICT_SIZE
+from pigz_python.workers import compress_block
+
+LOREM_IPSUM = Path(__file__).parent.parent / "tests" / "lorem_ipsum.txt"
+
+
+def per_call_us(func, repeats):
+    """Return the mean wall time of `func()` in microseconds."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def bench_setup(backend, level, zdict, repeats):
+    """Return the microseconds to create a compressor and to copy one."""
+    template = backend.compressobj(level, zdict)
+    return {
+        "create_us": per_call_us(lambda: backend.compressobj(level, zdict), repeats),
+        "copy_us": per_call_us(template.copy, repeats),
+    }
+
+
+def bench_blocks(backend, level, block_size, text, repeats):
+    """
+    Return the microseconds compress_block takes per block when every block
+    has its own dictionary, and when they all have the same one.
+    """
+    end = DICT_SIZE + block_size
+    block = text[DICT_SIZE:end]
+    # Dictionaries that differ from the first byte on, as consecutive windows do
+    windows = [bytes([number % 256]) + text[1:DICT_SIZE] for number in range(64)]
+    counter = iter(range(repeats * 2))
+
+    def fresh():
+        window = windows[next(counter) % len(windows)]
+        compress_block(block, level, False, window, backend.name)
+
+    def repeated():
+        compress_block(block, level, False, windows[0], backend.name)
+
+    fresh_us = per_call_us(fresh, repeats)
+    repeated_us = per_call_us(repeated, repeats)
+    return {
+        "fresh_dictionary_us": fresh_us,
+        "repeated_dictionary_us": repeated_us,
+        "saved_us": fresh_us - repeated_us,
+        "saved_percent": (fresh_us - repeated_us) / fresh_us * 100,
+    }
+
+
+def main():
+    """Parse arguments, run the benchmarks and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=BACKENDS, default="zlib")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+    parser.add_argument("--block-kb", type=int, nargs="+", default=[4, 16, 64, 128])
+    parser.add_argument("--repeats", type=int, default=1000)
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend)
+    text = LOREM_IPSUM.read_bytes()
+    while len(text) < DICT_SIZE + max(args.block_kb) * 1000:
+        text += text
+    zdict = text[:DICT_SIZE]
+
+    setup = {}
+    blocks = {}
+    for level in args.levels:
+        setup[level] = {
+            "no_dictionary": bench_setup(backend, level, None, args.repeats),
+            "dictionary": bench_setup(backend, level, zdict, args.repeats),
+        }
+        for block_kb in args.block_kb:
+            blocks[f"{block_kb}KB level {level}"] = bench_blocks(
+                backend, level, block_kb * 1000, text, args.repeats
+            )
+
+    print(
+        json.dumps(
+            {"backend": backend.name, "setup": setup, "blocks": blocks}, indent=2
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
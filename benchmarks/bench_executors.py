@@ -0,0 +1,83 @@
+"""
+Compare how the thread and process executors scale with the worker count.
+
+Compresses the same file with 1, 2, 4, ... workers (up to --max-workers) on
+each executor and reports throughput and scaling efficiency relative to one
+worker on the same executor:
+
+    python benchmarks/bench_executors.py --size-mb 64 --max-workers 64
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from pigz_python import compress_file
+
+LOREM_IPSUM = Path(__file__).parent.parent / "tests" / "lorem_ipsum.txt"
+
+
+def make_input(path, size):
+    """Write `size` bytes of text mixed with random bytes to `path`."""
+    text = LOREM_IPSUM.read_bytes()
+    with open(path, "wb") as output:
+        written = 0
+        while written < size:
+            piece = (text + os.urandom(len(text) // 4))[: size - written]
+            output.write(piece)
+            written += len(piece)
+
+
+def worker_counts(max_workers):
+    """Yield 1, 2, 4, ... up to and including max_workers."""
+    workers = 1
+    while workers < max_workers:
+        yield workers
+        workers *= 2
+    yield max_workers
+
+
+def main():
+    """Run the sweep and print one JSON record per executor and worker count."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=32)
+    parser.add_argument("--blocksize", type=int, default=128)
+    parser.add_argument("--compresslevel", type=int, default=6)
+    parser.add_argument("--max-workers", type=int, default=min(os.cpu_count(), 64))
+    args = parser.parse_args()
+
+    size = args.size_mb * 1000 * 1000
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, "input.bin")
+        make_input(path, size)
+        for executor in ("thread", "process"):
+            baseline = None
+            for workers in worker_counts(args.max_workers):
+                start = time.perf_counter()
+                compress_file(
+                    path,
+                    compresslevel=args.compresslevel,
+                    blocksize=args.blocksize,
+                    workers=workers,
+                    executor=executor,
+                )
+                mb_per_s = size / (time.perf_counter() - start) / 1e6
+                baseline = baseline or mb_per_s
+                results.append(
+                    {
+                        "executor": executor,
+                        "workers": workers,
+                        "mb_per_s": mb_per_s,
+                        "scaling_efficiency": mb_per_s / (baseline * workers),
+                    }
+                )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
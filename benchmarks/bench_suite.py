@@ -0,0 +1,253 @@
+"""
+Benchmark PigzFile across corpora, block sizes, compression levels and
+worker counts, against single-threaded gzip at the same level.
+
+Every corpus is generated from a fixed seed, so runs are comparable between
+machines and checkouts. Each measurement runs in a fresh process so that its
+peak RSS is its own. Results are printed as JSON (and written to --output if
+given) together with enough metadata to track them over time:
+
+    python benchmarks/bench_suite.py --size-mb 32 --output results.json
+"""
+
+import argparse
+import gzip
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import pigz_python
+from pigz_python import compress_file
+
+LOREM_IPSUM = Path(__file__).parent.parent / "tests" / "lorem_ipsum.txt"
+CORPORA = ("random", "text", "logs", "zeros", "mixed")
+SEED = 20240101
+
+LOG_LEVELS = ("DEBUG", "INFO", "INFO", "INFO", "WARNING", "ERROR")
+LOG_MESSAGES = (
+    "GET /api/v1/items/{} 200",
+    "POST /api/v1/orders 201 order_id={}",
+    "cache miss key=user:{}",
+    "retrying upstream request attempt={}",
+    "connection reset by peer client={}",
+)
+
+
+def generate_random(size, rng):
+    """Incompressible bytes."""
+    return rng.randbytes(size)
+
+
+def generate_text(size, _rng):
+    """Repeated lorem ipsum, like tests/lorem_ipsum.txt."""
+    text = LOREM_IPSUM.read_bytes()
+    return (text * (size // len(text) + 1))[:size]
+
+
+def generate_logs(size, rng):
+    """Application log lines with timestamps, levels and varying fields."""
+    lines = []
+    length = 0
+    timestamp = 1_700_000_000.0
+    while length < size:
+        timestamp += rng.expovariate(50)
+        message = rng.choice(LOG_MESSAGES).format(rng.randrange(100_000))
+        line = (
+            f"{datetime.fromtimestamp(timestamp, timezone.utc).isoformat()} "
+            f"{rng.choice(LOG_LEVELS):<7} worker-{rng.randrange(32):02d} "
+            f"10.0.{rng.randrange(256)}.{rng.randrange(256)} {message}\n"
+        ).encode()
+        lines.append(line)
+        length += len(line)
+    return b"".join(lines)[:size]
+
+
+def generate_zeros(size, _rng):
+    """Maximally compressible bytes."""
+    return bytes(size)
+
+
+def generate_mixed(size, rng):
+    """64 KiB pieces of the other corpora, interleaved at random."""
+    piece_size = 64 * 1024
+    generators = (generate_random, generate_text, generate_logs, generate_zeros)
+    pieces = []
+    for start in range(0, size, piece_size):
+        length = min(piece_size, size - start)
+        pieces.append(rng.choice(generators)(length, rng))
+    return b"".join(pieces)
+
+
+GENERATORS = {
+    "random": generate_random,
+    "text": generate_text,
+    "logs": generate_logs,
+    "zeros": generate_zeros,
+    "mixed": generate_mixed,
+}
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None if unknown."""
+    # ru_maxrss survives exec, so in a spawned child it can report the
+    # parent's peak; VmHWM starts over with the new program
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_pigz(path, compresslevel, blocksize, workers):
+    """Compress `path` with PigzFile; return (seconds, output bytes, peak RSS)."""
+    start = time.perf_counter()
+    compress_file(
+        path, compresslevel=compresslevel, blocksize=blocksize, workers=workers
+    )
+    elapsed = time.perf_counter() - start
+    return elapsed, Path(str(path) + ".gz").stat().st_size, peak_rss_bytes()
+
+
+def run_gzip(path, compresslevel):
+    """Compress `path` with the gzip module; return the same as run_pigz."""
+    output = Path(str(path) + ".gz")
+    start = time.perf_counter()
+    with open(path, "rb") as source:
+        with gzip.open(output, "wb", compresslevel=compresslevel) as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+    elapsed = time.perf_counter() - start
+    return elapsed, output.stat().st_size, peak_rss_bytes()
+
+
+def measure(function, *args, repeats=1):
+    """
+    Run `function(*args)` `repeats` times, each in a fresh process.
+    Return the median time, the output size and the highest peak RSS.
+    """
+    runs = []
+    for _ in range(repeats):
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as process:
+            runs.append(process.submit(function, *args).result())
+    rss = [run[2] for run in runs if run[2] is not None]
+    return statistics.median(run[0] for run in runs), runs[0][1], max(rss, default=None)
+
+
+def record(corpus, size, tool, settings, result):
+    """Build one result record from a measurement."""
+    elapsed, output_size, rss = result
+    return {
+        "corpus": corpus,
+        "tool": tool,
+        **settings,
+        "input_bytes": size,
+        "output_bytes": output_size,
+        "ratio": size / output_size,
+        "seconds": elapsed,
+        "mb_per_s": size / elapsed / 1e6,
+        "peak_rss_bytes": rss,
+    }
+
+
+def parse_list(value):
+    """Parse a comma separated list of integers."""
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    """Parse arguments, run the sweep and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=16)
+    parser.add_argument("--corpora", default=",".join(CORPORA))
+    parser.add_argument("--blocksizes", type=parse_list, default=[32, 128, 512])
+    parser.add_argument("--levels", type=parse_list, default=[1, 6, 9])
+    parser.add_argument(
+        "--workers",
+        type=parse_list,
+        default=sorted({1, 2, 4, os.cpu_count()}),
+    )
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    size = args.size_mb * 1000 * 1000
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for corpus in args.corpora.split(","):
+            path = Path(directory, f"{corpus}.bin")
+            path.write_bytes(GENERATORS[corpus](size, random.Random(SEED)))
+            for level in args.levels:
+                baseline = record(
+                    corpus,
+                    size,
+                    "gzip",
+                    {"compresslevel": level, "blocksize": None, "workers": 1},
+                    measure(run_gzip, path, level, repeats=args.repeats),
+                )
+                baseline["scaling_efficiency"] = 1.0
+                results.append(baseline)
+                for blocksize in args.blocksizes:
+                    for workers in args.workers:
+                        result = record(
+                            corpus,
+                            size,
+                            "pigz_python",
+                            {
+                                "compresslevel": level,
+                                "blocksize": blocksize,
+                                "workers": workers,
+                            },
+                            measure(
+                                run_pigz,
+                                path,
+                                level,
+                                blocksize,
+                                workers,
+                                repeats=args.repeats,
+                            ),
+                        )
+                        result["scaling_efficiency"] = result["mb_per_s"] / (
+                            baseline["mb_per_s"] * workers
+                        )
+                        results.append(result)
+
+    report = json.dumps(
+        {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "pigz_python_version": pigz_python.__version__,
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": SEED,
+            "results": results,
+        },
+        indent=2,
+    )
+    if args.output:
+        Path(args.output).write_text(report + "\n", encoding="utf-8")
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
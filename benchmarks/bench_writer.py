@@ -0,0 +1,90 @@
+"""
+Benchmark the in-order writer of PigzFile.
+
+Reports the latency of compressing many small files and the throughput of
+compressing one large file. Run it on two checkouts to compare them:
+
+    python benchmarks/bench_writer.py --large-mb 64
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from pigz_python import compress_file
+
+LOREM_IPSUM = Path(__file__).parent.parent / "tests" / "lorem_ipsum.txt"
+
+
+def make_input(path, size):
+    """Write `size` bytes of text-like data (repeated lorem ipsum) to `path`."""
+    text = LOREM_IPSUM.read_bytes()
+    with open(path, "wb") as output:
+        written = 0
+        while written < size:
+            piece = text[: size - written]
+            output.write(piece)
+            written += len(piece)
+
+
+def bench_small_files(directory, size, repeats, workers):
+    """Return per-file wall times (seconds) for compressing a small file."""
+    path = Path(directory, "small.txt")
+    make_input(path, size)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        compress_file(path, workers=workers)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_large_file(directory, size, workers, blocksize):
+    """Return the throughput (MB/s of input) for compressing one large file."""
+    path = Path(directory, "large.txt")
+    make_input(path, size)
+    start = time.perf_counter()
+    compress_file(path, workers=workers, blocksize=blocksize)
+    elapsed = time.perf_counter() - start
+    return size / elapsed / 1e6
+
+
+def main():
+    """Parse arguments, run both benchmarks and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--small-kb", type=int, default=4)
+    parser.add_argument("--small-repeats", type=int, default=20)
+    parser.add_argument("--large-mb", type=int, default=32)
+    parser.add_argument("--blocksize", type=int, default=128)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        small = bench_small_files(
+            directory, args.small_kb * 1000, args.small_repeats, args.workers
+        )
+        large = bench_large_file(
+            directory, args.large_mb * 1000 * 1000, args.workers, args.blocksize
+        )
+
+    print(
+        json.dumps(
+            {
+                "workers": args.workers,
+                "small_file_bytes": args.small_kb * 1000,
+                "small_file_latency_ms_median": statistics.median(small) * 1000,
+                "small_file_latency_ms_max": max(small) * 1000,
+                "large_file_bytes": args.large_mb * 1000 * 1000,
+                "large_file_mb_per_s": large,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
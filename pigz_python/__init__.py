@@ -4,4 +4,14 @@ from importlib.metadata import version
 
 __version__ = version("pigz-python")
 
-from pigz_python.pigz_python import PigzFile, compress_file  # noqa
+from pigz_python.aio import compress_file_async, compress_stream_async  # noqa
+from pigz_python.batch import compress_files  # noqa
+from pigz_python.decompressor import (  # noqa
+    PigzReader,
+    decompress_bytes,
+    decompress_file,
+)
+from pigz_python.index import IndexedGzipReader, read_range  # noqa
+from pigz_python.pigz_python import PigzFile, compress_bytes, compress_file  # noqa
+from pigz_python.pool import PigzPool  # noqa
+from pigz_python.writer import PigzWriter  # noqa
@@ -0,0 +1,118 @@
+"""
+Adaptive compression level: pick the level of each upcoming chunk so that
+compression keeps up with a target throughput or finishes by a deadline,
+with the best ratio that allows.
+
+The cost of each level, in seconds per input byte, is measured from the
+chunks compressed at it. The pool's capacity at a level is then the number
+of workers over that cost (block latency already includes any contention
+for CPUs). Before each chunk is handed to the pool, the level is lowered if
+the pool has a backlog and can't reach the required rate at the current
+level, and raised if the next level up is expected to reach it with some
+headroom. Without a backlog the pool is waiting for input, so a lower level
+wouldn't help.
+"""
+
+import time
+from threading import Lock
+
+# A higher level is only used if its expected capacity is this much above
+# the required rate, so the level doesn't flip back and forth
+ADAPTIVE_HEADROOM = 1.2
+# Weight of the latest chunk in the running cost of its level
+COST_SMOOTHING = 0.3
+# Cost of the next level up relative to the current one, until measured
+UNMEASURED_LEVEL_COST = 1.5
+# Share of the in-flight window that must be taken for the pool to be behind
+BACKLOG_FRACTION = 0.75
+# Lowest level used
+MIN_ADAPTIVE_LEVEL = 1
+
+
+class AdaptiveLevel:  # pylint: disable=too-many-instance-attributes
+    """
+    Chooses the level of each chunk, between MIN_ADAPTIVE_LEVEL and
+    `max_level`, to compress at `target_throughput` bytes per second or
+    more, or to finish `expected_size` bytes within `deadline` seconds of
+    being created. Exactly one of the two targets must be given.
+    `next_level` is called by the reader, `record` by the workers.
+    """
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        max_level,
+        workers,
+        target_throughput=None,
+        deadline=None,
+        expected_size=None,
+    ):
+        if (target_throughput is None) == (deadline is None):
+            raise ValueError("Give either a target throughput or a deadline")
+        if deadline is not None and expected_size is None:
+            raise ValueError("A deadline needs the size of the input")
+        self.max_level = max_level
+        self.workers = workers
+        self.target_throughput = target_throughput
+        self.deadline = deadline
+        self.expected_size = expected_size
+        # Start where the target is easiest to reach, and work up
+        self.level = min(MIN_ADAPTIVE_LEVEL, max_level)
+        # Running seconds per input byte of each level measured so far
+        self.costs = {}
+        self.started = time.perf_counter()
+        self._lock = Lock()
+
+    def required_rate(self, bytes_in):
+        """
+        Input bytes per second needed from now on, after `bytes_in` bytes.
+        """
+        if self.target_throughput is not None:
+            return self.target_throughput
+        remaining = max(self.expected_size - bytes_in, 0)
+        time_left = self.deadline - (time.perf_counter() - self.started)
+        if time_left <= 0:
+            return float("inf") if remaining else 0.0
+        return remaining / time_left
+
+    def capacity(self, level):
+        """
+        Input bytes per second the pool is expected to manage at `level`,
+        or None if it hasn't been measured.
+        """
+        cost = self.costs.get(level)
+        if not cost:
+            return None
+        return self.workers / cost
+
+    def next_level(self, bytes_in, backlog):
+        """
+        Return the level for the next chunk, after `bytes_in` bytes of input;
+        `backlog` is whether the pool has most of the in-flight window.
+        """
+        with self._lock:
+            required = self.required_rate(bytes_in)
+            capacity = self.capacity(self.level)
+            if capacity is None:
+                # Wait for a chunk compressed at this level to judge it
+                return self.level
+            if backlog and capacity < required and self.level > MIN_ADAPTIVE_LEVEL:
+                self.level -= 1
+            elif self.level < self.max_level:
+                higher = self.capacity(self.level + 1)
+                if higher is None:
+                    higher = capacity / UNMEASURED_LEVEL_COST
+                if higher >= required * ADAPTIVE_HEADROOM:
+                    self.level += 1
+            return self.level
+
+    def record(self, level, nbytes, seconds):
+        """Account for a chunk of `nbytes` compressed at `level`."""
+        if not nbytes:
+            return
+        cost = seconds / nbytes
+        with self._lock:
+            previous = self.costs.get(level)
+            if previous is not None:
+                cost = previous + COST_SMOOTHING * (cost - previous)
+            self.costs[level] = cost
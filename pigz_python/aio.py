@@ -0,0 +1,169 @@
+"""
+Asyncio interface to the parallel compressor.
+Compression still runs on the worker pool and the write thread; the event
+loop only awaits results, so it is never blocked by compression.
+"""
+
+import asyncio
+import contextlib
+from pathlib import Path
+from threading import Condition, Event, get_ident
+
+from pigz_python.pigz_python import PigzFile
+from pigz_python.writer import PigzWriter
+
+# Compressed pieces that may wait for the consumer of compress_stream_async
+DEFAULT_MAX_PENDING_OUTPUT = 16
+
+# Marks the end of the compressed stream in the output queue
+_END_OF_STREAM = object()
+
+
+async def compress_file_async(source_file, **options):
+    """
+    Compress a file or directory like compress_file without blocking the
+    event loop, and return its CompressionStats. `options` are passed to
+    PigzFile, which is created off the event loop too, as that may start
+    worker processes or probe the input for "auto" settings.
+    If the awaiting task is cancelled, compression is stopped and the
+    partial output is removed, unless it was checkpointed: then the output
+    and its last checkpoint are kept, so compressing again with
+    `resume=True` carries on from there.
+    """
+    loop = asyncio.get_running_loop()
+    pigz_file = None
+    cancelled = Event()
+
+    def compress():
+        nonlocal pigz_file
+        pigz_file = PigzFile(source_file, **options)
+        if cancelled.is_set():
+            # Cancelled while it was being created
+            pigz_file.abort()
+        pigz_file.process_compression_target()
+        return pigz_file.stats
+
+    compression = loop.run_in_executor(None, compress)
+    try:
+        return await asyncio.shield(compression)
+    except asyncio.CancelledError:
+        cancelled.set()
+        if pigz_file is not None:
+            pigz_file.abort()
+        with contextlib.suppress(Exception):
+            await compression
+        if pigz_file is None:
+            raise
+        paths = (
+            pigz_file.output_path,
+            pigz_file.index_filename,
+            pigz_file.checkpoint_filename,
+        )
+        if pigz_file.checkpoint_filename is not None:
+            # Only a checkpoint being written when compression stopped is
+            # dropped; the output is kept if there is one to resume from
+            paths = (Path(f"{pigz_file.checkpoint_filename}.tmp"),)
+            if not pigz_file.checkpoint_filename.exists():
+                paths += (pigz_file.output_path,)
+        for path in paths:
+            if path is not None:
+                with contextlib.suppress(OSError):
+                    path.unlink()
+        raise
+
+
+class _AsyncSink:  # pylint: disable=too-many-instance-attributes
+    """
+    File object PigzWriter writes compressed data to, from its write thread.
+    Data is handed to the event loop through a queue; the write thread waits
+    while `max_pending` pieces are waiting to be consumed, which in turn
+    stops PigzWriter from accepting more input.
+    Writes made on the event loop thread itself (the gzip header, written
+    when PigzWriter starts) never wait; they are sent with the next piece.
+    """
+
+    def __init__(self, loop, max_pending):
+        self.queue = asyncio.Queue()
+        self._loop = loop
+        self._loop_thread = get_ident()
+        self._held = bytearray()
+        self._max_pending = max_pending
+        self._pending = 0
+        self._closed = False
+        self._condition = Condition()
+
+    def write(self, data):
+        """Queue a piece of compressed data for the event loop."""
+        if get_ident() == self._loop_thread:
+            self._held += data
+            return len(data)
+        with self._condition:
+            while self._pending >= self._max_pending and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                raise RuntimeError("Compressed stream is no longer being read")
+            self._pending += 1
+            piece = bytes(self._held + data)
+            self._held.clear()
+        self._loop.call_soon_threadsafe(self.queue.put_nowait, piece)
+        return len(data)
+
+    def flush(self):
+        """Nothing is buffered here."""
+
+    async def get(self):
+        """Return the next piece of compressed data, or _END_OF_STREAM."""
+        item = await self.queue.get()
+        if isinstance(item, bytes):
+            with self._condition:
+                self._pending -= 1
+                self._condition.notify()
+        return item
+
+    def close(self):
+        """Fail writes from now on, waking the write thread if it waits."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+async def compress_stream_async(
+    chunks, max_pending_output=DEFAULT_MAX_PENDING_OUTPUT, **options
+):
+    """
+    Gzip the bytes-like objects from the async iterable `chunks` (for example
+    a request body) and yield the compressed stream piece by piece.
+    `options` are passed to PigzWriter.
+    Input is only pulled from `chunks` as fast as the output is consumed.
+    """
+    loop = asyncio.get_running_loop()
+    sink = _AsyncSink(loop, max_pending_output)
+    writer = PigzWriter(sink, **options)
+
+    async def feed():
+        try:
+            async for chunk in chunks:
+                # PigzWriter.write blocks while the pipeline is full
+                await loop.run_in_executor(None, writer.write, chunk)
+            await loop.run_in_executor(None, writer.close)
+        except Exception as error:  # pylint: disable=broad-except
+            sink.queue.put_nowait(error)
+        else:
+            sink.queue.put_nowait(_END_OF_STREAM)
+
+    feeder = asyncio.ensure_future(feed())
+    try:
+        while True:
+            item = await sink.get()
+            if item is _END_OF_STREAM:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Unblocks the write thread and the feeder if the consumer stopped early
+        sink.close()
+        feeder.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await feeder
+        await loop.run_in_executor(None, writer.abort)
@@ -0,0 +1,122 @@
+"""
+Deflate implementations the pipeline can run on. Any module with zlib's
+interface will do; besides the standard library's zlib, the optional
+packages zlib-ng (`zlib_ng.zlib_ng`) and python-isal (`isal.isal_zlib`)
+are used when installed and asked for.
+"""
+
+import importlib
+import warnings
+import zlib
+from functools import lru_cache
+
+# Backend names, and the module each one is imported from
+BACKEND_MODULES = {
+    "zlib": "zlib",
+    "zlib-ng": "zlib_ng.zlib_ng",
+    "isal": "isal.isal_zlib",
+}
+# Tried in this order for backend="auto": fastest first
+AUTO_BACKEND_ORDER = ("isal", "zlib-ng", "zlib")
+BACKENDS = tuple(BACKEND_MODULES) + ("auto",)
+DEFAULT_BACKEND = "zlib"
+
+# ISA-L has compression levels 0 to 3; spread gzip's 1 to 9 over them
+_ISAL_LEVELS = {1: 0, 2: 1, 3: 1, 4: 1, 5: 2, 6: 2, 7: 2, 8: 3, 9: 3}
+
+
+class DeflateBackend:
+    """
+    A deflate implementation: raw deflate streams in both directions and
+    CRC-32, with the options the pipeline needs.
+    """
+
+    def __init__(self, name, module, levels=None):
+        self.name = name
+        self.module = module
+        self._levels = levels
+
+    def compress_level(self, compression_level):
+        """The backend's level for a gzip compression level (1 to 9)"""
+        if self._levels is None:
+            return compression_level
+        return self._levels[compression_level]
+
+    def compressobj(self, compression_level, zdict=None):
+        """
+        Return a raw deflate compressor, primed with `zdict` if given.
+        """
+        options = {}
+        if zdict:
+            options["zdict"] = zdict
+        return self.module.compressobj(
+            level=self.compress_level(compression_level),
+            method=zlib.DEFLATED,
+            wbits=-zlib.MAX_WBITS,
+            memLevel=zlib.DEF_MEM_LEVEL,
+            strategy=zlib.Z_DEFAULT_STRATEGY,
+            **options,
+        )
+
+    def decompressobj(self, zdict=None):
+        """
+        Return a raw deflate decompressor, primed with `zdict` if given.
+        """
+        if zdict:
+            return self.module.decompressobj(-zlib.MAX_WBITS, zdict=zdict)
+        return self.module.decompressobj(-zlib.MAX_WBITS)
+
+    def gzip_decompressobj(self):
+        """
+        Return a decompressor for one gzip member: it parses the header
+        and checks the CRC-32 and ISIZE in the trailer.
+        """
+        return self.module.decompressobj(16 + zlib.MAX_WBITS)
+
+    def crc32(self, data, value=0):
+        """CRC-32 of `data`, continuing from `value`"""
+        return self.module.crc32(data, value)
+
+    def __repr__(self):
+        return f"DeflateBackend({self.name!r})"
+
+
+def _import_backend(name):
+    """Return the DeflateBackend called `name`, or None if not installed."""
+    try:
+        module = importlib.import_module(BACKEND_MODULES[name])
+    except ImportError:
+        return None
+    return DeflateBackend(name, module, _ISAL_LEVELS if name == "isal" else None)
+
+
+@lru_cache(maxsize=None)
+def get_backend(name=DEFAULT_BACKEND):
+    """
+    Return the DeflateBackend for `name`, one of BACKENDS.
+    "auto" picks the fastest one installed. A backend whose package isn't
+    installed falls back to zlib with a RuntimeWarning.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}, not {name!r}")
+    if name == "auto":
+        for candidate in AUTO_BACKEND_ORDER:
+            backend = _import_backend(candidate)
+            if backend is not None:
+                return backend
+    backend = _import_backend(name)
+    if backend is None:
+        warnings.warn(
+            f"The {name} backend is not installed; using zlib instead",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+        backend = _import_backend("zlib")
+    return backend
+
+
+def available_backends():
+    """Names of the backends that are installed, fastest first"""
+    return tuple(
+        name for name in AUTO_BACKEND_ORDER if _import_backend(name) is not None
+    )
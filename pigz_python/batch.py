@@ -0,0 +1,76 @@
+"""
+Compress many files at once over a shared worker pool.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.dummy import Pool
+
+from pigz_python.backends import DEFAULT_BACKEND
+from pigz_python.pigz_python import (
+    _COMPRESS_LEVEL_BEST,
+    CPU_COUNT,
+    DEFAULT_BLOCK_SIZE_KB,
+    DEFAULT_INFLIGHT_BLOCKS_PER_WORKER,
+    PigzFile,
+)
+from pigz_python.workers import create_process_pool
+
+
+# pylint: disable-next=too-many-locals
+def compress_files(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    source_files,
+    compresslevel=_COMPRESS_LEVEL_BEST,
+    blocksize=DEFAULT_BLOCK_SIZE_KB,
+    workers=CPU_COUNT,
+    max_inflight_blocks=DEFAULT_INFLIGHT_BLOCKS_PER_WORKER,
+    independent=False,
+    executor="thread",
+    max_open_files=None,
+    backend=DEFAULT_BACKEND,
+    rsyncable=False,
+):
+    """
+    Compress many files over one shared worker pool.
+    Up to `max_open_files` files (default: one per worker) are read and
+    written at once, each with its own read and write thread, and their
+    chunks are interleaved on the pool. Each file may have at most
+    `max_inflight_blocks` chunks in flight.
+    `backend` and `rsyncable` are as for PigzFile.
+    Raises the first error encountered once every file has been attempted.
+    """
+    source_files = list(source_files)
+    if max_open_files is None:
+        max_open_files = workers
+    max_open_files = max(1, min(max_open_files, len(source_files)))
+    if executor == "process":
+        shared_pool = create_process_pool(workers)
+    else:
+        shared_pool = Pool(processes=workers)  # pylint: disable=R1732
+
+    def compress(source_file):
+        pigz_file = PigzFile(
+            source_file,
+            compresslevel,
+            blocksize,
+            workers,
+            max_inflight_blocks=max_inflight_blocks,
+            independent=independent,
+            executor=executor,
+            pool=shared_pool,
+            backend=backend,
+            rsyncable=rsyncable,
+        )
+        pigz_file.process_compression_target()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_open_files) as files:
+            results = [
+                files.submit(compress, source_file) for source_file in source_files
+            ]
+            errors = [result.exception() for result in results]
+    finally:
+        shared_pool.close()
+        shared_pool.join()
+    for error in errors:
+        if error is not None:
+            raise error
@@ -0,0 +1,46 @@
+"""
+BGZF (blocked gzip, from the SAM/BAM specification): a gzip file made of
+many small members, each starting with an extra field that gives its size.
+Any gzip reader decompresses it as a whole, while readers that know the
+format can find every member boundary without inflating anything and
+decompress members independently, in parallel.
+
+    member: ID1 ID2 CM FLG=FEXTRA MTIME=0 XFL=0 OS=255 XLEN=6
+            SI1="B" SI2="C" SLEN=2 BSIZE (member size - 1),
+            raw deflate data, CRC32, ISIZE
+
+All integers are little-endian. The file ends with an empty member.
+"""
+
+import struct
+
+# BSIZE is 16 bits, so a member is at most 64 KiB
+BGZF_MAX_MEMBER_SIZE = 64 * 1024
+# Uncompressed bytes per member, as htslib uses: even incompressible data
+# deflates to a member that fits
+BGZF_MAX_INPUT_SIZE = 0xFF00
+
+BGZF_HEADER = struct.Struct("<4BI2BH2BHH")
+BGZF_TRAILER = struct.Struct("<II")
+# Header fields up to XLEN, the same for every member
+BGZF_MAGIC = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+# The empty member that ends a BGZF file
+BGZF_EOF = BGZF_MAGIC + b"\x1b\x00\x03\x00" + bytes(8)
+
+
+def iter_bgzf_members(bgzf_file):
+    """
+    Yield (offset, size) of every member of a BGZF binary file object,
+    reading only their headers. Raise ValueError if a member isn't BGZF.
+    """
+    offset = bgzf_file.tell()
+    while True:
+        header = bgzf_file.read(BGZF_HEADER.size)
+        if not header:
+            return
+        if len(header) < BGZF_HEADER.size or not header.startswith(BGZF_MAGIC):
+            raise ValueError(f"Not a BGZF member at offset {offset}")
+        size = BGZF_HEADER.unpack(header)[-1] + 1
+        yield offset, size
+        offset += size
+        bgzf_file.seek(offset)
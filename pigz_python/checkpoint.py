@@ -0,0 +1,132 @@
+"""
+Checkpoints that let PigzFile resume an interrupted compression.
+
+Every chunk but the last ends on a byte-aligned sync flush (or, for BGZF,
+at the end of a member), so the output up to the end of any chunk is a valid
+prefix of the final output. A checkpoint records such a point once the
+output up to it is on disk, along with what is needed to carry on from it:
+
+    magic b"PGZC", version (1 byte), flags (1 byte), 2 pad bytes,
+    size of the input (8 bytes), its modification time in ns (8 bytes),
+    uncompressed offset (8 bytes), compressed offset (8 bytes),
+    CRC-32 of the input up to the uncompressed offset (4 bytes),
+    length of the window (4 bytes), then the window itself, deflated with zlib
+
+All integers are little-endian. The window is the 32 KiB of input before the
+uncompressed offset, which primes the next chunk; it is empty for files
+compressed with `independent=True`. The input's size and modification time
+identify it, so a checkpoint isn't used for an input that has changed.
+"""
+
+import os
+import struct
+import zlib
+
+CHECKPOINT_SUFFIX = ".pgzc"
+CHECKPOINT_MAGIC = b"PGZC"
+CHECKPOINT_VERSION = 1
+# Minimum uncompressed distance between two checkpoints
+DEFAULT_CHECKPOINT_INTERVAL = 256 * 1024 * 1024
+
+# Flag bits
+FLAG_BGZF = 0x1
+
+_CHECKPOINT = struct.Struct("<4sBB2xQqQQII")
+
+
+class Checkpoint:  # pylint: disable=too-few-public-methods
+    """How far compression got, and the state to carry on with from there"""
+
+    __slots__ = (
+        "uncompressed_offset",
+        "compressed_offset",
+        "checksum",
+        "window",
+        "source_size",
+        "source_mtime_ns",
+        "bgzf",
+    )
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        uncompressed_offset,
+        compressed_offset,
+        checksum,
+        window=b"",
+        source_size=0,
+        source_mtime_ns=0,
+        bgzf=False,
+    ):
+        self.uncompressed_offset = uncompressed_offset
+        self.compressed_offset = compressed_offset
+        self.checksum = checksum
+        self.window = window
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+        self.bgzf = bgzf
+
+    def __repr__(self):
+        return (
+            f"Checkpoint({self.uncompressed_offset}, {self.compressed_offset}, "
+            f"{self.checksum:#010x}, <{len(self.window)} byte window>)"
+        )
+
+
+def write_checkpoint(filename, checkpoint):
+    """
+    Write `checkpoint` to `filename`, replacing the previous one atomically:
+    a crash while writing leaves the old checkpoint in place.
+    """
+    window = zlib.compress(checkpoint.window, 9) if checkpoint.window else b""
+    temporary_filename = f"{filename}.tmp"
+    with open(temporary_filename, "wb") as checkpoint_file:
+        checkpoint_file.write(
+            _CHECKPOINT.pack(
+                CHECKPOINT_MAGIC,
+                CHECKPOINT_VERSION,
+                FLAG_BGZF if checkpoint.bgzf else 0,
+                checkpoint.source_size,
+                checkpoint.source_mtime_ns,
+                checkpoint.uncompressed_offset,
+                checkpoint.compressed_offset,
+                checkpoint.checksum,
+                len(window),
+            )
+        )
+        checkpoint_file.write(window)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temporary_filename, filename)
+
+
+def read_checkpoint(checkpoint_file):
+    """
+    Read a checkpoint from a binary file object.
+    """
+    header = checkpoint_file.read(_CHECKPOINT.size)
+    if len(header) < _CHECKPOINT.size:
+        raise ValueError("Not a pigz-python checkpoint file")
+    (
+        magic,
+        version,
+        flags,
+        source_size,
+        source_mtime_ns,
+        uncompressed_offset,
+        compressed_offset,
+        checksum,
+        window_length,
+    ) = _CHECKPOINT.unpack(header)
+    if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+        raise ValueError("Not a pigz-python checkpoint file")
+    window = checkpoint_file.read(window_length)
+    return Checkpoint(
+        uncompressed_offset,
+        compressed_offset,
+        checksum,
+        zlib.decompress(window) if window else b"",
+        source_size,
+        source_mtime_ns,
+        bool(flags & FLAG_BGZF),
+    )
@@ -0,0 +1,882 @@
+"""
+The parallel block pipeline: chunks of input are compressed on a pool of
+workers and written out in order as one gzip stream.
+"""
+
+import contextlib
+import os
+import struct
+import sys
+import time
+from functools import partial
+from multiprocessing.dummy import Pool
+from pathlib import Path
+from threading import Lock, Thread
+
+from pigz_python.adaptive import BACKLOG_FRACTION, AdaptiveLevel
+from pigz_python.backends import DEFAULT_BACKEND, get_backend
+from pigz_python.bgzf import (
+    BGZF_EOF,
+    BGZF_HEADER,
+    BGZF_MAX_INPUT_SIZE,
+    BGZF_MAX_MEMBER_SIZE,
+    BGZF_TRAILER,
+)
+from pigz_python.checkpoint import (
+    DEFAULT_CHECKPOINT_INTERVAL,
+    Checkpoint,
+    write_checkpoint,
+)
+from pigz_python.crc32 import crc32_combine
+from pigz_python.index import DEFAULT_INDEX_SPACING, IndexPoint, write_index
+from pigz_python.pipeline import ChunkReorderBuffer, InflightLimiter
+from pigz_python.pool import PigzPool
+from pigz_python.rsync import RSYNC_BITS, last_rsync_boundary
+from pigz_python.sink import DEFAULT_WRITE_BUFFER_SIZE, OutputSink
+from pigz_python.stats import ChunkTrace, CompressionStats
+from pigz_python.workers import (
+    SharedBlockRing,
+    compress_block,
+    create_process_pool,
+    is_incompressible,
+    store_block,
+    timed_compress_shared_block,
+)
+
+CPU_COUNT = os.cpu_count()
+DEFAULT_BLOCK_SIZE_KB = 128
+# Deflate history window; each chunk is primed with this much preceding data
+DICT_SIZE = 32 * 1024
+# Chunks allowed between the read and write threads, per worker
+DEFAULT_INFLIGHT_BLOCKS_PER_WORKER = 4
+# Where chunks are compressed: a pool of threads, or of processes that
+# receive chunks through shared memory
+EXECUTORS = ("thread", "process")
+
+# 1 is fastest but worst, 9 is slowest but best
+GZIP_COMPRESS_OPTIONS = list(range(1, 9 + 1))
+_COMPRESS_LEVEL_BEST = max(GZIP_COMPRESS_OPTIONS)
+
+# FLG bits
+FTEXT = 0x1
+FHCRC = 0x2
+FEXTRA = 0x4
+FNAME = 0x8
+FCOMMENT = 0x10
+
+# ID1, ID2, CM, FLG, MTIME, XFL and OS; multi-byte gzip fields are little-endian
+GZIP_HEADER = struct.Struct("<4BI2B")
+# CRC32 and ISIZE
+GZIP_TRAILER = struct.Struct("<2I")
+
+
+class BlockCompressor:  # pylint: disable=too-many-instance-attributes
+    """
+    The parallel block pipeline shared by PigzFile and PigzWriter.
+    Chunks are handed to `emit_chunk` in order, compressed on a pool of
+    workers and written to `output_file` in order by the write thread.
+    """
+
+    # pylint: disable-next=too-many-locals
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        compresslevel=_COMPRESS_LEVEL_BEST,
+        blocksize=DEFAULT_BLOCK_SIZE_KB,
+        workers=CPU_COUNT,
+        max_inflight_blocks=None,
+        max_buffer_bytes=None,
+        independent=False,
+        index=False,
+        index_spacing=DEFAULT_INDEX_SPACING,
+        executor="thread",
+        pool=None,
+        progress=None,
+        trace=False,
+        backend=DEFAULT_BACKEND,
+        bgzf=False,
+        rsyncable=False,
+        store_incompressible=True,
+        write_buffer_size=DEFAULT_WRITE_BUFFER_SIZE,
+        target_throughput=None,
+        deadline=None,
+        expected_size=None,
+    ):
+        """
+        Setup the worker pool and the write thread.
+        With `executor="process"`, chunks are compressed by worker processes,
+        which avoids contention on the GIL; chunks are passed to them through
+        a ring of shared memory slots rather than pickled.
+        An existing pool of the matching kind can be passed as `pool` to share
+        it between several compressors; it is then left open when done.
+        A PigzPool (see pigz_python.pool) can be passed whatever `executor`:
+        chunks then run as a job of its own, taking turns with other jobs
+        on its workers, and `workers` is capped at the pool's.
+        Like pigz, each chunk is primed with the last 32 KiB of input before it
+        as a preset dictionary; pass `independent=True` to compress every chunk
+        from scratch instead (worse ratio, but chunks don't depend on each other).
+        At most `max_inflight_blocks` chunks (default: 4 per worker) and,
+        if given, roughly `max_buffer_bytes` of raw plus compressed data are
+        held in memory at once; `emit_chunk` waits for the writer beyond that.
+        With `index=True`, an index of access points at least `index_spacing`
+        uncompressed bytes apart is written to `index_filename` (see
+        pigz_python.index) for random access with IndexedGzipReader.
+        Runtime metrics are kept in `stats` (see pigz_python.stats).
+        `progress`, if given, is called with `stats` on the write thread after
+        each chunk is written; it should return quickly, and an exception it
+        raises aborts compression. With `trace=True`, the lifecycle of every
+        chunk is recorded in `trace` for export as a Chrome trace.
+        `backend` names the deflate implementation (see pigz_python.backends):
+        "zlib", "zlib-ng", "isal", or "auto" for the fastest one installed.
+        With `bgzf=True`, every chunk is written as its own gzip member in
+        the BGZF format (see pigz_python.bgzf), so the output can be split
+        and decompressed in parallel; chunks are then independent and at
+        most BGZF_MAX_INPUT_SIZE bytes.
+        With `rsyncable=True`, data passed to `feed` is cut into chunks at
+        content-defined boundaries (see pigz_python.rsync) no more than
+        `blocksize` apart, like pigz -R, so a local edit to the input only
+        changes the output around it.
+        With `store_incompressible=True`, chunks whose sampled byte entropy
+        and trial deflates show deflate would gain nothing (already-compressed
+        or random data, see pigz_python.workers.is_incompressible) are written
+        as stored blocks without running deflate; `stats.stored_blocks`
+        counts them.
+        Output is written through an OutputSink (see pigz_python.sink): chunks
+        that are ready together are written in one call once
+        `write_buffer_size` bytes are waiting or the writer has to wait for
+        the next chunk; 0 writes every chunk as it comes. Up to that much
+        compressed data is held on top of `max_buffer_bytes`.
+        Given a `target_throughput` in MB/s, or a `deadline` in seconds to
+        compress `expected_size` bytes by, the level of each chunk is chosen
+        between 1 and `compresslevel` from the measured cost of each level and
+        the backlog of the pool (see pigz_python.adaptive), for the best ratio
+        that keeps up; `stats.level_blocks` counts the chunks at each level.
+        """
+        if bgzf and index:
+            raise ValueError("BGZF output has no index; its members are one")
+        if isinstance(pool, PigzPool):
+            executor = pool.executor
+            workers = min(workers, pool.workers)
+        self.compression_level = compresslevel
+        self.backend = get_backend(backend)
+        self.blocksize = blocksize * 1000
+        self.bgzf = bgzf
+        if bgzf:
+            self.blocksize = min(self.blocksize, BGZF_MAX_INPUT_SIZE)
+            independent = True
+        self.workers = workers
+        self.independent = independent
+        self.index = index
+        self.index_spacing = index_spacing
+        self.store_incompressible = store_incompressible
+        self.write_buffer_size = write_buffer_size
+        self.adaptive_level = self._create_adaptive_level(
+            target_throughput, deadline, expected_size
+        )
+
+        self._setup_output_state()
+
+        # Header fields for streams that don't come from a file
+        self.mtime = None
+        self.fname = None
+
+        # This is how we know if we're done reading, compressing, & writing the file
+        self._last_chunk = -1
+        self._last_chunk_lock = Lock()
+        # Number of the last chunk handed to _emit_chunk
+        self._chunk_num = 0
+        # The last DICT_SIZE bytes emitted so far, used to prime the next chunk
+        self._window = b""
+        # Data passed to feed that doesn't fill a chunk yet
+        self.feed_buffer = bytearray()
+        self.rsyncable = rsyncable
+        # The input just before feed_buffer, which the rolling hash runs over,
+        # and how much of feed_buffer is already known to have no boundary
+        self._rsync_context = b""
+        self._rsync_clear = 0
+        # This is calculated as data is written out
+        self.checksum = 0
+        # This is calculated as data is read in
+        self.input_size = 0
+        # Set by the write thread if reading, compressing or writing failed
+        self._error = None
+        self.stats = CompressionStats()
+        self.progress = progress
+        self.trace = ChunkTrace() if trace else None
+
+        self.chunk_queue = ChunkReorderBuffer()
+        if max_inflight_blocks is None:
+            max_inflight_blocks = DEFAULT_INFLIGHT_BLOCKS_PER_WORKER * self.workers
+        self.inflight = InflightLimiter(max_inflight_blocks, max_buffer_bytes)
+
+        # Setup the system threads (or processes) for compression
+        self._setup_pool(pool, executor, max_inflight_blocks)
+        # Setup write thread
+        self.write_thread = Thread(target=self._write_file)
+
+    def _create_adaptive_level(self, target_throughput, deadline, expected_size):
+        """
+        Return the AdaptiveLevel that picks the level of each chunk for a
+        target throughput (MB/s) or deadline, or None to use one level.
+        """
+        if target_throughput is None and deadline is None:
+            return None
+        if target_throughput is not None:
+            target_throughput *= 1000 * 1000
+        return AdaptiveLevel(
+            self.compression_level,
+            self.workers,
+            target_throughput,
+            deadline,
+            expected_size,
+        )
+
+    def _setup_output_state(self):
+        """
+        Set up what the writer keeps track of besides the compressed data:
+        how much was written, and the access points and checkpoints that are
+        completed once their chunk is written.
+        """
+        self.output_file = None
+        # Whether clean_up closes output_file
+        self.close_output_file = True
+        self.index_filename = None
+        # Bytes written to the output file so far, including the header
+        self.output_size = 0
+        # Access points, completed by the writer once their chunk is written
+        self.index_points = []
+        self._pending_index_points = {}
+        self._last_index_offset = 0
+        # Where to keep a checkpoint to resume from (see pigz_python.checkpoint),
+        # at least `checkpoint_interval` input bytes apart, and the (size,
+        # modification time in ns) of the input that they record
+        self.checkpoint_filename = None
+        self.checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL
+        self.checkpoint_source = (0, 0)
+        self._pending_checkpoints = {}
+        self._last_checkpoint_offset = 0
+
+    def _setup_pool(self, pool, executor, max_inflight_blocks):
+        """
+        Set up `pool` (or a new one) to compress on with `executor`, and the
+        shared memory ring that chunks reach worker processes through.
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"executor must be one of {EXECUTORS}, not {executor!r}")
+        self.executor = executor
+        self.shared_ring = None
+        if executor == "process":
+            self.shared_ring = SharedBlockRing(max_inflight_blocks, self.blocksize)
+        self.owns_pool = pool is None or isinstance(pool, PigzPool)
+        self.pool = self._create_pool(pool)
+
+    def _create_pool(self, pool=None):
+        """
+        Return a new pool of `workers` threads or processes, per `executor`,
+        a new job on `pool` if it is a PigzPool, or else `pool` itself.
+        """
+        if isinstance(pool, PigzPool):
+            return pool.job()
+        if pool is not None:
+            return pool
+        if self.executor == "process":
+            return create_process_pool(self.workers)
+        return Pool(processes=self.workers)
+
+    @property
+    def error(self):
+        """The failure that stopped the write thread, if any"""
+        return self._error
+
+    def abort(self, error=None):
+        """
+        Stop compressing: the write thread stops without writing the trailer
+        and `emit_chunk` raises. `error` (default: a RuntimeError) is what
+        the write thread reports.
+        """
+        if error is None:
+            error = RuntimeError("Compression was aborted")
+        self.chunk_queue.set_error(error)
+        self.inflight.close()
+
+    def start(self, output_file):
+        """
+        Write the gzip header to `output_file` (a file descriptor or a
+        writable binary file object) and start the write thread, ready for
+        chunks from `emit_chunk`.
+        """
+        try:
+            self.output_file = OutputSink(
+                output_file, self.write_buffer_size, self.close_output_file
+            )
+        except OSError:
+            self._close_workers()
+            raise
+        self._write_output_header()
+        self.write_thread.start()
+
+    def _write_output_header(self):
+        """
+        Write gzip header to file
+        See RFC documentation: http://www.zlib.org/rfc-gzip.html#header-trailer
+        BGZF output has no header of its own; every member carries one.
+        """
+        if self.bgzf:
+            return
+        header = self._gzip_header()
+        self.output_file.write(header)
+        self.output_size += len(header)
+
+    def _gzip_header(self):
+        """
+        Return the gzip header: ID1 and ID2, which denote the gzip format,
+        CM (compression method), FLG (FLaGs), MTIME (modification time),
+        XFL (eXtra FLags) and OS, then the FNAME if it can be included.
+        """
+        fname = self._header_fname()
+        flags = FNAME if fname else 0x0
+        return (
+            GZIP_HEADER.pack(
+                0x1F,
+                0x8B,
+                8,
+                flags,
+                self._determine_mtime(),
+                self._determine_extra_flags(self.compression_level),
+                self._determine_operating_system(),
+            )
+            + fname
+        )
+
+    def _header_fname(self):
+        """
+        Return the FNAME field for the header, or b"" to leave it out
+        """
+        if self.fname is None:
+            return b""
+        return self._determine_fname(self.fname)
+
+    def _determine_mtime(self):
+        """
+        Determine MTIME to write out in Unix format (seconds since Unix epoch).
+        Uses `mtime` if set, otherwise the time at which compression started.
+        """
+        if self.mtime is not None:
+            return int(self.mtime)
+        return int(time.time())
+
+    @staticmethod
+    def _determine_extra_flags(compression_level):
+        """
+        Determine the XFL or eXtra FLags value based on compression level.
+        Note this is copied from the pigz implementation.
+        """
+        return 2 if compression_level >= 9 else 4 if compression_level == 1 else 0
+
+    @staticmethod
+    def _determine_operating_system():
+        """
+        Return appropriate number based on OS format.
+        0 - FAT filesystem (MS-DOS, OS/2, NT/Win32)
+        1 - Amiga
+        2 - VMS (or OpenVMS)
+        3 - Unix
+        4 - VM/CMS
+        5 - Atari TOS
+        6 - HPFS filesystem (OS/2, NT)
+        7 - Macintosh
+        8 - Z-System
+        9 - CP/M
+        10 - TOPS-20
+        11 - NTFS filesystem (NT)
+        12 - QDOS
+        13 - Acorn RISCOS
+        255 - unknown
+        """
+        if sys.platform.startswith(("freebsd", "linux", "aix", "darwin")):
+            return 3
+        if sys.platform.startswith(("win32")):
+            return 0
+
+        return 255
+
+    @staticmethod
+    def _determine_fname(input_filename):
+        """
+        Determine the FNAME (filename) of the source file to the output
+        """
+        try:
+            # RFC 1952 requires the FNAME field to be Latin-1. Do not
+            # include filenames that cannot be represented that way.
+            fname = Path(input_filename).name
+            if not isinstance(fname, bytes):
+                fname = fname.encode("latin-1")
+            if fname.endswith(b".gz"):
+                fname = fname[:-3]
+            # Terminate with zero byte
+            fname += b"\0"
+        except UnicodeEncodeError:
+            fname = b""
+
+        return fname
+
+    def emit_chunk(self, chunk: bytes, is_last: bool):
+        """
+        Number the next chunk of input and hand it to the pool, primed with
+        the data before it unless chunks are independent.
+        Blocks while the in-flight window is full.
+        """
+        start = time.perf_counter()
+        self.input_size += len(chunk)
+        self._chunk_num += 1
+        chunk_num = self._chunk_num
+        self.stats.bytes_in = self.input_size
+        self.stats.chunks_in = chunk_num
+
+        if is_last:
+            with self._last_chunk_lock:
+                self._last_chunk = chunk_num
+
+        window = self._window
+        if not self.independent:
+            window = self._next_window(window, chunk)
+        # Access points and checkpoints are marked before the chunk is
+        # submitted, as the writer may write it before submitting returns
+        if self.index:
+            self._mark_index_point(
+                chunk_num, self.input_size - len(chunk), self._window
+            )
+        if self.checkpoint_filename is not None and not is_last:
+            self._mark_checkpoint(chunk_num, window)
+        # Pass is_last directly to avoid race condition; a BGZF member ends
+        # its own deflate stream
+        self._submit_chunk(
+            chunk_num,
+            chunk,
+            is_last or self.bgzf,
+            self._window or None,
+            self._next_level(),
+        )
+
+        self._window = window
+        if self.trace is not None:
+            self.trace.record("submit", chunk_num, start, time.perf_counter(), "reader")
+
+    def feed(self, data):
+        """
+        Buffer `data` (any bytes-like object) and emit every full chunk.
+        Call `finish` after the last piece of data.
+        Return the number of bytes taken.
+        """
+        with memoryview(data) as view:
+            length = view.nbytes
+            self.feed_buffer += view.cast("B")
+        while len(self.feed_buffer) >= self.blocksize:
+            chunk_size = self._next_chunk_size()
+            chunk = bytes(self.feed_buffer[:chunk_size])
+            del self.feed_buffer[:chunk_size]
+            self.emit_chunk(chunk, False)
+        return length
+
+    def _next_chunk_size(self):
+        """
+        Return how much of the buffered data, at least `blocksize` bytes,
+        to emit as the next chunk: up to the last rsync boundary in the first
+        `blocksize` bytes if rsyncable and there is one, else `blocksize`.
+        """
+        if not self.rsyncable:
+            return self.blocksize
+        with memoryview(self.feed_buffer) as view:
+            boundary = last_rsync_boundary(
+                view[: self.blocksize], self._rsync_context, self._rsync_clear
+            )
+            end = boundary or self.blocksize
+            context_start = max(0, end - RSYNC_BITS)
+            self._rsync_context = bytes(view[context_start:end])
+        # What was scanned after the boundary has none; don't scan it again
+        self._rsync_clear = self.blocksize - end
+        return end
+
+    def finish(self):
+        """
+        Emit whatever `feed` has buffered as the last chunk.
+        """
+        chunk = bytes(self.feed_buffer)
+        self.feed_buffer = bytearray()
+        self.emit_chunk(chunk, True)
+
+    def _mark_index_point(self, chunk_num: int, offset: int, window: bytes):
+        """
+        Make the chunk starting at uncompressed `offset` an access point if it
+        is far enough from the previous one. The writer fills in where the
+        chunk lands in the output.
+        This method is run on the read thread.
+        """
+        if self._pending_index_points or self.index_points:
+            if offset - self._last_index_offset < self.index_spacing:
+                return
+        self._last_index_offset = offset
+        self._pending_index_points[chunk_num] = IndexPoint(offset, None, window)
+
+    def _next_level(self):
+        """
+        Return the compression level for the next chunk.
+        This method is run on the read thread.
+        """
+        if self.adaptive_level is None:
+            return self.compression_level
+        max_blocks = self.inflight.max_blocks
+        backlog = self.inflight.blocks >= max_blocks * BACKLOG_FRACTION
+        return self.adaptive_level.next_level(self.input_size, backlog)
+
+    def _mark_checkpoint(self, chunk_num: int, window: bytes):
+        """
+        Have the writer save a checkpoint once the chunk being emitted is
+        written, if it ends far enough from the previous checkpoint.
+        `window` is the input just before where the checkpoint resumes.
+        This method is run on the read thread.
+        """
+        if self.input_size - self._last_checkpoint_offset < self.checkpoint_interval:
+            return
+        self._last_checkpoint_offset = self.input_size
+        source_size, source_mtime_ns = self.checkpoint_source
+        self._pending_checkpoints[chunk_num] = Checkpoint(
+            self.input_size,
+            None,
+            None,
+            window,
+            source_size,
+            source_mtime_ns,
+            self.bgzf,
+        )
+
+    @staticmethod
+    def _next_window(window: bytes, chunk: bytes):
+        """
+        Return the last DICT_SIZE bytes of `window` followed by `chunk`,
+        without copying the whole chunk when it fills the window by itself.
+        """
+        if len(chunk) >= DICT_SIZE:
+            return bytes(chunk[-DICT_SIZE:])
+        return (bytes(window) + chunk)[-DICT_SIZE:]
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def _submit_chunk(
+        self,
+        chunk_num: int,
+        chunk: bytes,
+        is_last: bool,
+        zdict: bytes = None,
+        level: int = None,
+    ):
+        """
+        Queue a chunk for compression on the pool, at `level` if given.
+        Blocks while the in-flight window is full.
+        """
+        start = time.perf_counter()
+        self.inflight.acquire(len(chunk))
+        end = time.perf_counter()
+        self.stats.read_wait_seconds += end - start
+        self.stats.queue_depth = self.inflight.blocks
+        self.stats.max_queue_depth = max(
+            self.stats.max_queue_depth, self.stats.queue_depth
+        )
+        if self.trace is not None:
+            self.trace.record("wait for slot", chunk_num, start, end, "reader")
+        if self.shared_ring is not None:
+            self._submit_shared_chunk(chunk_num, chunk, is_last, zdict, level)
+            return
+        self.pool.apply_async(
+            self._process_chunk,
+            (chunk_num, chunk, is_last, zdict, level),
+            error_callback=self.chunk_queue.set_error,
+        )
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def _process_chunk(
+        self,
+        chunk_num: int,
+        chunk: bytes,
+        is_last: bool,
+        zdict: bytes = None,
+        level: int = None,
+    ):
+        """
+        Overall method to handle the chunk and pass it back to the write thread.
+        The CRC-32 of the chunk is computed here so the writer only has to
+        combine it, and the raw chunk is not kept around until it is written.
+        This method is run on the pool.
+        """
+        if level is None:
+            level = self.compression_level
+        start = time.perf_counter()
+        chunk_crc = self.backend.crc32(chunk)
+        stored = self.store_incompressible and is_incompressible(chunk, zdict)
+        if stored:
+            compressed_chunk = store_block(chunk, is_last)
+        else:
+            compressed_chunk = self._compress_chunk(chunk, is_last, zdict, level)
+        end = time.perf_counter()
+        self._record_block(level, len(chunk), end - start, stored)
+        if self.trace is not None:
+            self.trace.record("compress", chunk_num, start, end, "worker")
+        self.inflight.add(len(compressed_chunk) - len(chunk))
+        self.chunk_queue.put((chunk_num, chunk_crc, len(chunk), compressed_chunk))
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def _submit_shared_chunk(
+        self,
+        chunk_num: int,
+        chunk: bytes,
+        is_last: bool,
+        zdict: bytes = None,
+        level: int = None,
+    ):
+        """
+        Copy a chunk into the shared memory ring and queue it on the
+        process pool.
+        """
+        if level is None:
+            level = self.compression_level
+        slot, offset = self.shared_ring.store(chunk)
+        self.pool.apply_async(
+            timed_compress_shared_block,
+            (
+                self.shared_ring.name,
+                offset,
+                len(chunk),
+                level,
+                is_last,
+                zdict,
+                self.backend.name,
+                self.store_incompressible,
+            ),
+            callback=partial(
+                self._shared_chunk_done, chunk_num, slot, len(chunk), level
+            ),
+            error_callback=self.chunk_queue.set_error,
+        )
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def _shared_chunk_done(
+        self, chunk_num: int, slot: int, chunk_length: int, level: int, result
+    ):
+        """
+        Free the ring slot of a chunk compressed by a worker process and pass
+        the result to the write thread.
+        This method is run on the pool's result handler thread.
+        """
+        self.shared_ring.release(slot)
+        (chunk_crc, compressed_chunk, stored), start, end, worker = result
+        self._record_block(level, chunk_length, end - start, stored)
+        if self.trace is not None:
+            self.trace.record(
+                "compress", chunk_num, start, end, f"worker {worker}", worker
+            )
+        self.inflight.add(len(compressed_chunk) - chunk_length)
+        self.chunk_queue.put((chunk_num, chunk_crc, chunk_length, compressed_chunk))
+
+    def _record_block(self, level, chunk_length, seconds, stored):
+        """
+        Account for a chunk compressed at `level` (or stored) in `stats`, and
+        in the measured cost of the level when it is adaptive.
+        """
+        self.stats.record_block(seconds, stored, level)
+        if self.adaptive_level is not None and not stored:
+            self.adaptive_level.record(level, chunk_length, seconds)
+
+    def _compress_chunk(
+        self,
+        chunk: bytes,
+        is_last_chunk: bool,
+        zdict: bytes = None,
+        level: int = None,
+    ):
+        """
+        Compress the chunk at `level` (default: `compression_level`),
+        priming the compressor with `zdict` if given.
+        """
+        if level is None:
+            level = self.compression_level
+        return compress_block(chunk, level, is_last_chunk, zdict, self.backend.name)
+
+    def _write_file(self):
+        """
+        Write compressed data to disk.
+        Take chunks from the reorder buffer, which hands them over strictly
+        in chunk number order and blocks until the next one is ready.
+        This is run from the write thread.
+        """
+        stats = self.stats
+        started = time.perf_counter()
+        try:
+            while True:
+                if not self.chunk_queue.ready():
+                    # Nothing more to batch up: write out what is waiting
+                    # rather than hold it while the next chunk is compressed
+                    self.output_file.flush()
+                wait_start = time.perf_counter()
+                chunk_num, chunk_crc, chunk_length, compressed_chunk = (
+                    self.chunk_queue.get()
+                )
+                write_start = time.perf_counter()
+                # Fold the chunk's checksum into the running checksum
+                self.combine_chunk_check(chunk_crc, chunk_length)
+                index_point = self._pending_index_points.pop(chunk_num, None)
+                if index_point is not None:
+                    index_point.compressed_offset = self.output_size
+                    self.index_points.append(index_point)
+                if self.bgzf:
+                    self._write_bgzf_member(compressed_chunk, chunk_crc, chunk_length)
+                else:
+                    self.output_file.write(compressed_chunk)
+                    self.output_size += len(compressed_chunk)
+                checkpoint = self._pending_checkpoints.pop(chunk_num, None)
+                if checkpoint is not None:
+                    self._save_checkpoint(checkpoint)
+                self._retire_input(chunk_length)
+                self.inflight.release(len(compressed_chunk))
+                self._update_write_stats(chunk_num, wait_start, write_start)
+                if self.progress is not None:
+                    self.progress(stats)
+                # If this was the last chunk,
+                # we can break the loop and close the file
+                if chunk_num == self._last_chunk:
+                    break
+        except Exception as error:  # pylint: disable=broad-except
+            self._error = error
+            self.inflight.close()
+            if self.close_output_file:
+                self.output_file.close()
+            self._close_workers()
+            return
+        finally:
+            stats.write_seconds = time.perf_counter() - started
+        # Loop breaks out if we've received the final chunk
+        self.clean_up()
+        stats.bytes_out = self.output_size
+        stats.finished = time.perf_counter()
+
+    def _retire_input(self, chunk_length):
+        """
+        Called once the next `chunk_length` bytes of input are written out,
+        so subclasses can let go of what holds them.
+        This method is run on the write thread.
+        """
+
+    def _save_checkpoint(self, checkpoint):
+        """
+        Complete a checkpoint at the end of the output written so far, and
+        save it once that output is on disk.
+        This method is run on the write thread.
+        """
+        checkpoint.compressed_offset = self.output_size
+        checkpoint.checksum = self.checksum
+        self.output_file.sync()
+        write_checkpoint(self.checkpoint_filename, checkpoint)
+
+    def _update_write_stats(self, chunk_num, wait_start, write_start):
+        """
+        Account for a chunk that was just written.
+        This method is run on the write thread.
+        """
+        stats = self.stats
+        stats.bytes_out = self.output_size
+        stats.chunks_out = chunk_num
+        stats.queue_depth = self.inflight.blocks
+        stats.write_wait_seconds = self.chunk_queue.wait_seconds
+        stats.reorder_stalls = self.chunk_queue.stalls
+        stats.reorder_depth = self.chunk_queue.qsize()
+        stats.max_reorder_depth = max(stats.max_reorder_depth, stats.reorder_depth)
+        if self.trace is not None:
+            self.trace.record(
+                "wait for chunk", chunk_num, wait_start, write_start, "writer"
+            )
+            self.trace.record(
+                "write", chunk_num, write_start, time.perf_counter(), "writer"
+            )
+
+    def _write_bgzf_member(self, compressed_chunk, chunk_crc, chunk_length):
+        """
+        Write a compressed chunk as a BGZF member. Empty chunks are left out;
+        the end of file marker follows the last member anyway.
+        This method is run on the write thread.
+        """
+        if not chunk_length:
+            return
+        size = BGZF_HEADER.size + len(compressed_chunk) + BGZF_TRAILER.size
+        if size > BGZF_MAX_MEMBER_SIZE:
+            raise ValueError(f"Chunk deflated to {size} bytes, too large for BGZF")
+        self.output_file.write(
+            BGZF_HEADER.pack(
+                0x1F, 0x8B, 8, FEXTRA, 0, 0, 255, 6, ord("B"), ord("C"), 2, size - 1
+            )
+        )
+        self.output_file.write(compressed_chunk)
+        self.output_file.write(BGZF_TRAILER.pack(chunk_crc, chunk_length))
+        self.output_size += size
+
+    def calculate_chunk_check(self, chunk: bytes):
+        """
+        Calculate the check value for the chunk.
+        """
+        self.checksum = self.backend.crc32(chunk, self.checksum)
+
+    def combine_chunk_check(self, chunk_crc: int, chunk_length: int):
+        """
+        Combine the check value of the next chunk, computed by a worker,
+        with the running check value.
+        """
+        self.checksum = crc32_combine(self.checksum, chunk_crc, chunk_length)
+
+    def clean_up(self):
+        """
+        Close the output file.
+        Clean up the processing pool.
+        """
+        if self.bgzf:
+            self.output_file.write(BGZF_EOF)
+            self.output_size += len(BGZF_EOF)
+        else:
+            self.write_file_trailer()
+
+        # Flush internal buffers
+        self.output_file.flush()
+        if self.close_output_file:
+            self.output_file.close()
+
+        if self.index:
+            self._write_index_file()
+        if self.checkpoint_filename is not None:
+            # The output is complete; there is nothing left to resume
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.checkpoint_filename)
+
+        self._close_workers()
+
+    def _write_index_file(self):
+        """
+        Write the collected access points next to the output file.
+        """
+        with open(self.index_filename, "wb") as index_file:
+            write_index(index_file, self.index_points, self.input_size)
+
+    def write_file_trailer(self):
+        """
+        Write the trailer for the compressed data.
+        """
+        # ISIZE (Input SIZE) is the size of the original (uncompressed) input
+        # data modulo 2^32
+        self.output_file.write(
+            GZIP_TRAILER.pack(self.checksum, self.input_size & 0xFFFFFFFF)
+        )
+        self.output_size += GZIP_TRAILER.size
+
+    def _close_workers(self):
+        """
+        Close compression thread pool, unless it is shared.
+        """
+        if self.owns_pool:
+            self.pool.close()
+            self.pool.join()
+        if self.shared_ring is not None:
+            self.shared_ring.close()
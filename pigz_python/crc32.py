@@ -0,0 +1,63 @@
+"""
+Combine CRC-32 check values of consecutive pieces of data, so each chunk's
+check value can be computed on its own by a worker.
+"""
+
+from functools import lru_cache
+
+# Reflected CRC-32 polynomial used by gzip
+_CRC32_POLY = 0xEDB88320
+
+
+def _crc32_multmodp(a, b):
+    """
+    Multiply a and b modulo the CRC-32 polynomial (reflected bit order).
+    """
+    mask = 1 << 31
+    product = 0
+    while True:
+        if a & mask:
+            product ^= b
+            if (a & (mask - 1)) == 0:
+                break
+        mask >>= 1
+        b = (b >> 1) ^ _CRC32_POLY if b & 1 else b >> 1
+    return product
+
+
+def _crc32_x2n_table():
+    """
+    Build the table of x^(2^n) modulo the CRC-32 polynomial for n in 0..31.
+    """
+    table = [1 << 30]  # x^1
+    for _ in range(31):
+        table.append(_crc32_multmodp(table[-1], table[-1]))
+    return table
+
+
+_CRC32_X2N_TABLE = _crc32_x2n_table()
+
+
+@lru_cache(maxsize=64)
+def _crc32_shift_operator(length):
+    """
+    Return x^(8 * length) modulo the CRC-32 polynomial.
+    Cached since almost every chunk has the same length.
+    """
+    operator = 1 << 31  # x^0
+    power = 3  # a byte is 2^3 bits
+    while length:
+        if length & 1:
+            operator = _crc32_multmodp(_CRC32_X2N_TABLE[power & 31], operator)
+        length >>= 1
+        power += 1
+    return operator
+
+
+def crc32_combine(crc1, crc2, length2):
+    """
+    Combine the CRC-32 of two consecutive pieces of data.
+    Given crc1 of A and crc2 of B (B being `length2` bytes long), return the
+    CRC-32 of A followed by B, as zlib's crc32_combine does.
+    """
+    return _crc32_multmodp(_crc32_shift_operator(length2), crc1) ^ crc2
@@ -0,0 +1,429 @@
+"""
+Parallel decompression of gzip files made of several members, such as BGZF
+output or concatenated gzip files.
+
+Member boundaries of BGZF files are read from their BSIZE fields. Other files
+are scanned for gzip headers; as those bytes can also occur inside deflate
+data, a member is inflated speculatively from every candidate and only the
+chain of members that actually follow one another is kept. Each member's
+CRC-32 and ISIZE are checked as it is inflated. Members are found as the file
+is read, MEMBER_SCAN_SIZE bytes at a time, so the first bytes are returned
+without the whole file being read first.
+
+A worker inflates at most MAX_MEMBER_BUFFER bytes of a member ahead of the
+reader; the rest of a larger member is inflated as it is read. So a large
+member, such as a single member with stray gzip header bytes inside it, is
+never held in memory as a whole.
+"""
+
+import io
+import mmap
+import os
+from gzip import BadGzipFile
+from multiprocessing.dummy import Pool
+from pathlib import Path
+from threading import Thread
+
+from pigz_python.backends import DEFAULT_BACKEND, get_backend
+from pigz_python.bgzf import BGZF_MAGIC, iter_bgzf_members
+from pigz_python.compressor import CPU_COUNT, DEFAULT_INFLIGHT_BLOCKS_PER_WORKER
+from pigz_python.pipeline import ChunkReorderBuffer, InflightLimiter
+
+# Compressed bytes handed to a decompressor at a time
+INFLATE_READ_SIZE = 256 * 1024
+# Most uncompressed bytes produced at a time by the single-threaded path
+INFLATE_PIECE_SIZE = 1024 * 1024
+# Most uncompressed bytes of one member inflated on the pool, ahead of the
+# reader; the reader inflates the rest of a larger member itself
+MAX_MEMBER_BUFFER = 4 * INFLATE_PIECE_SIZE
+# Compressed bytes scanned for member starts at a time, ahead of the reader
+MEMBER_SCAN_SIZE = MAX_MEMBER_BUFFER
+
+# ID1, ID2, CM (deflate) at the start of every gzip member
+_MEMBER_SIGNATURE = b"\x1f\x8b\x08"
+# FLG bits that must be zero
+_FLG_RESERVED = 0xE0
+
+
+def find_member_candidates(data, start=0, end=None):
+    """
+    Return the offsets in `data`, from `start` up to `end`, that look like
+    the start of a gzip member.
+    Every real member start is among them; some may be false positives.
+    """
+    if end is None:
+        end = len(data)
+    # A signature starting just before `end` is still found
+    scan_end = min(end + len(_MEMBER_SIGNATURE) - 1, len(data))
+    candidates = []
+    offset = data.find(_MEMBER_SIGNATURE, start, scan_end)
+    while offset != -1:
+        if offset + 3 < len(data) and not data[offset + 3] & _FLG_RESERVED:
+            candidates.append(offset)
+        offset = data.find(_MEMBER_SIGNATURE, offset + 1, scan_end)
+    return candidates
+
+
+def _is_padding(data):
+    """Whether `data` is only the zero padding some tools leave at the end."""
+    return not data.strip(b"\0")
+
+
+class PigzReader(io.RawIOBase):  # pylint: disable=too-many-instance-attributes
+    """
+    Read-only stream of the decompressed content of a gzip file, inflated
+    on a pool of `workers` threads when the file has several members.
+    `fileobj` is a path to open or a readable binary file object, read from
+    the start; a file object is left open on close. Regular files and
+    io.BytesIO objects are inflated in parallel; other streams serially.
+    At most `max_inflight_members` members (default: 4 per worker), of at
+    most MAX_MEMBER_BUFFER bytes each, are held in memory ahead of the reader,
+    and at most as many steps of MEMBER_SCAN_SIZE bytes are scanned ahead.
+    Wrap in io.BufferedReader for small reads.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        fileobj,
+        workers=CPU_COUNT,
+        max_inflight_members=None,
+        backend=DEFAULT_BACKEND,
+    ):
+        super().__init__()
+        if max_inflight_members is None:
+            max_inflight_members = DEFAULT_INFLIGHT_BLOCKS_PER_WORKER * workers
+        self.workers = workers
+        self._backend = get_backend(backend)
+        self._owns_file = isinstance(fileobj, (str, bytes, os.PathLike))
+        if self._owns_file:
+            self._file = open(fileobj, "rb")  # pylint: disable=consider-using-with
+        else:
+            self._file = fileobj
+        self._map = self._map_input(self._file)
+        self._chunk_queue = ChunkReorderBuffer(first_chunk=0)
+        self._inflight = InflightLimiter(max_inflight_members)
+        self._pool = None
+        self._piece = memoryview(b"")
+        # Where the reader expects the next member; the scan skips to it
+        self._next_member = 0
+
+        if self._inflates_in_parallel():
+            self._pool = Pool(processes=workers)
+            self._thread = Thread(target=self._dispatch_members, daemon=True)
+            self._pieces = self._member_pieces()
+        else:
+            self._thread = Thread(target=self._inflate_serially, daemon=True)
+            self._pieces = self._serial_pieces()
+        self._thread.start()
+
+    @staticmethod
+    def _map_input(input_file):
+        """
+        Return the whole content of the input without reading it: a mapping
+        of a non-empty regular file, or the buffer of an io.BytesIO.
+        Return None for anything else.
+        """
+        if isinstance(input_file, io.BytesIO):
+            # Shares the bytes the BytesIO was created from, if any
+            return input_file.getvalue()
+        try:
+            return mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, OverflowError):
+            return None
+
+    def _inflates_in_parallel(self):
+        """
+        Whether the file is inflated on the pool member by member, rather
+        than on one thread.
+        """
+        if self._map is None or self.workers < 2:
+            return False
+        return find_member_candidates(self._map, 0, 1) == [0]
+
+    def _iter_members(self):
+        """
+        Yield (offset, size or None) for the members, or candidate members,
+        of the file as they are found, and (None, offset) for a step of the
+        scan up to `offset` that found none.
+        This method is run on the dispatch thread.
+        """
+        position = 0
+        if self._map[: len(BGZF_MAGIC)] == BGZF_MAGIC:
+            try:
+                for offset, size in iter_bgzf_members(self._file):
+                    yield offset, size
+                    position = offset + size
+                return
+            except ValueError:
+                # Not BGZF from `position` on; look for members the slow way
+                pass
+        while True:
+            # Candidates inside members the reader is done with don't matter
+            position = max(position, self._next_member)
+            if position >= len(self._map):
+                return
+            end = min(position + MEMBER_SCAN_SIZE, len(self._map))
+            candidates = find_member_candidates(self._map, position, end)
+            for offset in candidates:
+                yield offset, None
+            if not candidates:
+                yield None, end
+            position = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._piece:
+            piece = next(self._pieces, None)
+            if piece is None:
+                return 0
+            self._piece = memoryview(piece)
+        length = min(len(buffer), len(self._piece))
+        buffer[:length] = self._piece[:length]
+        self._piece = self._piece[length:]
+        return length
+
+    def readall(self):
+        """
+        Read the rest of the content, joined once into a buffer of its size.
+        """
+        self._checkClosed()
+        pieces = [bytes(self._piece)]
+        self._piece = memoryview(b"")
+        pieces.extend(self._pieces)
+        return b"".join(pieces)
+
+    def close(self):
+        if not self.closed:
+            self._chunk_queue.set_error(ValueError("I/O operation on closed file."))
+            self._inflight.close()
+            self._thread.join()
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+            self._piece = memoryview(b"")
+            if isinstance(self._map, mmap.mmap):
+                self._map.close()
+            if self._owns_file:
+                self._file.close()
+        super().close()
+
+    def _dispatch_members(self):
+        """
+        Queue every member on the pool as it is found, waiting while too many
+        are in flight. A step of the scan that found no member is passed to
+        the reader as a gap, so the scan doesn't run ahead of it either.
+        This method is run on the dispatch thread.
+        """
+        number = 0
+        try:
+            for offset, size in self._iter_members():
+                self._inflight.acquire(0)
+                if offset is None:
+                    self._chunk_queue.put((number, None, size, [], None, None))
+                else:
+                    self._pool.apply_async(
+                        self._inflate_member,
+                        (number, offset, size),
+                        error_callback=self._chunk_queue.set_error,
+                    )
+                number += 1
+            self._inflight.acquire(0)
+            self._chunk_queue.put((number, None, None, [], None, None))
+        except RuntimeError:
+            # Closed while waiting for room
+            pass
+        except Exception as error:  # pylint: disable=broad-except
+            self._chunk_queue.set_error(error)
+
+    def _inflate_member(self, number, offset, size):
+        """
+        Inflate up to MAX_MEMBER_BUFFER bytes of the member starting at
+        `offset`, `size` bytes long if known, and pass the pieces to the
+        reader with the offset where the member ends, or else with what is
+        needed to inflate the rest of it: (decompressor, position, limit).
+        An error is passed along rather than raised: `offset` may not be a
+        member start after all.
+        This method is run on the pool.
+        """
+        limit = len(self._map) if size is None else offset + size
+        decompressor = self._backend.gzip_decompressobj()
+        pieces = []
+        buffered = 0
+        position = offset
+        try:
+            while not decompressor.eof and buffered < MAX_MEMBER_BUFFER:
+                piece, position = self._inflate_piece(decompressor, position, limit)
+                pieces.append(piece)
+                buffered += len(piece)
+        except Exception as error:  # pylint: disable=broad-except
+            self._chunk_queue.put((number, offset, None, [], error, None))
+            return
+        if not decompressor.eof:
+            rest = (decompressor, position, limit)
+            self._chunk_queue.put((number, offset, None, pieces, None, rest))
+            return
+        member_end = position - len(decompressor.unused_data)
+        self._chunk_queue.put((number, offset, member_end, pieces, None, None))
+
+    def _inflate_piece(self, decompressor, position, limit):
+        """
+        Inflate at most INFLATE_PIECE_SIZE bytes more of a member, reading
+        from `position` once the decompressor has used up what it was given.
+        Return the piece and the position to read from next.
+        """
+        compressed = decompressor.unconsumed_tail
+        if not compressed:
+            if position >= limit:
+                raise EOFError(
+                    "Compressed file ended before the end-of-stream marker "
+                    "was reached"
+                )
+            end = min(position + INFLATE_READ_SIZE, limit)
+            compressed = self._map[position:end]
+            position = end
+        return decompressor.decompress(compressed, INFLATE_PIECE_SIZE), position
+
+    def _inflate_rest(self, decompressor, position, limit):
+        """
+        Yield the rest of a member the pool inflated only the start of, piece
+        by piece, and return the offset where the member ends.
+        """
+        while not decompressor.eof:
+            piece, position = self._inflate_piece(decompressor, position, limit)
+            if piece:
+                yield piece
+        return position - len(decompressor.unused_data)
+
+    def _member_pieces(self):
+        """
+        Yield the content of the members that follow one another from the
+        start of the file, skipping candidates inside them.
+        """
+        expected = 0
+        while True:
+            _, offset, member_end, pieces, error, rest = self._chunk_queue.get()
+            self._inflight.release(0)
+            if offset is None:
+                if member_end is None:
+                    # The whole file was scanned
+                    break
+                continue
+            if offset < expected:
+                continue
+            if offset > expected:
+                raise BadGzipFile(f"No gzip member at offset {expected}")
+            try:
+                if error is not None:
+                    raise error
+                yield from filter(None, pieces)
+                if rest is not None:
+                    member_end = yield from self._inflate_rest(*rest)
+            except EOFError:
+                raise
+            except Exception as error:  # pylint: disable=broad-except
+                raise BadGzipFile(f"Member at offset {offset}: {error}") from error
+            expected = member_end
+            self._next_member = expected
+        if not _is_padding(self._map[expected:]):
+            raise BadGzipFile(f"Trailing garbage at offset {expected}")
+
+    def _inflate_serially(self):
+        """
+        Inflate the file member after member, in pieces of at most
+        INFLATE_PIECE_SIZE bytes, ahead of the reader.
+        This method is run on the inflate thread.
+        """
+        number = 0
+        try:
+            for piece in self._iter_serial_pieces():
+                self._inflight.acquire(0)
+                self._chunk_queue.put((number, piece))
+                number += 1
+            self._inflight.acquire(0)
+            self._chunk_queue.put((number, None))
+        except RuntimeError:
+            # Closed while waiting for room
+            pass
+        except EOFError as error:
+            self._chunk_queue.set_error(error)
+        except Exception as error:  # pylint: disable=broad-except
+            bad_file = BadGzipFile(str(error))
+            bad_file.__cause__ = error
+            self._chunk_queue.set_error(bad_file)
+
+    def _iter_serial_pieces(self):
+        """Yield the decompressed content of the file piece by piece."""
+        decompressor = None
+        while True:
+            compressed = self._file.read(INFLATE_READ_SIZE)
+            if not compressed:
+                break
+            while compressed:
+                if decompressor is None:
+                    if _is_padding(compressed):
+                        break
+                    decompressor = self._backend.gzip_decompressobj()
+                piece = decompressor.decompress(compressed, INFLATE_PIECE_SIZE)
+                if piece:
+                    yield piece
+                compressed = decompressor.unconsumed_tail
+                if decompressor.eof:
+                    compressed = decompressor.unused_data
+                    decompressor = None
+        if decompressor is not None:
+            raise EOFError(
+                "Compressed file ended before the end-of-stream marker was reached"
+            )
+
+    def _serial_pieces(self):
+        """Yield the pieces inflated on the inflate thread, in order."""
+        while True:
+            _, piece = self._chunk_queue.get()
+            self._inflight.release(0)
+            if piece is None:
+                return
+            yield piece
+
+
+def decompress_file(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    source_file,
+    output_file=None,
+    workers=CPU_COUNT,
+    max_inflight_members=None,
+    backend=DEFAULT_BACKEND,
+):
+    """
+    Decompress a gzip file, by default to its name without ".gz".
+    Return the path of the decompressed file.
+    """
+    source_file = Path(source_file)
+    if output_file is None:
+        if source_file.suffix != ".gz":
+            raise ValueError(f"{source_file} has no .gz suffix to remove")
+        output_file = source_file.with_suffix("")
+    try:
+        with (
+            PigzReader(source_file, workers, max_inflight_members, backend) as reader,
+            open(output_file, "wb") as output,
+        ):
+            while True:
+                piece = reader.read(INFLATE_PIECE_SIZE)
+                if not piece:
+                    break
+                output.write(piece)
+    except BaseException:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+    return Path(output_file)
+
+
+def decompress_bytes(data, workers=CPU_COUNT, backend=DEFAULT_BACKEND):
+    """
+    Decompress gzip data held in memory, with its members inflated in
+    parallel as PigzReader does, and return the content as one bytes object.
+    """
+    with PigzReader(io.BytesIO(data), workers, backend=backend) as reader:
+        return reader.readall()
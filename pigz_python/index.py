@@ -0,0 +1,202 @@
+"""
+Random access into gzip files written by PigzFile.
+
+PigzFile ends every chunk on a byte-aligned sync flush, so inflating can start
+at the first byte of any chunk as long as the decompressor is primed with the
+32 KiB of uncompressed data before it (the same preset dictionary the chunk was
+compressed with). An index records such access points:
+
+    header: magic b"PGZI", version (1 byte), 3 pad bytes,
+            uncompressed size (8 bytes), point count (8 bytes)
+    point:  uncompressed offset (8 bytes), compressed offset (8 bytes),
+            length of the window (4 bytes), then the window itself,
+            deflated with zlib
+
+All integers are little-endian. The window is empty for the first point and
+for files compressed with `independent=True`.
+"""
+
+import io
+import struct
+import zlib
+from bisect import bisect_right
+
+from pigz_python.backends import DEFAULT_BACKEND, get_backend
+
+INDEX_SUFFIX = ".pgzi"
+INDEX_MAGIC = b"PGZI"
+INDEX_VERSION = 1
+# Minimum uncompressed distance between two access points
+DEFAULT_INDEX_SPACING = 1024 * 1024
+
+_HEADER = struct.Struct("<4sB3xQQ")
+_POINT = struct.Struct("<QQI")
+
+# Compressed bytes read from the gzip file at a time
+_READ_SIZE = 64 * 1024
+
+
+class IndexPoint:
+    """An access point: where a chunk starts and the history it needs"""
+
+    __slots__ = ("uncompressed_offset", "compressed_offset", "window")
+
+    def __init__(self, uncompressed_offset, compressed_offset, window=b""):
+        self.uncompressed_offset = uncompressed_offset
+        self.compressed_offset = compressed_offset
+        self.window = window
+
+    def __eq__(self, other):
+        return isinstance(other, IndexPoint) and (
+            self.uncompressed_offset,
+            self.compressed_offset,
+            self.window,
+        ) == (other.uncompressed_offset, other.compressed_offset, other.window)
+
+    def __repr__(self):
+        return (
+            f"IndexPoint({self.uncompressed_offset}, {self.compressed_offset}, "
+            f"<{len(self.window)} byte window>)"
+        )
+
+
+def write_index(index_file, points, uncompressed_size):
+    """
+    Write `points` (IndexPoint, sorted by offset) to a binary file object.
+    """
+    index_file.write(
+        _HEADER.pack(INDEX_MAGIC, INDEX_VERSION, uncompressed_size, len(points))
+    )
+    for point in points:
+        window = zlib.compress(point.window, 9) if point.window else b""
+        index_file.write(
+            _POINT.pack(point.uncompressed_offset, point.compressed_offset, len(window))
+        )
+        index_file.write(window)
+
+
+def read_index(index_file):
+    """
+    Read an index from a binary file object.
+    Return (points, uncompressed_size).
+    """
+    magic, version, uncompressed_size, count = _HEADER.unpack(
+        index_file.read(_HEADER.size)
+    )
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        raise ValueError("Not a pigz-python index file")
+    points = []
+    for _ in range(count):
+        uncompressed_offset, compressed_offset, window_length = _POINT.unpack(
+            index_file.read(_POINT.size)
+        )
+        window = index_file.read(window_length)
+        points.append(
+            IndexPoint(
+                uncompressed_offset,
+                compressed_offset,
+                zlib.decompress(window) if window else b"",
+            )
+        )
+    return points, uncompressed_size
+
+
+class IndexedGzipReader(io.RawIOBase):  # pylint: disable=too-many-instance-attributes
+    """
+    Read-only, seekable view of the uncompressed content of a gzip file
+    written by PigzFile with `index=True`.
+    Seeking inflates only from the nearest access point at or before the
+    target offset. Wrap in io.BufferedReader for small reads.
+    `backend` names the deflate implementation to inflate with.
+    """
+
+    def __init__(self, filename, index_filename=None, backend=DEFAULT_BACKEND):
+        super().__init__()
+        self._backend = get_backend(backend)
+        if index_filename is None:
+            index_filename = str(filename) + INDEX_SUFFIX
+        with open(index_filename, "rb") as index_file:
+            self.points, self.size = read_index(index_file)
+        self._offsets = [point.uncompressed_offset for point in self.points]
+        self._file = open(filename, "rb")  # pylint: disable=consider-using-with
+        self._position = 0
+        self._decompressor = None
+        # Uncompressed offset of the next byte self._decompressor will produce
+        self._inflate_position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise ValueError(f"Invalid whence ({whence})")
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._position = offset
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+        point = self.points[bisect_right(self._offsets, self._position) - 1]
+        if (
+            self._decompressor is None
+            or self._position < self._inflate_position
+            or point.uncompressed_offset > self._inflate_position
+        ):
+            self._start_at(point)
+        # Inflate and discard up to the requested position
+        while self._inflate_position < self._position:
+            self._inflate(min(self._position - self._inflate_position, _READ_SIZE))
+        data = self._inflate(len(buffer))
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def _start_at(self, point):
+        """Position the decompressor at an access point."""
+        self._file.seek(point.compressed_offset)
+        self._decompressor = self._backend.decompressobj(point.window)
+        self._inflate_position = point.uncompressed_offset
+
+    def _inflate(self, max_length):
+        """Return up to `max_length` bytes from the decompressor."""
+        while True:
+            if self._decompressor.unconsumed_tail:
+                data = self._decompressor.decompress(
+                    self._decompressor.unconsumed_tail, max_length
+                )
+            elif self._decompressor.eof:
+                return b""
+            else:
+                compressed = self._file.read(_READ_SIZE)
+                if not compressed:
+                    raise EOFError("Compressed file ended before the end of stream")
+                data = self._decompressor.decompress(compressed, max_length)
+            if data:
+                self._inflate_position += len(data)
+                return data
+
+
+def read_range(filename, offset, length, index_filename=None, backend=DEFAULT_BACKEND):
+    """
+    Return `length` bytes of uncompressed content starting at `offset`.
+    """
+    with IndexedGzipReader(filename, index_filename, backend) as reader:
+        reader.seek(offset)
+        return io.BufferedReader(reader).read(length)
@@ -3,72 +3,205 @@ Functions and classes to speed up compression of files by utilizing
 multiple cores on a system.
 """
 
+import io
+import mmap
 import os
-import sys
+import stat
+import tarfile
 import time
-import zlib
-from multiprocessing.dummy import Pool
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from queue import PriorityQueue
-from threading import Lock, Thread
-
-CPU_COUNT = os.cpu_count()
-DEFAULT_BLOCK_SIZE_KB = 128
-
-# 1 is fastest but worst, 9 is slowest but best
-GZIP_COMPRESS_OPTIONS = list(range(1, 9 + 1))
-_COMPRESS_LEVEL_BEST = max(GZIP_COMPRESS_OPTIONS)
-
-# FLG bits
-FTEXT = 0x1
-FHCRC = 0x2
-FEXTRA = 0x4
-FNAME = 0x8
-FCOMMENT = 0x10
-
-
-class PigzFile:  # pylint: disable=too-many-instance-attributes
+from threading import Thread
+
+from pigz_python.backends import DEFAULT_BACKEND
+from pigz_python.checkpoint import (
+    CHECKPOINT_SUFFIX,
+    DEFAULT_CHECKPOINT_INTERVAL,
+    read_checkpoint,
+)
+from pigz_python.compressor import (
+    _COMPRESS_LEVEL_BEST,
+    CPU_COUNT,
+    DEFAULT_BLOCK_SIZE_KB,
+    DEFAULT_INFLIGHT_BLOCKS_PER_WORKER,
+    DICT_SIZE,
+    EXECUTORS,
+    FCOMMENT,
+    FEXTRA,
+    FHCRC,
+    FNAME,
+    FTEXT,
+    GZIP_COMPRESS_OPTIONS,
+    BlockCompressor,
+)
+from pigz_python.crc32 import crc32_combine
+from pigz_python.index import DEFAULT_INDEX_SPACING, INDEX_SUFFIX
+from pigz_python.pipeline import ChunkReorderBuffer, InflightLimiter
+from pigz_python.rsync import RSYNC_BITS
+from pigz_python.sink import DEFAULT_WRITE_BUFFER_SIZE, OutputSink
+from pigz_python.tuning import AUTO, AUTO_PROBE_SIZE, choose_settings, read_probe
+from pigz_python.workers import InlinePool, SharedBlockRing, compress_block
+
+# Names defined elsewhere in the package that are also available from here
+__all__ = [
+    "CPU_COUNT",
+    "DEFAULT_BLOCK_SIZE_KB",
+    "DEFAULT_INFLIGHT_BLOCKS_PER_WORKER",
+    "DICT_SIZE",
+    "EXECUTORS",
+    "FCOMMENT",
+    "FEXTRA",
+    "FHCRC",
+    "FNAME",
+    "FTEXT",
+    "GZIP_COMPRESS_OPTIONS",
+    "BlockCompressor",
+    "ChunkReorderBuffer",
+    "InflightLimiter",
+    "PigzFile",
+    "SharedBlockRing",
+    "compress_block",
+    "compress_bytes",
+    "compress_file",
+    "crc32_combine",
+]
+
+# Files up to this size are read ahead concurrently when compressing a directory
+TAR_PREFETCH_FILE_SIZE = 256 * 1024
+# Threads reading files ahead, and files read ahead, when compressing a directory
+TAR_READ_THREADS = 8
+TAR_PREFETCH_FILES = 64
+
+
+class PigzFile(BlockCompressor):  # pylint: disable=too-many-instance-attributes
     """Class to implement Pigz functionality in Python"""
 
-    def __init__(
+    # pylint: disable-next=too-many-locals
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
         self,
         compression_target,
         compresslevel=_COMPRESS_LEVEL_BEST,
         blocksize=DEFAULT_BLOCK_SIZE_KB,
         workers=CPU_COUNT,
+        max_inflight_blocks=None,
+        max_buffer_bytes=None,
+        independent=False,
+        index=False,
+        index_spacing=DEFAULT_INDEX_SPACING,
+        executor="thread",
+        use_mmap=True,
+        pool=None,
+        progress=None,
+        trace=False,
+        backend=DEFAULT_BACKEND,
+        bgzf=False,
+        rsyncable=False,
+        store_incompressible=True,
+        output_file=None,
+        write_buffer_size=DEFAULT_WRITE_BUFFER_SIZE,
+        checkpoint=False,
+        checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL,
+        resume=False,
+        target_throughput=None,
+        deadline=None,
     ):
         """
         Take in a file or directory and gzip using multiple system cores.
+        A directory is archived with tar on the fly and compressed into
+        `<directory>.tar.gz` in one pass.
+        The output goes to `output_file` if given: a path, or a file
+        descriptor (such as a pipe) or writable binary file object, which is
+        left open. By default it is written next to the input.
+        See BlockCompressor for the remaining options; with `index=True` the
+        index is written next to the output as `<output>.pgzi`, so the output
+        must then be a path.
+        Regular files are memory-mapped and workers compress slices of the
+        mapping directly, saving a copy of the input; the pages of input that
+        has been written out are released, so memory use doesn't grow with
+        the size of the file. Pass `use_mmap=False` to read them in blocks
+        instead.
+        Pass "auto" as `blocksize` and/or `workers` to choose them from the
+        size of the input, the CPUs available and a short calibration probe
+        (see pigz_python.tuning); inputs too small for parallelism to pay off
+        are then compressed on the read thread, without a pool.
+        With `checkpoint=True`, a checkpoint is saved next to the output as
+        `<output>.pgzc` (see pigz_python.checkpoint) every
+        `checkpoint_interval` bytes of input, and removed once the output is
+        complete. With `resume=True`, compression then carries on from the
+        last checkpoint of an interrupted run, if there is one, keeping the
+        output up to it; only a file compressed into a path can be resumed.
+        A `deadline` needs the size of the input, so it can't be used with a
+        directory.
         """
         self.compression_target = Path(compression_target)
-        self.compression_level = compresslevel
-        self.blocksize = blocksize * 1000
-        self.workers = workers
-
-        self.output_file = None
         self.output_filename = None
-
-        # This is how we know if we're done reading, compressing, & writing the file
-        self._last_chunk = -1
-        self._last_chunk_lock = Lock()
-        # This is calculated as data is written out
-        self.checksum = 0
-        # This is calculated as data is read in
-        self.input_size = 0
-
-        self.chunk_queue = PriorityQueue()
-
-        if Path(compression_target).is_dir():
-            raise NotImplementedError
+        self.output_path = None
+        self.output_target = output_file
+        self.checkpoint = checkpoint or resume
+        self.resume = resume
+        # Where reading starts: the end of the input a resumed run kept
+        self.resume_offset = 0
+        self.use_mmap = use_mmap
+        self._input_map = None
+        # Input bytes written out since resume_offset, and the end of the
+        # mapped input already released (see _retire_input)
+        self._retired_input = 0
+        self._released_offset = 0
+
+        self.is_directory = Path(compression_target).is_dir()
         if not Path(compression_target).exists():
             raise FileNotFoundError
-
-        # Setup the system threads for compression
-        self.pool = Pool(processes=self.workers)
+        if index and not self._is_output_path(output_file):
+            raise ValueError("index=True needs an output path to write the index by")
+        if self.checkpoint:
+            self._check_resumable(index, output_file)
+
+        if AUTO in (blocksize, workers):
+            blocksize, workers, serial = self._choose_settings(
+                compresslevel, blocksize, workers, backend
+            )
+            if serial and pool is None:
+                pool = InlinePool()
+                executor = "thread"
+
+        super().__init__(
+            compresslevel,
+            blocksize,
+            workers,
+            max_inflight_blocks=max_inflight_blocks,
+            max_buffer_bytes=max_buffer_bytes,
+            independent=independent,
+            index=index,
+            index_spacing=index_spacing,
+            executor=executor,
+            pool=pool,
+            progress=progress,
+            trace=trace,
+            backend=backend,
+            bgzf=bgzf,
+            rsyncable=rsyncable,
+            store_incompressible=store_incompressible,
+            write_buffer_size=write_buffer_size,
+            target_throughput=target_throughput,
+            deadline=deadline,
+            expected_size=self._regular_file_size(),
+        )
+        self.checkpoint_interval = checkpoint_interval
         # Setup read thread
         self.read_thread = Thread(target=self._read_file)
-        # Setup write thread
-        self.write_thread = Thread(target=self._write_file)
+
+    def _check_resumable(self, index, output_file):
+        """
+        Raise ValueError unless compression can be checkpointed and resumed.
+        """
+        if self.is_directory:
+            raise ValueError("Only a file can be compressed with checkpoints")
+        if index:
+            raise ValueError("An index can't be written with checkpoints")
+        if not self._is_output_path(output_file):
+            raise ValueError("Checkpoints need an output path to resume into")
 
     def process_compression_target(self):
         """
@@ -86,79 +219,126 @@ class PigzFile:  # pylint: disable=too-many-instance-attributes
         # Block until writing is complete
         # This prevents us from returning prior to the work being done
         self.write_thread.join()
+        self.read_thread.join()
+        self._close_input_map()
+        if self._error is not None:
+            raise self._error
+
+    def _regular_file_size(self):
+        """
+        Return the size of the compression target if it is a regular file,
+        else None.
+        """
+        if self.is_directory:
+            return None
+        file_stat = os.stat(self.compression_target)
+        if not stat.S_ISREG(file_stat.st_mode):
+            return None
+        return file_stat.st_size
+
+    def _choose_settings(self, compresslevel, blocksize, workers, backend):
+        """
+        Resolve "auto" block size and worker count for the compression target.
+        Return (blocksize, workers, serial) as tuning.choose_settings does.
+        """
+        input_size = self._regular_file_size()
+        sample = b""
+        if input_size is not None:
+            sample = read_probe(self.compression_target)
+        return choose_settings(
+            input_size, compresslevel, blocksize, workers, sample, backend=backend
+        )
 
     def _set_output_filename(self):
         """
         Set the output filename based on the input filename
         """
         base = Path(self.compression_target).name
+        if self.is_directory:
+            base += ".tar"
         self.output_filename = base + ".gz"
 
-    def _write_output_header(self):
+    def _header_fname(self):
         """
-        Write gzip header to file
-        See RFC documentation: http://www.zlib.org/rfc-gzip.html#header-trailer
+        Return the FNAME field for the header, taken from the input file
         """
-        self._write_header_id()
-        self._write_header_cm()
+        if self.is_directory:
+            return self._determine_fname(Path(self.compression_target).name + ".tar")
+        return self._determine_fname(self.compression_target)
 
-        # We must first figure out if we can write out the filename before writing FLG
-        fname = self._determine_fname(self.compression_target)
-        flags = 0x0
-        if fname:
-            flags = flags | FNAME
-
-        self._write_header_flg(flags)
-
-        self._write_header_mtime()
-        self._write_header_xfl()
-        self._write_header_os()
-
-        # After this point, content of flags (FLG) determines what (if anything)
-        # we write to header
-        if flags & FNAME:
-            # Write the FNAME
-            self.output_file.write(fname)
+    def _setup_output_file(self):
+        """
+        Setup the output file: `output_file` if given, else the input's name
+        with .gz added, next to it
+        """
+        target = self.output_target
+        if target is None:
+            self._set_output_filename()
+            target = Path(self.compression_target.parent, self.output_filename)
+        if self._is_output_path(target):
+            self.output_path = Path(os.fsdecode(target))
+            target = self.output_path
+        if self.index:
+            self.index_filename = Path(str(self.output_path) + INDEX_SUFFIX)
+        if self.checkpoint:
+            self.checkpoint_filename = Path(str(self.output_path) + CHECKPOINT_SUFFIX)
+            file_stat = os.stat(self.compression_target)
+            self.checkpoint_source = (file_stat.st_size, file_stat.st_mtime_ns)
+            if self.resume and self._resume_output():
+                return
+        self.output_file = OutputSink(target, self.write_buffer_size)
+        self._write_output_header()
 
-    def _write_header_id(self):
+    def _resume_output(self):
         """
-        Write ID (IDentification) ID1, then ID2 to file header
-        These denote the file as being gzip format
+        Restore the state saved in the checkpoint of an interrupted run, and
+        open the output to carry on from it.
+        Return False, to start from scratch, if there is no checkpoint or no
+        output left to resume.
         """
-        self.output_file.write((0x1F).to_bytes(1, sys.byteorder))
-        self.output_file.write((0x8B).to_bytes(1, sys.byteorder))
-
-    def _write_header_cm(self):
-        """Write the CM (compression method) to file header"""
-        self.output_file.write((8).to_bytes(1, sys.byteorder))
-
-    def _write_header_flg(self, flags):
-        """Write FLG (FLaGs)"""
-        self.output_file.write((flags).to_bytes(1, sys.byteorder))
-
-    def _write_header_mtime(self):
-        """Write MTIME (Modification time)"""
-        mtime = self._determine_mtime()
-        self.output_file.write((mtime).to_bytes(4, sys.byteorder))
-
-    def _write_header_xfl(self):
-        """Write XFL (eXtra FLags)"""
-        extra_flags = self._determine_extra_flags(self.compression_level)
-        self.output_file.write((extra_flags).to_bytes(1, sys.byteorder))
-
-    def _write_header_os(self):
-        """Write OS"""
-        os_number = self._determine_operating_system()
-        self.output_file.write((os_number).to_bytes(1, sys.byteorder))
+        try:
+            with open(self.checkpoint_filename, "rb") as checkpoint_file:
+                checkpoint = read_checkpoint(checkpoint_file)
+        except FileNotFoundError:
+            return False
+        source = (checkpoint.source_size, checkpoint.source_mtime_ns)
+        if source != self.checkpoint_source or checkpoint.bgzf != self.bgzf:
+            raise ValueError(
+                f"{self.compression_target} or the bgzf option changed since "
+                f"{self.checkpoint_filename} was saved"
+            )
+        try:
+            output_fd = os.open(
+                self.output_path, os.O_WRONLY | getattr(os, "O_BINARY", 0)
+            )
+        except FileNotFoundError:
+            return False
+        try:
+            if os.fstat(output_fd).st_size < checkpoint.compressed_offset:
+                raise ValueError(f"{self.output_path} is shorter than its checkpoint")
+            # Drop whatever was written after the checkpoint
+            os.ftruncate(output_fd, checkpoint.compressed_offset)
+            os.lseek(output_fd, checkpoint.compressed_offset, os.SEEK_SET)
+        except BaseException:
+            os.close(output_fd)
+            raise
+        self.output_file = OutputSink(output_fd, self.write_buffer_size, True)
+        self.resume_offset = checkpoint.uncompressed_offset
+        self.input_size = checkpoint.uncompressed_offset
+        self._last_checkpoint_offset = checkpoint.uncompressed_offset
+        self.checksum = checkpoint.checksum
+        self.output_size = checkpoint.compressed_offset
+        if not self.independent:
+            self._window = checkpoint.window
+        return True
 
-    def _setup_output_file(self):
+    @staticmethod
+    def _is_output_path(output_file):
         """
-        Setup the output file
+        Whether `output_file` names a file to create (None means the default
+        path) rather than being a file descriptor or file object
         """
-        self._set_output_filename()
-        full_path = Path(self.compression_target.parent, self.output_filename)
-        self.output_file = open(full_path, "wb")
-        self._write_output_header()
+        return output_file is None or isinstance(output_file, (str, bytes, os.PathLike))
 
     def _determine_mtime(self):
         """
@@ -173,192 +353,373 @@ class PigzFile:  # pylint: disable=too-many-instance-attributes
         except Exception:  # pylint: disable=broad-except
             return int(time.time())
 
-    @staticmethod
-    def _determine_extra_flags(compression_level):
-        """
-        Determine the XFL or eXtra FLags value based on compression level.
-        Note this is copied from the pigz implementation.
-        """
-        return 2 if compression_level >= 9 else 4 if compression_level == 1 else 0
-
-    @staticmethod
-    def _determine_operating_system():
-        """
-        Return appropriate number based on OS format.
-        0 - FAT filesystem (MS-DOS, OS/2, NT/Win32)
-        1 - Amiga
-        2 - VMS (or OpenVMS)
-        3 - Unix
-        4 - VM/CMS
-        5 - Atari TOS
-        6 - HPFS filesystem (OS/2, NT)
-        7 - Macintosh
-        8 - Z-System
-        9 - CP/M
-        10 - TOPS-20
-        11 - NTFS filesystem (NT)
-        12 - QDOS
-        13 - Acorn RISCOS
-        255 - unknown
-        """
-        if sys.platform.startswith(("freebsd", "linux", "aix", "darwin")):
-            return 3
-        if sys.platform.startswith(("win32")):
-            return 0
-
-        return 255
-
-    @staticmethod
-    def _determine_fname(input_filename):
+    def _read_file(self):
         """
-        Determine the FNAME (filename) of the source file to the output
+        Read {filename} in {blocksize} chunks.
+        This method is run on the read thread.
         """
+        start = time.perf_counter()
         try:
-            # RFC 1952 requires the FNAME field to be Latin-1. Do not
-            # include filenames that cannot be represented that way.
-            fname = Path(input_filename).name
-            if not isinstance(fname, bytes):
-                fname = fname.encode("latin-1")
-            if fname.endswith(b".gz"):
-                fname = fname[:-3]
-            # Terminate with zero byte
-            fname += b"\0"
-        except UnicodeEncodeError:
-            fname = b""
-
-        return fname
+            self._read_chunks()
+        except Exception as error:  # pylint: disable=broad-except
+            self.chunk_queue.set_error(error)
+        finally:
+            self.stats.read_seconds = time.perf_counter() - start
 
-    def _read_file(self):
+    def _read_chunks(self):
         """
-        Read {filename} in {blocksize} chunks.
-        This method is run on the read thread.
+        Read the compression target and hand each chunk to the pool.
+        An empty file is sent as a single empty last chunk so the
+        writer still produces a valid gzip stream.
         """
-        # Initialize this to 0 so our increment sets first chunk to 1
-        chunk_num = 0
+        if self.is_directory:
+            self._read_directory()
+            return
         with open(self.compression_target, "rb") as input_file:
+            if self.resume_offset:
+                self._skip_resumed_input(input_file)
+            if self.rsyncable:
+                # Chunk boundaries depend on the data, so go through feed
+                for data in iter(partial(input_file.read, self.blocksize), b""):
+                    self.feed(data)
+                self.finish()
+                return
+            if self.use_mmap:
+                self._input_map = self._map_input(input_file)
+            if self._input_map is not None:
+                self._emit_mapped_chunks(self._input_map)
+                return
             chunk = input_file.read(self.blocksize)
+            if not chunk:
+                self.emit_chunk(chunk, True)
             while chunk:
-                self.input_size += len(chunk)
-                chunk_num += 1
-
                 # Peek ahead to determine if this is the last chunk
                 next_chunk = input_file.read(self.blocksize)
-                is_last = not next_chunk
-
-                if is_last:
-                    with self._last_chunk_lock:
-                        self._last_chunk = chunk_num
-
-                # Pass is_last directly to avoid race condition
-                self.pool.apply_async(self._process_chunk, (chunk_num, chunk, is_last))
-
+                self.emit_chunk(chunk, not next_chunk)
                 chunk = next_chunk
 
-    def _process_chunk(self, chunk_num: int, chunk: bytes, is_last: bool):
-        """
-        Overall method to handle the chunk and pass it back to the write thread.
-        This method is run on the pool.
-        """
-        compressed_chunk = self._compress_chunk(chunk, is_last)
-        self.chunk_queue.put((chunk_num, chunk, compressed_chunk))
+    def _skip_resumed_input(self, input_file):
+        """
+        Move past the input a resumed run kept, reading the end of it back as
+        the context of the rsync rolling hash.
+        """
+        context_start = max(0, self.resume_offset - RSYNC_BITS)
+        input_file.seek(context_start)
+        self._rsync_context = input_file.read(self.resume_offset - context_start)
+
+    def _read_directory(self):
+        """
+        Stream a tar archive of the directory into the compressor.
+        Small files are read ahead on a few threads, in archive order, so
+        opening and reading many of them doesn't starve the workers.
+        """
+        # tarfile in stream mode only ever calls write() on its file object
+        sink = _FeedSink(self.feed)
+        with tarfile.open(fileobj=sink, mode="w|") as tar:
+            with ThreadPoolExecutor(max_workers=TAR_READ_THREADS) as readers:
+                entries = self._walk_directory()
+                prefetched = deque()
+                for path, arcname in entries:
+                    prefetched.append(
+                        (path, arcname, readers.submit(self._prefetch_file, path))
+                    )
+                    if len(prefetched) >= TAR_PREFETCH_FILES:
+                        self._add_tar_entry(tar, *prefetched.popleft())
+                while prefetched:
+                    self._add_tar_entry(tar, *prefetched.popleft())
+        self.finish()
+
+    def _walk_directory(self):
+        """
+        Yield (path, name in the archive) for the directory and everything
+        in it, in a stable order. Symbolic links are archived, not followed.
+        """
+        root = self.compression_target
+        yield root, root.name
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(dirnames + filenames):
+                path = Path(dirpath, name)
+                yield path, str(Path(root.name, path.relative_to(root)))
 
-    def _compress_chunk(self, chunk: bytes, is_last_chunk: bool):
+    @staticmethod
+    def _prefetch_file(path):
         """
-        Compress the chunk.
+        Return the content of a small regular file, or None to read it
+        while it's being archived.
+        This method is run on a tar read thread.
         """
-        compressor = zlib.compressobj(
-            level=self.compression_level,
-            method=zlib.DEFLATED,
-            wbits=-zlib.MAX_WBITS,
-            memLevel=zlib.DEF_MEM_LEVEL,
-            strategy=zlib.Z_DEFAULT_STRATEGY,
-        )
-        compressed_data = compressor.compress(chunk)
-        if is_last_chunk:
-            compressed_data += compressor.flush(zlib.Z_FINISH)
-        else:
-            compressed_data += compressor.flush(zlib.Z_SYNC_FLUSH)
-
-        return compressed_data
-
-    def _write_file(self):
-        """
-        Write compressed data to disk.
-        Read chunks off of the priority queue.
-        Priority is the chunk number, so we can keep track of which chunk to get next.
-        This is run from the write thread.
-        """
-        next_chunk_num = 1
-        while True:
-            if not self.chunk_queue.empty():
-                chunk_num, chunk, compressed_chunk = self.chunk_queue.get()
-
-                if chunk_num != next_chunk_num:
-                    # If this isn't the next chunk we're looking for,
-                    # place it back on the queue and sleep
-                    self.chunk_queue.put((chunk_num, chunk, compressed_chunk))
-                    time.sleep(0.5)
-                else:
-                    # Calculate running checksum
-                    self.calculate_chunk_check(chunk)
-                    # Write chunk to file, advance next chunk we're looking for
-                    self.output_file.write(compressed_chunk)
-                    # If this was the last chunk,
-                    # we can break the loop and close the file
-                    if chunk_num == self._last_chunk:
-                        break
-                    next_chunk_num += 1
-            else:
-                # If the queue is empty, we're likely waiting for data.
-                time.sleep(0.5)
-        # Loop breaks out if we've received the final chunk
-        self.clean_up()
-
-    def calculate_chunk_check(self, chunk: bytes):
-        """
-        Calculate the check value for the chunk.
-        """
-        self.checksum = zlib.crc32(chunk, self.checksum)
-
-    def clean_up(self):
-        """
-        Close the output file.
-        Clean up the processing pool.
-        """
-        self.write_file_trailer()
-
-        # Flush internal buffers
-        self.output_file.flush()
-        self.output_file.close()
-
-        self._close_workers()
-
-    def write_file_trailer(self):
-        """
-        Write the trailer for the compressed data.
-        """
-        # Write CRC32
-        self.output_file.write((self.checksum).to_bytes(4, sys.byteorder))
-        # Write ISIZE (Input SIZE)
-        # This contains the size of the original (uncompressed) input data modulo 2^32.
-        self.output_file.write(
-            (self.input_size & 0xFFFFFFFF).to_bytes(4, sys.byteorder)
-        )
+        try:
+            file_stat = os.lstat(path)
+            if stat.S_ISREG(file_stat.st_mode):
+                if file_stat.st_size <= TAR_PREFETCH_FILE_SIZE:
+                    return Path(path).read_bytes()
+        except OSError:
+            # Let tarfile report the problem when it gets to the file
+            pass
+        return None
+
+    @staticmethod
+    def _add_tar_entry(tar, path, arcname, prefetched):
+        """
+        Add one file, directory or link to the archive, using the
+        prefetched content if it still matches the file's size.
+        """
+        tarinfo = tar.gettarinfo(path, arcname)
+        if tarinfo is None:
+            # Sockets and other types tar can't archive are skipped
+            return
+        if not tarinfo.isreg():
+            tar.addfile(tarinfo)
+            return
+        content = prefetched.result()
+        if content is not None and len(content) == tarinfo.size:
+            tar.addfile(tarinfo, io.BytesIO(content))
+            return
+        with open(path, "rb") as input_file:
+            tar.addfile(tarinfo, input_file)
 
-    def _close_workers(self):
+    @staticmethod
+    def _map_input(input_file):
         """
-        Close compression thread pool.
+        Map a non-empty regular file read-only, advising the kernel that it
+        will be read sequentially. Return None if it can't be mapped.
         """
-        self.pool.close()
-        self.pool.join()
+        try:
+            if not stat.S_ISREG(os.fstat(input_file.fileno()).st_mode):
+                return None
+            input_map = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, OverflowError):
+            # Empty files, special files and files too large for the
+            # address space are read the ordinary way
+            return None
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            input_map.madvise(mmap.MADV_SEQUENTIAL)
+        return input_map
+
+    def _emit_mapped_chunks(self, input_map):
+        """
+        Hand memoryview slices of the mapped input to the pool, asking the
+        kernel to read ahead the chunk after each one.
+        """
+        view = memoryview(input_map)
+        size = len(view)
+        if self.resume_offset >= size:
+            self.emit_chunk(b"", True)
+        for start in range(self.resume_offset, size, self.blocksize):
+            end = min(start + self.blocksize, size)
+            if end < size and hasattr(mmap, "MADV_WILLNEED"):
+                # madvise needs a page-aligned start
+                aligned_end = end - end % mmap.PAGESIZE
+                input_map.madvise(
+                    mmap.MADV_WILLNEED,
+                    aligned_end,
+                    min(end + self.blocksize, size) - aligned_end,
+                )
+            self.emit_chunk(view[start:end], end == size)
+
+    def _retire_input(self, chunk_length):
+        """
+        Drop the mapped pages of input that has been written out, so the
+        mapping doesn't keep the whole file resident. The pages are read back
+        from the file if anything still refers to them.
+        This method is run on the write thread.
+        """
+        self._retired_input += chunk_length
+        input_map = self._input_map
+        if input_map is None or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        end = self.resume_offset + self._retired_input
+        # madvise works on whole pages
+        end -= end % mmap.PAGESIZE
+        start = max(self._released_offset, self.resume_offset)
+        start -= start % mmap.PAGESIZE
+        if end - start >= self.blocksize:
+            input_map.madvise(mmap.MADV_DONTNEED, start, end - start)
+            self._released_offset = end
+
+    def _close_input_map(self):
+        """
+        Unmap the input once every chunk has been compressed.
+        """
+        if self._input_map is None:
+            return
+        try:
+            self._input_map.close()
+        except BufferError:
+            # A slice is still referenced somewhere; the mapping is
+            # released when the last one is garbage collected
+            pass
+        self._input_map = None
+
+
+class _FeedSink:  # pylint: disable=too-few-public-methods
+    """Minimal writable file object that passes data to a `feed` function"""
+
+    def __init__(self, feed):
+        self.write = feed
+
+
+class _MemorySink:
+    """
+    Writable file object that keeps what is written as a list of pieces,
+    joined into one buffer of the final size at the end.
+    """
+
+    def __init__(self):
+        self.pieces = []
+
+    def write(self, data):
+        """Keep a piece of output; compressed chunks are kept as they are."""
+        self.pieces.append(data if isinstance(data, bytes) else bytes(data))
+        return len(data)
+
+    def flush(self):
+        """Nothing is buffered."""
 
+    def getvalue(self):
+        """Return everything written as one bytes object."""
+        return b"".join(self.pieces)
 
-def compress_file(
+
+# pylint: disable-next=too-many-locals
+def compress_file(  # pylint: disable=too-many-arguments,too-many-positional-arguments
     source_file,
     compresslevel=_COMPRESS_LEVEL_BEST,
     blocksize=DEFAULT_BLOCK_SIZE_KB,
     workers=CPU_COUNT,
+    max_inflight_blocks=None,
+    max_buffer_bytes=None,
+    independent=False,
+    index=False,
+    index_spacing=DEFAULT_INDEX_SPACING,
+    executor="thread",
+    use_mmap=True,
+    progress=None,
+    trace_file=None,
+    backend=DEFAULT_BACKEND,
+    bgzf=False,
+    rsyncable=False,
+    store_incompressible=True,
+    pool=None,
+    output_file=None,
+    write_buffer_size=DEFAULT_WRITE_BUFFER_SIZE,
+    checkpoint=False,
+    checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL,
+    resume=False,
+    target_throughput=None,
+    deadline=None,
 ):
-    """Helper function to call underlying class and compression method"""
-    pigz_file = PigzFile(source_file, compresslevel, blocksize, workers)
+    """
+    Helper function to call underlying class and compression method.
+    Return the CompressionStats of the run. If `trace_file` is given, a
+    Chrome trace of every chunk is written to it. Pass a PigzPool as `pool`
+    to compress on workers shared with other calls. `output_file` (a path,
+    file descriptor or file object), `write_buffer_size` and the checkpoint
+    options are as for PigzFile: with `resume=True`, an interrupted call
+    made with `checkpoint=True` carries on where it left off. Pass a
+    `target_throughput` in MB/s or a `deadline` in seconds to have the level
+    of each block chosen to keep up, with `compresslevel` as the highest.
+    """
+    pigz_file = PigzFile(
+        source_file,
+        compresslevel,
+        blocksize,
+        workers,
+        max_inflight_blocks=max_inflight_blocks,
+        max_buffer_bytes=max_buffer_bytes,
+        independent=independent,
+        index=index,
+        index_spacing=index_spacing,
+        executor=executor,
+        use_mmap=use_mmap,
+        progress=progress,
+        trace=trace_file is not None,
+        backend=backend,
+        bgzf=bgzf,
+        rsyncable=rsyncable,
+        store_incompressible=store_incompressible,
+        pool=pool,
+        output_file=output_file,
+        write_buffer_size=write_buffer_size,
+        checkpoint=checkpoint,
+        checkpoint_interval=checkpoint_interval,
+        resume=resume,
+        target_throughput=target_throughput,
+        deadline=deadline,
+    )
     pigz_file.process_compression_target()
+    if trace_file is not None:
+        pigz_file.trace.write_chrome_trace(trace_file)
+    return pigz_file.stats
+
+
+# pylint: disable-next=too-many-locals
+def compress_bytes(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    data,
+    compresslevel=_COMPRESS_LEVEL_BEST,
+    blocksize=DEFAULT_BLOCK_SIZE_KB,
+    workers=CPU_COUNT,
+    independent=False,
+    mtime=None,
+    filename=None,
+    executor="thread",
+    pool=None,
+    backend=DEFAULT_BACKEND,
+    bgzf=False,
+    store_incompressible=True,
+):
+    """
+    Compress a bytes-like object in memory and return the gzip data.
+    Blocks are memoryview slices of `data`, so it isn't copied (except into
+    shared memory for `executor="process"`), and the output is assembled
+    once, at its final size.
+    `blocksize` and `workers` may be "auto" as for PigzFile; `filename` and
+    `mtime` go in the header as for PigzWriter. The other options are as
+    for BlockCompressor.
+    """
+    with memoryview(data) as buffer, buffer.cast("B") as view:
+        size = len(view)
+        if AUTO in (blocksize, workers):
+            end = min(size, AUTO_PROBE_SIZE)
+            blocksize, workers, serial = choose_settings(
+                size, compresslevel, blocksize, workers, view[:end], backend=backend
+            )
+            if serial and pool is None:
+                pool = InlinePool()
+                executor = "thread"
+        compressor = BlockCompressor(
+            compresslevel,
+            blocksize,
+            workers,
+            independent=independent,
+            executor=executor,
+            pool=pool,
+            backend=backend,
+            bgzf=bgzf,
+            store_incompressible=store_incompressible,
+            # Chunks are kept as they are until the output is joined
+            write_buffer_size=0,
+        )
+        compressor.close_output_file = False
+        compressor.mtime = mtime
+        compressor.fname = filename
+        output = _MemorySink()
+        compressor.start(output)
+        failure = None
+        try:
+            if not size:
+                compressor.emit_chunk(b"", True)
+            for start in range(0, size, compressor.blocksize):
+                end = min(start + compressor.blocksize, size)
+                compressor.emit_chunk(view[start:end], end == size)
+        except Exception as error:  # pylint: disable=broad-except
+            # Stop the write thread; if compression had already failed, it
+            # still reports that first failure
+            compressor.abort(error)
+            failure = error
+        compressor.write_thread.join()
+    failure = compressor.error or failure
+    if failure is not None:
+        raise failure
+    return output.getvalue()
@@ -0,0 +1,138 @@
+"""
+Synchronization between the stages of the compression pipeline: the reader
+that hands chunks to the pool, the pool, and the writer that puts the
+compressed chunks back in order.
+"""
+
+import time
+from threading import Condition
+
+
+class ChunkReorderBuffer:
+    """
+    Hold compressed chunks until the writer can emit them in order.
+    Chunks arrive from the pool in any order; the writer blocks in `get`
+    and is woken as soon as the next expected chunk number is put.
+    `wait_seconds` is the time `get` spent blocked, and `stalls` the number
+    of times it blocked while later chunks were already waiting.
+    """
+
+    def __init__(self, first_chunk=1):
+        self._chunks = {}
+        self._next_chunk = first_chunk
+        self._error = None
+        self._condition = Condition()
+        self.wait_seconds = 0.0
+        self.stalls = 0
+
+    def put(self, item):
+        """
+        Store an item whose first element is its chunk number.
+        """
+        with self._condition:
+            self._chunks[item[0]] = item
+            if item[0] == self._next_chunk:
+                self._condition.notify()
+
+    def get(self):
+        """
+        Block until the next chunk in sequence is available and return it.
+        Re-raises any error reported through `set_error`.
+        """
+        with self._condition:
+            if self._next_chunk not in self._chunks and self._error is None:
+                if self._chunks:
+                    self.stalls += 1
+                start = time.perf_counter()
+                while self._next_chunk not in self._chunks and self._error is None:
+                    self._condition.wait()
+                self.wait_seconds += time.perf_counter() - start
+            if self._error is not None:
+                raise self._error
+            item = self._chunks.pop(self._next_chunk)
+            self._next_chunk += 1
+            return item
+
+    def ready(self):
+        """
+        Whether `get` would return (or raise) without blocking.
+        """
+        with self._condition:
+            return self._next_chunk in self._chunks or self._error is not None
+
+    def set_error(self, error):
+        """
+        Record a failure from the read thread or the pool and wake the writer.
+        Only the first failure is kept; later ones are usually its effects.
+        """
+        with self._condition:
+            if self._error is None:
+                self._error = error
+            self._condition.notify_all()
+
+    def qsize(self):
+        """Number of chunks waiting to be written."""
+        with self._condition:
+            return len(self._chunks)
+
+
+class InflightLimiter:
+    """
+    Bound the work queued between the read thread and the write thread.
+    The reader reserves a slot (and the raw bytes of its chunk) before handing
+    a chunk to the pool, and blocks while the window is full. Workers add the
+    size of the compressed data, and the writer releases everything once the
+    chunk is on disk.
+    """
+
+    def __init__(self, max_blocks=None, max_bytes=None):
+        self.max_blocks = max_blocks
+        self.max_bytes = max_bytes
+        self.blocks = 0
+        self.bytes = 0
+        self._closed = False
+        self._condition = Condition()
+
+    def _is_full(self, nbytes):
+        if self.max_blocks is not None and self.blocks >= self.max_blocks:
+            return True
+        # Always let one block through, however large, so we can't deadlock
+        if self.max_bytes is not None and self.blocks:
+            return self.bytes + nbytes > self.max_bytes
+        return False
+
+    def acquire(self, nbytes):
+        """
+        Block until there is room for a chunk of `nbytes` raw bytes.
+        """
+        with self._condition:
+            while self._is_full(nbytes) and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                raise RuntimeError("Compression was aborted")
+            self.blocks += 1
+            self.bytes += nbytes
+
+    def add(self, nbytes):
+        """
+        Account for `nbytes` more bytes held by an in-flight chunk.
+        """
+        with self._condition:
+            self.bytes += nbytes
+
+    def release(self, nbytes):
+        """
+        Free a chunk slot holding `nbytes` bytes and wake the reader.
+        """
+        with self._condition:
+            self.blocks -= 1
+            self.bytes -= nbytes
+            self._condition.notify_all()
+
+    def close(self):
+        """
+        Wake a blocked reader and make further `acquire` calls fail.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
@@ -0,0 +1,186 @@
+"""
+A long-lived worker pool shared by many compression jobs at once, for
+services that compress many payloads concurrently: workers are started once,
+their number caps the compression threads (or processes) however many jobs
+run, and jobs take turns so a large one can't hold up small ones.
+"""
+
+from collections import deque
+from threading import Condition, Thread
+
+from pigz_python.tuning import effective_cpu_count
+from pigz_python.workers import create_process_pool
+
+# Where tasks run: on the pool's threads, or in worker processes
+POOL_EXECUTORS = ("thread", "process")
+
+
+class PigzPool:
+    """
+    Workers shared by any number of concurrent PigzFile, PigzWriter or
+    compress_file jobs: pass it as their `pool`. Each job queues its chunks
+    separately and workers serve the jobs with queued chunks round-robin, one
+    chunk at a time.
+    `workers` defaults to the CPUs this process may use (see
+    tuning.effective_cpu_count). With `executor="process"`, each of the
+    `workers` threads hands its chunk to a pool of as many worker processes.
+    Use as a context manager, or call `close` and `join` when done.
+    """
+
+    def __init__(self, workers=None, executor="thread"):
+        if executor not in POOL_EXECUTORS:
+            raise ValueError(
+                f"executor must be one of {POOL_EXECUTORS}, not {executor!r}"
+            )
+        self.workers = workers or effective_cpu_count()
+        self.executor = executor
+        # Jobs with queued tasks, in the order they get their next turn
+        self._ready_jobs = deque()
+        self._closed = False
+        self._condition = Condition()
+        self._process_pool = None
+        if executor == "process":
+            self._process_pool = create_process_pool(self.workers)
+        self._threads = [
+            Thread(target=self._work, name=f"PigzPool-{number}", daemon=True)
+            for number in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        self.join()
+
+    def job(self):
+        """
+        Return a new job: a pool-like handle whose tasks take their turn
+        with those of the other jobs.
+        """
+        return PoolJob(self)
+
+    def apply_async(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, func, args=(), kwds=None, callback=None, error_callback=None
+    ):
+        """
+        Run `func` on the pool as a job of its own, as Pool.apply_async does.
+        """
+        job = self.job()
+        job.apply_async(func, args, kwds, callback, error_callback)
+        job.close()
+
+    def _submit(self, job, task):
+        """Queue a task for `job`, giving the job a turn if it had none."""
+        with self._condition:
+            if self._closed:
+                raise ValueError("Pool not running")
+            job.tasks.append(task)
+            if len(job.tasks) == 1:
+                self._ready_jobs.append(job)
+                self._condition.notify()
+
+    def _next_task(self):
+        """
+        Wait for a task and return (job, task), taking turns between jobs;
+        None once the pool is closed and every task has been run.
+        """
+        with self._condition:
+            while not self._ready_jobs and not self._closed:
+                self._condition.wait()
+            if not self._ready_jobs:
+                return None
+            job = self._ready_jobs.popleft()
+            task = job.tasks.popleft()
+            if job.tasks:
+                self._ready_jobs.append(job)
+            return job, task
+
+    def _work(self):
+        """
+        Run tasks until the pool is closed and drained.
+        This method is run on the pool's threads.
+        """
+        while True:
+            item = self._next_task()
+            if item is None:
+                return
+            job, (func, args, kwds, callback, error_callback) = item
+            try:
+                if self._process_pool is not None:
+                    result = self._process_pool.apply(func, args, kwds)
+                else:
+                    result = func(*args, **kwds)
+            except Exception as error:  # pylint: disable=broad-except
+                if error_callback is not None:
+                    error_callback(error)
+            else:
+                if callback is not None:
+                    callback(result)
+            finally:
+                job.task_done()
+
+    def close(self):
+        """Accept no more tasks; those queued still run."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def join(self):
+        """Wait for the workers to finish after `close`."""
+        for thread in self._threads:
+            thread.join()
+        if self._process_pool is not None:
+            self._process_pool.close()
+            self._process_pool.join()
+
+
+class PoolJob:
+    """
+    One job's share of a PigzPool, with the part of the Pool interface
+    BlockCompressor uses. Closing and joining it only waits for its own tasks.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        # Tasks queued and not yet picked up by a worker, oldest first
+        self.tasks = deque()
+        self._unfinished = 0
+        self._closed = False
+        self._condition = Condition()
+
+    def apply_async(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, func, args=(), kwds=None, callback=None, error_callback=None
+    ):
+        """Queue `func(*args, **kwds)` for its turn on the pool."""
+        with self._condition:
+            if self._closed:
+                raise ValueError("Job is closed")
+            self._unfinished += 1
+        try:
+            self.pool._submit(  # pylint: disable=protected-access
+                self, (func, args, kwds or {}, callback, error_callback)
+            )
+        except ValueError:
+            self.task_done()
+            raise
+
+    def task_done(self):
+        """Account for a finished task."""
+        with self._condition:
+            self._unfinished -= 1
+            if not self._unfinished:
+                self._condition.notify_all()
+
+    def close(self):
+        """Accept no more tasks."""
+        with self._condition:
+            self._closed = True
+
+    def join(self):
+        """Wait for every task of the job to finish."""
+        with self._condition:
+            while self._unfinished:
+                self._condition.wait()
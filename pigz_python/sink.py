@@ -0,0 +1,120 @@
+"""
+Where compressed output goes: a file by path, a file descriptor (a pipe,
+a socket, stdout) or a writable binary file object, with small writes
+coalesced into few system calls.
+"""
+
+import os
+
+# Output collected before it is written, unless the writer goes idle first
+DEFAULT_WRITE_BUFFER_SIZE = 1024 * 1024
+# Most pieces passed to one writev call; POSIX guarantees at least 16, and
+# Linux, macOS and the BSDs all allow 1024
+_IOV_MAX = 1024
+
+
+class OutputSink:
+    """
+    Buffers output pieces without copying them and writes them out together
+    once `buffer_size` bytes are waiting, or on `flush`. Pieces go to a file
+    descriptor in one os.writev call where available, and to a file object
+    joined into one write.
+    `target` is a path to create, a file descriptor or a file object; a
+    descriptor or file object is closed by `close` only if `close_target`.
+    """
+
+    def __init__(
+        self, target, buffer_size=DEFAULT_WRITE_BUFFER_SIZE, close_target=None
+    ):
+        self.buffer_size = buffer_size
+        self.fileobj = None
+        self.fd = None
+        if isinstance(target, int):
+            self.fd = target
+        elif isinstance(target, (str, bytes, os.PathLike)):
+            flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+            self.fd = os.open(target, flags, 0o666)
+            if close_target is None:
+                close_target = True
+        else:
+            self.fileobj = target
+        self.close_target = bool(close_target)
+        self._pieces = []
+        self._buffered = 0
+        self.closed = False
+
+    @property
+    def buffered(self):
+        """Bytes waiting to be written"""
+        return self._buffered
+
+    def write(self, data):
+        """
+        Queue `data` (bytes, kept as is) for writing, and write everything
+        queued if that fills the buffer.
+        """
+        self._pieces.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.buffer_size:
+            self._write_pieces()
+        return len(data)
+
+    def flush(self):
+        """Write everything queued, and flush the file object if any."""
+        self._write_pieces()
+        if self.fileobj is not None and hasattr(self.fileobj, "flush"):
+            self.fileobj.flush()
+
+    def sync(self):
+        """Flush, then have the operating system write the output to disk."""
+        self.flush()
+        os.fsync(self.fd if self.fd is not None else self.fileobj.fileno())
+
+    def close(self):
+        """Flush, then close the target if it was opened here or asked to."""
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.closed = True
+            if self.close_target:
+                if self.fd is not None:
+                    os.close(self.fd)
+                else:
+                    self.fileobj.close()
+
+    def _write_pieces(self):
+        """Write out the queued pieces and empty the queue."""
+        pieces = self._pieces
+        if not pieces:
+            return
+        self._pieces = []
+        self._buffered = 0
+        if self.fileobj is not None:
+            self.fileobj.write(pieces[0] if len(pieces) == 1 else b"".join(pieces))
+        elif hasattr(os, "writev"):
+            self._writev(pieces)
+        else:
+            self._write_all(b"".join(pieces))
+
+    def _writev(self, pieces):
+        """Write all of `pieces` to the descriptor, IOV_MAX at a time."""
+        while pieces:
+            batch = pieces[:_IOV_MAX]
+            written = os.writev(self.fd, batch)
+            # Skip what was written, which may end partway through a piece
+            done = 0
+            while done < len(batch) and written >= len(batch[done]):
+                written -= len(batch[done])
+                done += 1
+            pieces = pieces[done:]
+            if written:
+                pieces[0] = memoryview(pieces[0])[written:]
+
+    def _write_all(self, data):
+        """Write all of `data` to the descriptor."""
+        with memoryview(data) as view:
+            while view:
+                written = os.write(self.fd, view)
+                view = view[written:]
@@ -0,0 +1,229 @@
+"""
+Runtime metrics for the compression pipeline: how many bytes went through,
+how long each stage was busy or waiting, how deep the queues got, and how
+long blocks took to compress. A per-chunk trace can be exported in the
+Chrome trace event format (chrome://tracing, https://ui.perfetto.dev).
+"""
+
+import json
+import time
+from threading import Lock, get_ident
+
+# Upper bounds of the latency histogram buckets, in seconds: 64 us doubling
+# up to about 4 s; slower blocks go in a last, unbounded bucket
+LATENCY_BUCKETS = tuple(64e-6 * 2**power for power in range(17))
+
+
+class LatencyHistogram:
+    """Histogram of durations with power of two buckets"""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Add one duration."""
+        bucket = 0
+        while bucket < len(self.bounds) and seconds > self.bounds[bucket]:
+            bucket += 1
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self):
+        """Mean duration, or 0.0 if nothing was recorded"""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """
+        Return the upper bound of the bucket holding the given percentile
+        (the maximum for the last bucket).
+        """
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if bucket < len(self.bounds):
+                    return min(self.bounds[bucket], self.max)
+                return self.max
+        return self.max
+
+    def as_dict(self):
+        """Return the histogram as plain data."""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "buckets": [
+                {"le": bound, "count": count}
+                for bound, count in zip(self.bounds + (None,), self.counts)
+            ],
+        }
+
+
+class CompressionStats:  # pylint: disable=too-many-instance-attributes
+    """
+    Counters filled in by BlockCompressor as it runs; read them at any time
+    (for example from a progress callback) or once compression is done.
+    All durations are in seconds.
+
+    - read_seconds: time the read thread of PigzFile ran
+    - read_wait_seconds: time the reading side waited for room in the
+      in-flight window (the pool or the writer is the bottleneck)
+    - compress_seconds: time spent compressing, summed over all workers
+    - write_seconds: time the write thread ran, of which write_wait_seconds
+      waiting for the next chunk; reorder_stalls counts the waits where
+      later chunks were already compressed (the next one was slow)
+    - queue_depth, max_queue_depth: chunks between the reader and the disk
+    - reorder_depth, max_reorder_depth: compressed chunks waiting to be
+      written in order
+    - block_latency: histogram of the time taken to compress each block
+    - stored_blocks: blocks found incompressible and stored without deflate
+    - level_blocks: blocks deflated at each compression level, which varies
+      with a target throughput or deadline (see pigz_python.adaptive)
+    """
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.chunks_in = 0
+        self.chunks_out = 0
+        self.read_seconds = 0.0
+        self.read_wait_seconds = 0.0
+        self.compress_seconds = 0.0
+        self.write_seconds = 0.0
+        self.write_wait_seconds = 0.0
+        self.reorder_stalls = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.reorder_depth = 0
+        self.max_reorder_depth = 0
+        self.block_latency = LatencyHistogram()
+        self.stored_blocks = 0
+        self.level_blocks = {}
+        self.started = time.perf_counter()
+        self.finished = None
+        # Workers record their blocks concurrently
+        self._lock = Lock()
+
+    @property
+    def elapsed_seconds(self):
+        """Wall time since compression started, up to when it finished"""
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    @property
+    def ratio(self):
+        """Compression ratio (input bytes per output byte) so far"""
+        return self.bytes_in / self.bytes_out if self.bytes_out else 0.0
+
+    def record_block(self, seconds, stored=False, level=None):
+        """
+        Account for one block compressed at `level` (or stored) by a worker.
+        """
+        with self._lock:
+            self.compress_seconds += seconds
+            self.block_latency.record(seconds)
+            if stored:
+                self.stored_blocks += 1
+            elif level is not None:
+                self.level_blocks[level] = self.level_blocks.get(level, 0) + 1
+
+    def as_dict(self):
+        """Return the counters as plain data, e.g. for logging as JSON."""
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "chunks_in": self.chunks_in,
+            "chunks_out": self.chunks_out,
+            "ratio": self.ratio,
+            "elapsed_seconds": self.elapsed_seconds,
+            "read_seconds": self.read_seconds,
+            "read_wait_seconds": self.read_wait_seconds,
+            "compress_seconds": self.compress_seconds,
+            "write_seconds": self.write_seconds,
+            "write_wait_seconds": self.write_wait_seconds,
+            "reorder_stalls": self.reorder_stalls,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "reorder_depth": self.reorder_depth,
+            "max_reorder_depth": self.max_reorder_depth,
+            "block_latency": self.block_latency.as_dict(),
+            "stored_blocks": self.stored_blocks,
+            "level_blocks": dict(sorted(self.level_blocks.items())),
+        }
+
+    def __repr__(self):
+        return (
+            f"CompressionStats(bytes_in={self.bytes_in}, "
+            f"bytes_out={self.bytes_out}, chunks_out={self.chunks_out}, "
+            f"elapsed_seconds={self.elapsed_seconds:.3f})"
+        )
+
+
+class ChunkTrace:
+    """
+    Lifecycle of every chunk: submitted by the reader, compressed by a
+    worker, written by the writer. Spans are recorded with
+    time.perf_counter() and the recording thread.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans = []
+        self._thread_names = {}
+
+    def record(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, name, chunk_num, start, end, thread_name=None, thread=None
+    ):
+        """
+        Add a span for a chunk, shown on the track of `thread` (default: the
+        calling thread) labelled `thread_name` (default: the span's name).
+        """
+        if thread is None:
+            thread = get_ident()
+        self._thread_names.setdefault(thread, thread_name or name)
+        # list.append is atomic, so workers can record concurrently
+        self.spans.append((name, chunk_num, start, end, thread))
+
+    def to_chrome_trace(self):
+        """Return the trace as a Chrome trace event format object."""
+        events = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": 1,
+                "tid": thread,
+                "args": {"name": name},
+            }
+            for thread, name in self._thread_names.items()
+        ]
+        for name, chunk_num, start, end, thread in self.spans:
+            events.append(
+                {
+                    "name": name,
+                    "cat": "chunk",
+                    "ph": "X",
+                    "pid": 1,
+                    "tid": thread,
+                    "ts": (start - self.origin) * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "args": {"chunk": chunk_num},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, filename):
+        """Write the trace to `filename` as JSON."""
+        with open(filename, "w", encoding="utf-8") as trace_file:
+            json.dump(self.to_chrome_trace(), trace_file)
@@ -0,0 +1,139 @@
+"""
+Choose the block size and worker count for an input automatically, from its
+size, the CPUs this process may actually use (affinity and cgroup quota) and
+a short calibration probe that compresses the start of the input.
+"""
+
+import math
+import os
+import time
+from pathlib import Path
+
+from pigz_python.backends import DEFAULT_BACKEND
+from pigz_python.workers import compress_block
+
+# Pass as `blocksize` and/or `workers` to have them chosen for the input
+AUTO = "auto"
+# Inputs up to this size are compressed on one thread, without probing
+AUTO_SERIAL_SIZE = 1024 * 1024
+# If one core would compress the input faster than this, starting a pool
+# and handing blocks between threads costs more than it saves
+AUTO_SERIAL_SECONDS = 0.05
+# Bytes of the input compressed to measure throughput
+AUTO_PROBE_SIZE = 128 * 1024
+# Blocks per worker, so workers stay busy while the slowest block finishes
+AUTO_BLOCKS_PER_WORKER = 4
+# Range of block sizes chosen, in KB like `blocksize`
+AUTO_MIN_BLOCK_SIZE_KB = 64
+AUTO_MAX_BLOCK_SIZE_KB = 1024
+# Block size when the size of the input isn't known, as pigz uses
+AUTO_UNKNOWN_SIZE_BLOCK_SIZE_KB = 128
+
+_CGROUP_V2_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+_CGROUP_V1_CPU = Path("/sys/fs/cgroup/cpu")
+
+
+def _cgroup_cpu_limit():
+    """
+    Return the CPU quota of this process's cgroup, rounded up to whole
+    CPUs, or None if there is none (or it can't be read).
+    """
+    try:
+        if _CGROUP_V2_CPU_MAX.exists():
+            quota, period = _CGROUP_V2_CPU_MAX.read_text(encoding="ascii").split()
+            if quota == "max":
+                return None
+        else:
+            quota = (_CGROUP_V1_CPU / "cpu.cfs_quota_us").read_text(encoding="ascii")
+            period = (_CGROUP_V1_CPU / "cpu.cfs_period_us").read_text(encoding="ascii")
+        quota, period = int(quota), int(period)
+    except (OSError, ValueError):
+        return None
+    if quota <= 0 or period <= 0:
+        return None
+    return max(1, math.ceil(quota / period))
+
+
+def effective_cpu_count():
+    """
+    Number of CPUs this process can run on: os.cpu_count() limited by the
+    CPU affinity mask and the cgroup CPU quota (e.g. a container's limit).
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, limit)
+    return max(cpus, 1)
+
+
+def measure_throughput(sample, compresslevel, backend=DEFAULT_BACKEND):
+    """
+    Return how many bytes per second one core compresses `sample` at.
+    """
+    start = time.perf_counter()
+    compress_block(sample, compresslevel, True, backend=backend)
+    # Guard against a timer too coarse to see a tiny sample
+    return len(sample) / max(time.perf_counter() - start, 1e-6)
+
+
+def read_probe(path):
+    """
+    Return the first AUTO_PROBE_SIZE bytes of the file at `path`.
+    """
+    with open(path, "rb") as probe_file:
+        return probe_file.read(AUTO_PROBE_SIZE)
+
+
+def choose_settings(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    input_size,
+    compresslevel,
+    blocksize=AUTO,
+    workers=AUTO,
+    sample=b"",
+    backend=DEFAULT_BACKEND,
+):
+    """
+    Resolve AUTO `blocksize` and `workers` for an input of `input_size`
+    bytes (None if unknown). `sample`, the start of the input, calibrates
+    the throughput of a core; it is only needed for inputs larger than
+    AUTO_SERIAL_SIZE. It is compressed with `backend`.
+    Return (blocksize, workers, serial): `serial` is true when the input is
+    better compressed on a single thread than on a pool.
+    Values given explicitly are returned as they are.
+    """
+    cpus = effective_cpu_count()
+    if input_size is None:
+        # Nothing to go on (e.g. a directory): use every CPU we may
+        return (
+            AUTO_UNKNOWN_SIZE_BLOCK_SIZE_KB if blocksize == AUTO else blocksize,
+            cpus if workers == AUTO else workers,
+            False,
+        )
+
+    serial = False
+    if workers == AUTO:
+        if input_size <= AUTO_SERIAL_SIZE or cpus == 1:
+            serial = True
+        elif sample:
+            seconds = input_size / measure_throughput(sample, compresslevel, backend)
+            serial = seconds < AUTO_SERIAL_SECONDS
+        if serial:
+            workers = 1
+        else:
+            # No more workers than there are minimum-size blocks to share
+            min_block = AUTO_MIN_BLOCK_SIZE_KB * 1000
+            workers = max(1, min(cpus, input_size // min_block))
+
+    if blocksize == AUTO:
+        if serial:
+            blocksize = AUTO_MAX_BLOCK_SIZE_KB
+        else:
+            per_block = input_size / (workers * AUTO_BLOCKS_PER_WORKER) / 1000
+            blocksize = min(
+                max(math.ceil(per_block), AUTO_MIN_BLOCK_SIZE_KB),
+                AUTO_MAX_BLOCK_SIZE_KB,
+            )
+    return blocksize, workers, serial
@@ -0,0 +1,355 @@
+"""
+Work done on the compression pool: deflating chunks, either in a thread of
+the main process or in worker processes that read chunks from shared memory.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from multiprocessing import Pool as ProcessPool
+from multiprocessing import resource_tracker, shared_memory
+from queue import Queue
+
+from pigz_python.backends import DEFAULT_BACKEND, get_backend
+
+# To judge whether a chunk is worth deflating, it is split into
+# ENTROPY_REGIONS regions and each region sampled in ENTROPY_SLICES evenly
+# spaced slices of ENTROPY_SLICE_SIZE bytes
+ENTROPY_REGIONS = 8
+ENTROPY_SLICES = 8
+ENTROPY_SLICE_SIZE = 128
+# A chunk is stored rather than deflated if every region samples at this
+# many bits per byte or more. Samples of random or already-compressed data
+# come out at 7.75 to 7.9; deflate gains nothing on them.
+INCOMPRESSIBLE_ENTROPY = 7.7
+# Byte entropy can't see repeats, which deflate finds within its 32 KiB
+# window, so the verdict is confirmed by deflating TRIAL_SAMPLES slices of
+# TRIAL_SIZE bytes at level 1, each primed with the window before it. The
+# chunk is stored only if none of them shrinks below TRIAL_RATIO of its size.
+TRIAL_SAMPLES = 4
+TRIAL_SIZE = 2 * 1024
+TRIAL_RATIO = 0.99
+# Deflate's history window
+_WINDOW_SIZE = 32 * 1024
+# Primed compressor templates each thread keeps, one per backend and level
+MAX_COMPRESSOR_TEMPLATES = 4
+
+
+class _CompressorTemplates(threading.local):  # pylint: disable=too-few-public-methods
+    """
+    The compressor templates of one thread, by (backend name, level), least
+    recently used first: each is (dictionary, primed compressor or None).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.templates = OrderedDict()
+
+
+_TEMPLATES = _CompressorTemplates()
+
+
+def new_compressor(backend, compression_level, zdict=None):
+    """
+    Return a raw deflate compressor from `backend` (a DeflateBackend),
+    primed with `zdict` if given.
+    Priming with a 32 KiB dictionary costs far more than the rest of setting
+    up a compressor, or than copying one, so each thread remembers the last
+    dictionary it was given for each backend and level. When the same one
+    comes again, as it does through runs of zeros or other repeated data, a
+    primed template is kept and copied from then on.
+    A compressor without a dictionary is cheaper to create than to copy.
+    """
+    if not zdict:
+        return backend.compressobj(compression_level)
+    templates = _TEMPLATES.templates
+    key = (backend.name, compression_level)
+    cached = templates.get(key)
+    if cached is not None and cached[0] == zdict:
+        templates.move_to_end(key)
+        template = cached[1]
+        if template is None:
+            template = backend.compressobj(compression_level, zdict)
+            templates[key] = (cached[0], template)
+        if hasattr(template, "copy"):
+            return template.copy()
+    else:
+        templates[key] = (bytes(zdict), None)
+        templates.move_to_end(key)
+        while len(templates) > MAX_COMPRESSOR_TEMPLATES:
+            templates.popitem(last=False)
+    return backend.compressobj(compression_level, zdict)
+
+
+def compress_block(
+    chunk, compression_level, is_last_chunk, zdict=None, backend=DEFAULT_BACKEND
+):
+    """
+    Deflate one chunk as a raw deflate fragment, primed with `zdict` if given,
+    with the named deflate `backend` (see pigz_python.backends).
+    The last chunk ends the deflate stream; any other chunk ends on a
+    byte-aligned sync flush so the next chunk can be appended to it.
+    """
+    compressor = new_compressor(get_backend(backend), compression_level, zdict)
+    compressed_data = compressor.compress(chunk)
+    if is_last_chunk:
+        compressed_data += compressor.flush(zlib.Z_FINISH)
+    else:
+        compressed_data += compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    return compressed_data
+
+
+def byte_entropy(data):
+    """
+    Entropy of the byte frequencies of `data`, in bits per byte.
+    """
+    size = len(data)
+    if not size:
+        return 0.0
+    return (
+        math.log2(size)
+        - sum(count * math.log2(count) for count in Counter(data).values()) / size
+    )
+
+
+def is_incompressible(chunk, zdict=None):
+    """
+    Whether deflate is not expected to shrink `chunk`, primed with `zdict`
+    if given: the byte entropy of every region of it, sampled, is at least
+    INCOMPRESSIBLE_ENTROPY, and trial deflates of a few slices (see
+    TRIAL_SAMPLES) confirm it doesn't repeat itself or `zdict`.
+    Checking regions separately catches a chunk that is only partly
+    compressible, such as one spanning the end of an image and a text file.
+    Chunks too small to sample are never considered incompressible.
+    """
+    region_size = len(chunk) // ENTROPY_REGIONS
+    step = region_size // ENTROPY_SLICES
+    if step < ENTROPY_SLICE_SIZE:
+        return False
+    for region_start in range(0, region_size * ENTROPY_REGIONS, region_size):
+        sample = bytearray()
+        for start in range(region_start, region_start + step * ENTROPY_SLICES, step):
+            end = start + ENTROPY_SLICE_SIZE
+            sample += chunk[start:end]
+        if byte_entropy(sample) < INCOMPRESSIBLE_ENTROPY:
+            return False
+    return not _trial_deflates(chunk, zdict)
+
+
+def _trial_deflates(chunk, zdict=None):
+    """
+    Whether any of TRIAL_SAMPLES slices of `chunk`, each at the end of an
+    equal part of it, deflates at level 1 below TRIAL_RATIO of its size when
+    primed with the data before it, as it would be in the compressed chunk.
+    """
+    length = len(chunk)
+    for sample in range(1, TRIAL_SAMPLES + 1):
+        end = length * sample // TRIAL_SAMPLES
+        start = max(0, end - TRIAL_SIZE)
+        window_start = max(0, start - _WINDOW_SIZE)
+        window = bytes(chunk[window_start:start])
+        missing = _WINDOW_SIZE - len(window)
+        if zdict and missing:
+            window = bytes(zdict[-missing:]) + window
+        if window:
+            compressor = zlib.compressobj(
+                1, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=window
+            )
+        else:
+            compressor = zlib.compressobj(1, zlib.DEFLATED, -zlib.MAX_WBITS)
+        deflated = compressor.compress(chunk[start:end])
+        deflated += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if len(deflated) < (end - start) * TRIAL_RATIO:
+            return True
+    return False
+
+
+def store_block(chunk, is_last_chunk):
+    """
+    Wrap one chunk in stored (uncompressed) deflate blocks, ending it as
+    compress_block does. Stored blocks are the same whatever the backend.
+    """
+    compressor = zlib.compressobj(0, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed_data = compressor.compress(chunk)
+    if is_last_chunk:
+        compressed_data += compressor.flush(zlib.Z_FINISH)
+    else:
+        compressed_data += compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    return compressed_data
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def compress_or_store_block(
+    chunk,
+    compression_level,
+    is_last_chunk,
+    zdict=None,
+    backend=DEFAULT_BACKEND,
+    store_incompressible=True,
+):
+    """
+    Deflate one chunk as compress_block does, or with `store_incompressible`,
+    store it if sampling it says deflate would gain nothing.
+    Return (compressed chunk, whether it was stored).
+    """
+    if store_incompressible and is_incompressible(chunk, zdict):
+        return store_block(chunk, is_last_chunk), True
+    compressed_data = compress_block(
+        chunk, compression_level, is_last_chunk, zdict, backend
+    )
+    return compressed_data, False
+
+
+class InlinePool:
+    """
+    Stand-in for a pool that runs every task straight away on the thread
+    submitting it, for inputs too small for parallelism to pay off.
+    """
+
+    @staticmethod
+    def apply_async(func, args=(), kwds=None, callback=None, error_callback=None):
+        """Run `func` now and pass its result or error to the callbacks."""
+        try:
+            result = func(*args, **(kwds or {}))
+        except Exception as error:  # pylint: disable=broad-except
+            if error_callback is None:
+                raise
+            error_callback(error)
+            return
+        if callback is not None:
+            callback(result)
+
+    def close(self):
+        """Nothing to shut down."""
+
+    def join(self):
+        """Nothing to wait for."""
+
+
+# Shared memory segments attached by this (worker) process, by name,
+# least recently used first
+_ATTACHED_SEGMENTS = OrderedDict()
+# A pool shared by many compressors sees many rings; unmap old ones
+_MAX_ATTACHED_SEGMENTS = 16
+
+
+def _attach_shared_memory(name):
+    """
+    Attach to a shared memory segment created by the parent process.
+    Workers started by create_process_pool share the parent's resource
+    tracker, which already knows about the segment; the parent unlinks it
+    once compression is done.
+    """
+    segment = _ATTACHED_SEGMENTS.get(name)
+    if segment is not None:
+        _ATTACHED_SEGMENTS.move_to_end(name)
+    else:
+        if sys.version_info >= (3, 13):
+            # pylint: disable-next=unexpected-keyword-arg
+            segment = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            segment = shared_memory.SharedMemory(name=name)
+        _ATTACHED_SEGMENTS[name] = segment
+        while len(_ATTACHED_SEGMENTS) > _MAX_ATTACHED_SEGMENTS:
+            _ATTACHED_SEGMENTS.popitem(last=False)[1].close()
+    return segment
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def timed_compress_shared_block(  # pylint: disable=too-many-arguments
+    segment_name,
+    offset,
+    length,
+    compression_level,
+    is_last_chunk,
+    zdict=None,
+    backend=DEFAULT_BACKEND,
+    store_incompressible=False,
+):
+    """
+    Compress a chunk stored in a shared memory ring slot, and return
+    ((CRC-32, compressed chunk, whether it was stored), start, end, pid):
+    when it started and ended (time.perf_counter(), which is system-wide on
+    the supported platforms) and the worker's process ID, for the
+    pipeline's stats and trace.
+    This function is run on a worker process.
+    """
+    start = time.perf_counter()
+    segment = _attach_shared_memory(segment_name)
+    end = offset + length
+    with segment.buf[offset:end] as chunk:
+        chunk_crc = get_backend(backend).crc32(chunk)
+        compressed_chunk, stored = compress_or_store_block(
+            chunk,
+            compression_level,
+            is_last_chunk,
+            zdict,
+            backend,
+            store_incompressible,
+        )
+    return (
+        (chunk_crc, compressed_chunk, stored),
+        start,
+        time.perf_counter(),
+        os.getpid(),
+    )
+
+
+def create_process_pool(processes):
+    """
+    Return a pool of `processes` worker processes to pass chunks to through
+    a SharedBlockRing. The resource tracker is started first so the workers
+    share it: a worker forked before it runs starts its own, which then
+    reports the rings the worker attached to as leaked at exit and tries to
+    unlink them again.
+    """
+    if os.name == "posix":
+        resource_tracker.ensure_running()
+    return ProcessPool(processes=processes)
+
+
+class SharedBlockRing:
+    """
+    A shared memory segment split into fixed-size slots, used to hand chunks
+    to worker processes without pickling them.
+    """
+
+    def __init__(self, slots, slot_size):
+        self.slot_size = max(slot_size, 1)
+        self.segment = shared_memory.SharedMemory(
+            create=True, size=slots * self.slot_size
+        )
+        self._free_slots = Queue()
+        for slot in range(slots):
+            self._free_slots.put(slot)
+
+    @property
+    def name(self):
+        """Name worker processes attach to"""
+        return self.segment.name
+
+    def store(self, chunk):
+        """
+        Copy `chunk` into a free slot, waiting for one if needed.
+        Return the slot number and its offset in the segment.
+        """
+        slot = self._free_slots.get()
+        offset = slot * self.slot_size
+        end = offset + len(chunk)
+        self.segment.buf[offset:end] = chunk
+        return slot, offset
+
+    def release(self, slot):
+        """Make a slot available again."""
+        self._free_slots.put(slot)
+
+    def close(self):
+        """Free the shared memory segment."""
+        self.segment.close()
+        self.segment.unlink()
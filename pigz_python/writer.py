@@ -0,0 +1,169 @@
+"""
+File-like interface to the parallel compressor, for data that isn't in a file.
+"""
+
+import io
+import os
+
+from pigz_python.backends import DEFAULT_BACKEND
+from pigz_python.compressor import (
+    _COMPRESS_LEVEL_BEST,
+    CPU_COUNT,
+    DEFAULT_BLOCK_SIZE_KB,
+    BlockCompressor,
+)
+from pigz_python.sink import DEFAULT_WRITE_BUFFER_SIZE
+
+
+class PigzWriter(io.BufferedIOBase):
+    """
+    Writable binary stream that gzips what is written to it in parallel,
+    for use in place of gzip.open(..., "wb") or gzip.GzipFile.
+    """
+
+    # pylint: disable-next=too-many-locals
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        fileobj,
+        compresslevel=_COMPRESS_LEVEL_BEST,
+        blocksize=DEFAULT_BLOCK_SIZE_KB,
+        workers=CPU_COUNT,
+        max_inflight_blocks=None,
+        max_buffer_bytes=None,
+        independent=False,
+        mtime=None,
+        filename=None,
+        executor="thread",
+        pool=None,
+        progress=None,
+        trace=False,
+        backend=DEFAULT_BACKEND,
+        bgzf=False,
+        rsyncable=False,
+        store_incompressible=True,
+        write_buffer_size=DEFAULT_WRITE_BUFFER_SIZE,
+        target_throughput=None,
+        deadline=None,
+        expected_size=None,
+    ):
+        """
+        `fileobj` is a path to create, a file descriptor (such as a pipe) or
+        a writable binary file object. A file descriptor or file object is
+        left open on close, as gzip.GzipFile does.
+        `filename` and `mtime` go in the gzip header; the filename defaults
+        to the name of the path or file object.
+        `progress`, `trace`, `backend`, `bgzf`, `rsyncable`,
+        `store_incompressible`, `write_buffer_size`, `target_throughput`,
+        `deadline` and `expected_size` are as for BlockCompressor; a
+        deadline needs the expected size of the data.
+        """
+        super().__init__()
+        self.fileobj = fileobj
+        # A path is opened by the compressor's output sink, which closes it
+        owns_fileobj = isinstance(fileobj, (str, bytes, os.PathLike))
+        if filename is None:
+            filename = fileobj if owns_fileobj else getattr(fileobj, "name", None)
+            if not isinstance(filename, (str, bytes, os.PathLike)):
+                filename = None
+
+        self._compressor = BlockCompressor(
+            compresslevel,
+            blocksize,
+            workers,
+            max_inflight_blocks=max_inflight_blocks,
+            max_buffer_bytes=max_buffer_bytes,
+            independent=independent,
+            executor=executor,
+            pool=pool,
+            progress=progress,
+            trace=trace,
+            backend=backend,
+            bgzf=bgzf,
+            rsyncable=rsyncable,
+            store_incompressible=store_incompressible,
+            write_buffer_size=write_buffer_size,
+            target_throughput=target_throughput,
+            deadline=deadline,
+            expected_size=expected_size,
+        )
+        self._compressor.close_output_file = owns_fileobj
+        self._compressor.mtime = mtime
+        self._compressor.fname = filename
+        self._compressor.start(self.fileobj)
+
+    @property
+    def checksum(self):
+        """CRC-32 of the data written out so far"""
+        return self._compressor.checksum
+
+    @property
+    def stats(self):
+        """Runtime metrics of the compressor (a CompressionStats)"""
+        return self._compressor.stats
+
+    @property
+    def trace(self):
+        """The ChunkTrace, if created with `trace=True`"""
+        return self._compressor.trace
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        """Number of uncompressed bytes written, as gzip.GzipFile reports"""
+        self._check_not_closed()
+        return self._compressor.input_size + len(self._compressor.feed_buffer)
+
+    def write(self, data):  # pylint: disable=arguments-renamed
+        """
+        Buffer `data` and hand every full chunk to the pool.
+        Blocks while the in-flight window is full.
+        """
+        self._check_not_closed()
+        self._raise_error()
+        return self._run(self._compressor.feed, data)
+
+    def close(self):
+        """
+        Compress what is left, write the trailer and wait for the writer.
+        """
+        if self.closed:
+            return
+        try:
+            self._run(self._compressor.finish)
+            self._compressor.write_thread.join()
+            self._raise_error()
+        finally:
+            super().close()
+
+    def abort(self):
+        """
+        Stop compressing and close without writing the rest of the stream.
+        What was already written to the file object is left there.
+        """
+        if self.closed:
+            return
+        self._compressor.abort()
+        self._compressor.write_thread.join()
+        super().close()
+
+    def _run(self, method, *args):
+        """Call a compressor method, surfacing any pipeline failure."""
+        try:
+            return method(*args)
+        except Exception as error:  # pylint: disable=broad-except
+            # Stop the write thread; if compression had already failed, it
+            # still reports that first failure
+            self._compressor.abort(error)
+            self._compressor.write_thread.join()
+            self._raise_error()
+            raise
+
+    def _raise_error(self):
+        """Re-raise a failure reported by the write thread."""
+        if self._compressor.error is not None:
+            raise self._compressor.error
+
+    def _check_not_closed(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
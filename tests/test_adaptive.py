@@ -0,0 +1,101 @@
+"""
+Unit tests for the adaptive compression level
+"""
+
+import gzip
+import io
+import unittest
+from pathlib import Path
+
+from pigz_python import PigzWriter, compress_file
+from pigz_python.adaptive import AdaptiveLevel
+
+LOREM_IPSUM = Path("tests", "lorem_ipsum.txt")
+MB = 1000 * 1000
+
+
+class TestAdaptiveLevel(unittest.TestCase):
+    """Unit tests for AdaptiveLevel"""
+
+    def test_raises_level_while_ahead(self):
+        """
+        Test that the level goes up while the next one is expected to keep up
+        """
+        controller = AdaptiveLevel(9, workers=4, target_throughput=10 * MB)
+        self.assertEqual(controller.next_level(0, backlog=False), 1)
+        # Level 1 manages 4 workers / 10 ns per byte = 400 MB/s
+        controller.record(1, MB, 0.01)
+        self.assertEqual(controller.next_level(MB, backlog=False), 2)
+        # Level 2 isn't measured yet, so it is kept
+        self.assertEqual(controller.next_level(MB, backlog=True), 2)
+
+    def test_lowers_level_when_behind(self):
+        """
+        Test that the level goes down when the pool can't keep up, but only
+        if it has a backlog
+        """
+        controller = AdaptiveLevel(9, workers=2, target_throughput=100 * MB)
+        controller.level = 6
+        # Level 6 manages 2 workers / 50 ns per byte = 40 MB/s
+        controller.record(6, MB, 0.05)
+        self.assertEqual(controller.next_level(0, backlog=False), 6)
+        self.assertEqual(controller.next_level(0, backlog=True), 5)
+
+    def test_stays_within_max_level(self):
+        """
+        Test that the level never goes above the one given
+        """
+        controller = AdaptiveLevel(3, workers=8, target_throughput=MB)
+        for level in range(1, 4):
+            controller.record(level, MB, 0.001)
+            controller.next_level(0, backlog=False)
+        self.assertEqual(controller.level, 3)
+
+    def test_deadline_rate(self):
+        """
+        Test that a deadline asks for the rest of the input over the time left
+        """
+        controller = AdaptiveLevel(9, workers=1, deadline=100, expected_size=1000 * MB)
+        self.assertAlmostEqual(controller.required_rate(500 * MB) / MB, 5, places=1)
+        controller.deadline = 0
+        self.assertEqual(controller.required_rate(500 * MB), float("inf"))
+        self.assertEqual(controller.required_rate(1000 * MB), 0)
+
+    def test_needs_one_target(self):
+        """
+        Test that exactly one target is given, and a deadline with a size
+        """
+        with self.assertRaises(ValueError):
+            AdaptiveLevel(9, workers=1)
+        with self.assertRaises(ValueError):
+            AdaptiveLevel(9, workers=1, target_throughput=MB, deadline=1)
+        with self.assertRaises(ValueError):
+            AdaptiveLevel(9, workers=1, deadline=1)
+
+
+class TestAdaptiveCompression(unittest.TestCase):
+    """Tests of compressing with a target throughput or deadline"""
+
+    def test_compress_file_reports_levels(self):
+        """
+        Test that the output is valid and the chosen levels are reported
+        """
+        data = LOREM_IPSUM.read_bytes()
+        output = Path(f"{LOREM_IPSUM}.gz")
+        self.addCleanup(output.unlink)
+        stats = compress_file(LOREM_IPSUM, blocksize=1, workers=2, deadline=60)
+        self.assertEqual(gzip.decompress(output.read_bytes()), data)
+        self.assertEqual(sum(stats.level_blocks.values()), stats.chunks_out)
+        self.assertIn(1, stats.level_blocks)
+        self.assertEqual(stats.as_dict()["level_blocks"], stats.level_blocks)
+
+    def test_writer_deadline_needs_size(self):
+        """
+        Test that PigzWriter needs the expected size for a deadline
+        """
+        with self.assertRaises(ValueError):
+            PigzWriter(io.BytesIO(), deadline=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+"""
+Unit tests for the Pigz Python asyncio interface
+"""
+
+import asyncio
+import gzip
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from pigz_python import aio
+from pigz_python.checkpoint import CHECKPOINT_SUFFIX
+from pigz_python.pigz_python import PigzFile
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+async def iterate_pieces(data, size):
+    """Yield `data` in pieces of `size` bytes, like a request body."""
+    for start in range(0, len(data), size):
+        end = start + size
+        yield data[start:end]
+        await asyncio.sleep(0)
+
+
+class TestAsyncCompression(unittest.IsolatedAsyncioTestCase):
+    """Unit tests for compress_file_async and compress_stream_async"""
+
+    def setUp(self):
+        """
+        Load the lorem ipsum text used as test data.
+        """
+        self.data = Path("tests", LOREM_IPSUM_FILE).read_bytes()
+
+    async def test_compress_file_async(self):
+        """
+        Test that a file compressed from the event loop decompresses intact
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory, LOREM_IPSUM_FILE)
+            shutil.copy(Path("tests", LOREM_IPSUM_FILE), source)
+
+            threads = []
+
+            def create(*args, **kwargs):
+                threads.append(threading.get_ident())
+                return PigzFile(*args, **kwargs)
+
+            with patch.object(aio, "PigzFile", side_effect=create):
+                stats = await aio.compress_file_async(source, blocksize=1, workers=2)
+
+            with gzip.open(str(source) + ".gz") as compressed:
+                self.assertEqual(compressed.read(), self.data)
+        self.assertEqual(stats.bytes_in, len(self.data))
+        # Created on an executor thread, not the event loop's
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    async def test_compress_file_async_cancelled(self):
+        """
+        Test that cancelling removes the partial output file
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory, "large.txt")
+            source.write_bytes(self.data * 200)
+
+            task = asyncio.ensure_future(
+                aio.compress_file_async(source, blocksize=1, workers=1)
+            )
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+            self.assertFalse(Path(str(source) + ".gz").exists())
+
+    async def test_compress_file_async_cancelled_early(self):
+        """
+        Test cancelling while the PigzFile is still being created
+        """
+        creating = threading.Event()
+        created = threading.Event()
+
+        def create(*args, **kwargs):
+            creating.set()
+            created.wait(5)
+            return PigzFile(*args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory, "large.txt")
+            source.write_bytes(self.data * 200)
+
+            with patch.object(aio, "PigzFile", side_effect=create):
+                task = asyncio.ensure_future(
+                    aio.compress_file_async(source, blocksize=1, workers=1)
+                )
+                while not creating.is_set():
+                    await asyncio.sleep(0.001)
+                task.cancel()
+                await asyncio.sleep(0.01)
+                created.set()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+            self.assertFalse(Path(str(source) + ".gz").exists())
+
+    async def test_compress_file_async_cancelled_checkpoint(self):
+        """
+        Test that cancelling keeps a checkpointed output to resume from
+        """
+        loop = asyncio.get_running_loop()
+        checkpointed = asyncio.Event()
+
+        def progress(stats):
+            if stats.chunks_out == 4:
+                loop.call_soon_threadsafe(checkpointed.set)
+            elif stats.chunks_out > 4:
+                # Leave time to cancel before the output is complete
+                time.sleep(0.05)
+
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory, "large.txt")
+            source.write_bytes(self.data * 200)
+            output = Path(str(source) + ".gz")
+            checkpoint = Path(str(output) + CHECKPOINT_SUFFIX)
+            options = {"blocksize": 16, "workers": 1, "checkpoint_interval": 32768}
+
+            task = asyncio.ensure_future(
+                aio.compress_file_async(
+                    source, checkpoint=True, progress=progress, **options
+                )
+            )
+            await checkpointed.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+            self.assertTrue(output.exists())
+            self.assertTrue(checkpoint.exists())
+            self.assertFalse(Path(str(checkpoint) + ".tmp").exists())
+            await aio.compress_file_async(source, resume=True, **options)
+            self.assertFalse(checkpoint.exists())
+            with gzip.open(output) as compressed:
+                self.assertEqual(compressed.read(), self.data * 200)
+
+    async def test_compress_stream_async(self):
+        """
+        Test that the yielded pieces form one valid gzip stream
+        """
+        pieces = [
+            piece
+            async for piece in aio.compress_stream_async(
+                iterate_pieces(self.data, 1000), blocksize=1, workers=2
+            )
+        ]
+
+        self.assertGreater(len(pieces), 1)
+        self.assertEqual(gzip.decompress(b"".join(pieces)), self.data)
+
+    async def test_compress_stream_async_stops_early(self):
+        """
+        Test that closing the generator early stops the writer
+        """
+        stream = aio.compress_stream_async(
+            iterate_pieces(self.data * 50, 1000),
+            max_pending_output=1,
+            blocksize=1,
+            workers=1,
+        )
+        first = await stream.__anext__()
+        await stream.aclose()
+
+        self.assertEqual(first[:2], b"\x1f\x8b")
+
+    async def test_compress_stream_async_source_error(self):
+        """
+        Test that an error from the input iterator reaches the consumer
+        """
+
+        async def failing_source():
+            yield self.data
+            raise ValueError("upload aborted")
+
+        with self.assertRaises(ValueError):
+            async for _ in aio.compress_stream_async(failing_source(), workers=1):
+                pass
+
+
+if __name__ == "__main__":
+    unittest.main()
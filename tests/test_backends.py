@@ -0,0 +1,111 @@
+"""
+Unit tests for the Pigz Python deflate backends
+"""
+
+import gzip
+import importlib
+import shutil
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+from unittest.mock import patch
+
+import pigz_python.pigz_python as pigz_python
+from pigz_python import backends
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+real_import_module = importlib.import_module
+
+
+def import_only_zlib(name):
+    """importlib.import_module as if no optional backend were installed."""
+    if name != "zlib":
+        raise ImportError(name)
+    return real_import_module(name)
+
+
+def import_zlib_as_isal(name):
+    """importlib.import_module with zlib standing in for isal_zlib."""
+    if name == "isal.isal_zlib":
+        return zlib
+    return import_only_zlib(name)
+
+
+class TestBackends(unittest.TestCase):
+    """Unit tests for get_backend and DeflateBackend"""
+
+    def setUp(self):
+        """
+        Start from an empty backend cache.
+        """
+        backends.get_backend.cache_clear()
+        self.addCleanup(backends.get_backend.cache_clear)
+
+    def test_zlib_backend(self):
+        """
+        Test that the zlib backend round-trips raw deflate and CRC-32
+        """
+        backend = backends.get_backend("zlib")
+        data = b"This is a test string" * 100
+        compressor = backend.compressobj(9, zdict=b"test string")
+        compressed = compressor.compress(data) + compressor.flush()
+
+        decompressor = backend.decompressobj(zdict=b"test string")
+        self.assertEqual(decompressor.decompress(compressed), data)
+        self.assertEqual(backend.crc32(data), zlib.crc32(data))
+
+    def test_unknown_backend(self):
+        """
+        Test that an unknown backend name is rejected
+        """
+        with self.assertRaises(ValueError):
+            backends.get_backend("brotli")
+
+    @patch("importlib.import_module", side_effect=import_only_zlib)
+    def test_auto_falls_back_to_zlib(self, _):
+        """
+        Test that "auto" uses zlib when nothing faster is installed
+        """
+        self.assertEqual(backends.get_backend("auto").name, "zlib")
+        self.assertEqual(backends.available_backends(), ("zlib",))
+
+    @patch("importlib.import_module", side_effect=import_only_zlib)
+    def test_missing_backend_warns(self, _):
+        """
+        Test that asking for a backend that isn't installed warns and uses zlib
+        """
+        with self.assertWarns(RuntimeWarning):
+            backend = backends.get_backend("zlib-ng")
+
+        self.assertEqual(backend.name, "zlib")
+
+    @patch("importlib.import_module", side_effect=import_zlib_as_isal)
+    def test_auto_prefers_isal(self, _):
+        """
+        Test that "auto" picks isal first, mapping levels to its 0-3 range
+        """
+        backend = backends.get_backend("auto")
+
+        self.assertEqual(backend.name, "isal")
+        self.assertEqual(
+            [backend.compress_level(level) for level in range(1, 10)],
+            [0, 1, 1, 1, 2, 2, 2, 3, 3],
+        )
+
+    def test_compress_file_with_auto_backend(self):
+        """
+        Test that a file compressed with the detected backend is valid gzip
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory, LOREM_IPSUM_FILE)
+            shutil.copy(Path("tests", LOREM_IPSUM_FILE), source)
+
+            pigz_python.compress_file(source, blocksize=1, backend="auto")
+
+            with gzip.open(str(source) + ".gz") as compressed:
+                self.assertEqual(compressed.read(), source.read_bytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Unit tests for compressing many files with Pigz Python
+"""
+
+import gzip
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from pigz_python import batch
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+class TestCompressFiles(unittest.TestCase):
+    """Unit tests for compress_files"""
+
+    def setUp(self):
+        """
+        Create a few files of different sizes in a temp directory.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        text = Path("tests", LOREM_IPSUM_FILE).read_bytes()
+        self.contents = {
+            Path(self.temp_dir, f"file{number}.log"): text * number
+            for number in range(6)
+        }
+        for path, content in self.contents.items():
+            path.write_bytes(content)
+
+    def assert_compressed(self):
+        """Check every file has a .gz with the original content"""
+        for path, content in self.contents.items():
+            with gzip.open(str(path) + ".gz", "rb") as result:
+                self.assertEqual(result.read(), content)
+
+    def test_compress_files(self):
+        """
+        Test compressing several files over a shared thread pool
+        """
+        batch.compress_files(self.contents, blocksize=1, workers=3, max_open_files=2)
+        self.assert_compressed()
+
+    def test_compress_files_process_executor(self):
+        """
+        Test compressing several files over a shared process pool
+        """
+        batch.compress_files(self.contents, blocksize=1, workers=2, executor="process")
+        self.assert_compressed()
+
+    def test_compress_files_process_executor_fresh_process(self):
+        """
+        Test that compressing over a shared process pool in a process that
+        hasn't used shared memory yet leaves no shared memory warnings
+        """
+        script = (
+            "import sys\n"
+            "from pigz_python import batch\n"
+            "batch.compress_files(sys.argv[1:], blocksize=1, workers=2,"
+            " executor='process')\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script, *map(str, self.contents)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertNotIn("resource_tracker", result.stderr)
+        self.assert_compressed()
+
+    def test_compress_files_missing_file(self):
+        """
+        Test that a missing file is reported after the others are compressed
+        """
+        paths = list(self.contents) + [Path(self.temp_dir, "missing.log")]
+        with self.assertRaises(FileNotFoundError):
+            batch.compress_files(paths, blocksize=1, workers=2)
+        self.assert_compressed()
@@ -0,0 +1,119 @@
+"""
+Unit tests for the Pigz Python BGZF output mode
+"""
+
+import gzip
+import io
+import shutil
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+
+import pigz_python.pigz_python as pigz_python
+from pigz_python import bgzf
+from pigz_python.writer import PigzWriter
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+class TestBgzf(unittest.TestCase):
+    """Unit tests for BGZF output"""
+
+    def setUp(self):
+        """
+        Create a test file larger than a few BGZF members.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.data = Path("tests", LOREM_IPSUM_FILE).read_bytes() * 60
+        self.source = Path(self.temp_dir, "input.txt")
+        self.source.write_bytes(self.data)
+        self.output = Path(self.temp_dir, "input.txt.gz")
+
+    def read_members(self):
+        """Return the raw bytes of every member of the output file."""
+        with open(self.output, "rb") as bgzf_file:
+            offsets = list(bgzf.iter_bgzf_members(bgzf_file))
+            members = []
+            for offset, size in offsets:
+                bgzf_file.seek(offset)
+                members.append(bgzf_file.read(size))
+        return members
+
+    def check_members(self, data):
+        """Check that every member decompresses on its own to `data`."""
+        members = self.read_members()
+        self.assertEqual(members[-1], bgzf.BGZF_EOF)
+        pieces = [zlib.decompress(member, 31) for member in members]
+        self.assertTrue(all(len(piece) <= bgzf.BGZF_MAX_INPUT_SIZE for piece in pieces))
+        self.assertEqual(b"".join(pieces), data)
+        return members
+
+    def test_compress_file(self):
+        """
+        Test that the output is plain gzip and splits into members
+        """
+        pigz_python.compress_file(self.source, bgzf=True, workers=2)
+
+        self.assertEqual(gzip.decompress(self.output.read_bytes()), self.data)
+        members = self.check_members(self.data)
+        self.assertEqual(
+            len(members), -(-len(self.data) // bgzf.BGZF_MAX_INPUT_SIZE) + 1
+        )
+
+    def test_compress_file_process_executor(self):
+        """
+        Test BGZF output from worker processes
+        """
+        pigz_python.compress_file(self.source, bgzf=True, executor="process")
+
+        self.check_members(self.data)
+
+    def test_small_blocksize(self):
+        """
+        Test that smaller blocks give more members
+        """
+        pigz_python.compress_file(self.source, blocksize=8, bgzf=True)
+
+        members = self.check_members(self.data)
+        self.assertEqual(len(members), -(-len(self.data) // 8000) + 1)
+
+    def test_empty_file(self):
+        """
+        Test that an empty file gives just the end of file marker
+        """
+        self.source.write_bytes(b"")
+
+        pigz_python.compress_file(self.source, bgzf=True)
+
+        self.assertEqual(self.output.read_bytes(), bgzf.BGZF_EOF)
+
+    def test_writer(self):
+        """
+        Test BGZF output from PigzWriter
+        """
+        sink = io.BytesIO()
+        with PigzWriter(sink, bgzf=True) as writer:
+            writer.write(self.data)
+
+        self.output.write_bytes(sink.getvalue())
+        self.check_members(self.data)
+
+    def test_index_rejected(self):
+        """
+        Test that an index can't be combined with BGZF output
+        """
+        with self.assertRaises(ValueError):
+            pigz_python.PigzFile(self.source, bgzf=True, index=True)
+
+    def test_not_bgzf(self):
+        """
+        Test that a regular gzip file is reported as not BGZF
+        """
+        with self.assertRaises(ValueError):
+            list(bgzf.iter_bgzf_members(io.BytesIO(gzip.compress(self.data))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+"""
+Unit tests for checkpointed, resumable compression
+"""
+
+import gzip
+import random
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pigz_python
+from pigz_python.checkpoint import (
+    CHECKPOINT_SUFFIX,
+    Checkpoint,
+    read_checkpoint,
+    write_checkpoint,
+)
+from pigz_python.compressor import BlockCompressor
+from pigz_python.workers import InlinePool
+
+
+class _Crash(Exception):
+    """Stands in for the process dying partway through"""
+
+
+def _crash_after(chunks):
+    """Return a progress callback that fails once `chunks` are written"""
+
+    def progress(stats):
+        if stats.chunks_out >= chunks:
+            raise _Crash()
+
+    return progress
+
+
+class TestCheckpoint(unittest.TestCase):
+    """Unit tests for checkpoints and resuming from them"""
+
+    def setUp(self):
+        # pylint: disable-next=consider-using-with
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        rng = random.Random(23)
+        words = [
+            bytes(rng.choices(b"abcdefghij", k=rng.randint(2, 9))) for _ in range(500)
+        ]
+        self.data = b" ".join(rng.choices(words, k=60000))
+        self.source = Path(self.temp_dir.name, "input.txt")
+        self.source.write_bytes(self.data)
+        self.output = Path(self.temp_dir.name, "input.txt.gz")
+        self.checkpoint = Path(str(self.output) + CHECKPOINT_SUFFIX)
+
+    def _compress(self, **options):
+        pigz_python.compress_file(
+            self.source, blocksize=16, workers=2, checkpoint_interval=40000, **options
+        )
+
+    def test_round_trip(self):
+        """
+        Test that a checkpoint reads back as it was written
+        """
+        path = Path(self.temp_dir.name, "state" + CHECKPOINT_SUFFIX)
+        write_checkpoint(path, Checkpoint(10, 20, 0xDEADBEEF, b"window", 30, 40, True))
+        with open(path, "rb") as checkpoint_file:
+            checkpoint = read_checkpoint(checkpoint_file)
+        self.assertEqual(
+            (
+                checkpoint.uncompressed_offset,
+                checkpoint.compressed_offset,
+                checkpoint.checksum,
+                checkpoint.window,
+                checkpoint.source_size,
+                checkpoint.source_mtime_ns,
+                checkpoint.bgzf,
+            ),
+            (10, 20, 0xDEADBEEF, b"window", 30, 40, True),
+        )
+
+    def test_resume_after_crash(self):
+        """
+        Test that a resumed run carries on from the last checkpoint and
+        writes the same output as an uninterrupted one
+        """
+        self._compress()
+        expected = self.output.read_bytes()
+        self.assertFalse(self.checkpoint.exists())
+
+        with self.assertRaises(_Crash):
+            self._compress(checkpoint=True, progress=_crash_after(12))
+        with open(self.checkpoint, "rb") as checkpoint_file:
+            checkpoint = read_checkpoint(checkpoint_file)
+        self.assertGreater(checkpoint.uncompressed_offset, 0)
+
+        chunks = []
+        self._compress(resume=True, progress=lambda s: chunks.append(s.chunks_out))
+        self.assertEqual(self.output.read_bytes(), expected)
+        self.assertEqual(gzip.decompress(self.output.read_bytes()), self.data)
+        self.assertFalse(self.checkpoint.exists())
+        # Only the input after the checkpoint was compressed again
+        self.assertLess(len(chunks), -(-len(self.data) // 16000))
+
+    def test_chunk_written_before_submit_returns(self):
+        """
+        Test that checkpoints are saved when each chunk is written before
+        the reader has finished submitting it
+        """
+        # pylint: disable-next=protected-access
+        submit = BlockCompressor._submit_chunk
+
+        def submit_and_wait(compressor, chunk_num, *args):
+            submit(compressor, chunk_num, *args)
+            deadline = time.monotonic() + 5
+            while compressor.stats.chunks_out < chunk_num:
+                if time.monotonic() > deadline:
+                    self.fail(f"chunk {chunk_num} was not written")
+                time.sleep(0.001)
+
+        with (
+            patch.object(BlockCompressor, "_submit_chunk", autospec=True) as spy,
+            patch(
+                "pigz_python.compressor.write_checkpoint", wraps=write_checkpoint
+            ) as saved,
+        ):
+            spy.side_effect = submit_and_wait
+            self._compress(checkpoint=True, pool=InlinePool())
+
+        # One after every third 16 KiB chunk but the last
+        self.assertEqual(saved.call_count, (len(self.data) - 1) // (3 * 16384))
+        self.assertEqual(gzip.decompress(self.output.read_bytes()), self.data)
+
+    def test_resume_rsyncable_bgzf(self):
+        """
+        Test resuming BGZF output cut at content-defined boundaries
+        """
+        with self.assertRaises(_Crash):
+            self._compress(
+                checkpoint=True, bgzf=True, rsyncable=True, progress=_crash_after(10)
+            )
+        self.assertTrue(self.checkpoint.exists())
+        self._compress(resume=True, bgzf=True, rsyncable=True)
+        self.assertEqual(gzip.decompress(self.output.read_bytes()), self.data)
+
+    def test_resume_without_checkpoint(self):
+        """
+        Test that resuming with no checkpoint compresses from the start
+        """
+        self._compress(resume=True)
+        self.assertEqual(gzip.decompress(self.output.read_bytes()), self.data)
+
+    def test_changed_input(self):
+        """
+        Test that a checkpoint of an input that changed since isn't used
+        """
+        with self.assertRaises(_Crash):
+            self._compress(checkpoint=True, progress=_crash_after(12))
+        self.source.write_bytes(self.data + b" and more")
+        with self.assertRaises(ValueError):
+            self._compress(resume=True)
+
+    def test_unresumable(self):
+        """
+        Test that checkpoints are refused where a run couldn't be resumed
+        """
+        with self.assertRaises(ValueError):
+            pigz_python.PigzFile(self.temp_dir.name, checkpoint=True)
+        with self.assertRaises(ValueError):
+            pigz_python.PigzFile(self.source, checkpoint=True, index=True)
+        with self.assertRaises(ValueError):
+            pigz_python.PigzFile(self.source, resume=True, output_file=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Unit tests for the per-thread compressor templates
+"""
+
+import unittest
+import zlib
+from threading import Thread
+
+from pigz_python import workers
+from pigz_python.backends import get_backend
+
+ZDICT = bytes(range(256)) * 128
+CHUNK = b"The quick brown fox jumps over the lazy dog. " * 200
+
+
+def _deflate(compressor):
+    """Compress CHUNK with `compressor` and sync flush it"""
+    return compressor.compress(CHUNK) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+# pylint: disable=protected-access
+class TestCompressorTemplates(unittest.TestCase):
+    """Unit tests for new_compressor"""
+
+    def setUp(self):
+        self.backend = get_backend("zlib")
+        workers._TEMPLATES.templates.clear()
+        self.expected = _deflate(self.backend.compressobj(6, ZDICT))
+
+    def test_repeated_dictionary(self):
+        """
+        Test that a dictionary seen again is primed once and then copied,
+        with the same output as a new compressor
+        """
+        templates = workers._TEMPLATES.templates
+        outputs = [_deflate(workers.new_compressor(self.backend, 6, ZDICT))]
+        self.assertIsNone(templates[("zlib", 6)][1])
+        for _ in range(3):
+            outputs.append(_deflate(workers.new_compressor(self.backend, 6, ZDICT)))
+        self.assertIsNotNone(templates[("zlib", 6)][1])
+        self.assertEqual(outputs, [self.expected] * 4)
+
+    def test_new_dictionary_replaces_template(self):
+        """
+        Test that another dictionary for the same level drops the template
+        """
+        for _ in range(2):
+            workers.new_compressor(self.backend, 6, ZDICT)
+        other = ZDICT[::-1]
+        compressor = workers.new_compressor(self.backend, 6, other)
+        self.assertEqual(
+            _deflate(compressor), _deflate(self.backend.compressobj(6, other))
+        )
+        self.assertEqual(workers._TEMPLATES.templates[("zlib", 6)], (other, None))
+
+    def test_without_dictionary(self):
+        """
+        Test that compressors without a dictionary are created, not cached
+        """
+        compressor = workers.new_compressor(self.backend, 6)
+        self.assertEqual(_deflate(compressor), _deflate(self.backend.compressobj(6)))
+        self.assertFalse(workers._TEMPLATES.templates)
+
+    def test_templates_per_thread(self):
+        """
+        Test that each thread keeps templates of its own
+        """
+        for _ in range(2):
+            workers.new_compressor(self.backend, 6, ZDICT)
+        seen = []
+        thread = Thread(target=lambda: seen.append(dict(workers._TEMPLATES.templates)))
+        thread.start()
+        thread.join()
+        self.assertEqual(seen, [{}])
+
+    def test_bounded(self):
+        """
+        Test that at most MAX_COMPRESSOR_TEMPLATES templates are kept
+        """
+        for level in range(1, 10):
+            workers.new_compressor(self.backend, level, ZDICT)
+        self.assertEqual(
+            len(workers._TEMPLATES.templates), workers.MAX_COMPRESSOR_TEMPLATES
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,266 @@
+"""
+Unit tests for the Pigz Python parallel decompressor
+"""
+
+import gzip
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pigz_python.pigz_python as pigz_python
+from pigz_python import decompressor
+from pigz_python.decompressor import PigzReader, decompress_file
+from pigz_python.pipeline import ChunkReorderBuffer
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+class TestDecompressor(unittest.TestCase):
+    """Unit tests for PigzReader and decompress_file"""
+
+    def setUp(self):
+        """
+        Create a test file and a place for its compressed copies.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.data = Path("tests", LOREM_IPSUM_FILE).read_bytes() * 60
+        self.source = Path(self.temp_dir, "input.txt")
+        self.source.write_bytes(self.data)
+        self.output = Path(self.temp_dir, "input.txt.gz")
+
+    def write_members(self, pieces, compresslevel=6):
+        """Write each piece as its own gzip member and return the members."""
+        members = [gzip.compress(piece, compresslevel) for piece in pieces]
+        self.output.write_bytes(b"".join(members))
+        return members
+
+    def read_all(self, **options):
+        """Decompress the output file with PigzReader."""
+        with PigzReader(self.output, **options) as reader:
+            return reader.read()
+
+    def test_bgzf_round_trip(self):
+        """
+        Test that a BGZF file decompresses in parallel
+        """
+        pigz_python.compress_file(self.source, bgzf=True)
+
+        self.assertEqual(self.read_all(workers=4), self.data)
+
+    def test_concatenated_members(self):
+        """
+        Test members containing gzip magic bytes inside their data
+        """
+        magic = b"\x1f\x8b\x08\x00"
+        pieces = [piece + magic for piece in self.data.split(b"\n\n")]
+        members = self.write_members(pieces, compresslevel=0)
+        self.assertGreater(
+            len(decompressor.find_member_candidates(b"".join(members))), len(members)
+        )
+
+        self.assertEqual(self.read_all(workers=4), b"".join(pieces))
+
+    def test_single_member(self):
+        """
+        Test the single-threaded path, with output pieces larger than memory
+        allows in one go
+        """
+        data = self.data * 20
+        self.output.write_bytes(gzip.compress(data))
+
+        self.assertEqual(self.read_all(workers=4), data)
+        self.assertEqual(self.read_all(workers=1), data)
+
+    def test_single_member_with_signature(self):
+        """
+        Test that a single member with gzip header bytes inside it is never
+        inflated on the pool as a whole: what is buffered for the reader
+        stays within MAX_MEMBER_BUFFER
+        """
+        data = self.data * 20 + b"\x1f\x8b\x08\x00" + self.data * 20
+        self.write_members([data], compresslevel=0)
+        buffered = []
+        put = ChunkReorderBuffer.put
+
+        def record(queue, item):
+            if item[1] is not None:
+                buffered.append(sum(len(piece) for piece in item[3]))
+            return put(queue, item)
+
+        with (
+            patch.object(decompressor, "MAX_MEMBER_BUFFER", 16 * 1024),
+            patch.object(decompressor, "INFLATE_PIECE_SIZE", 4 * 1024),
+            patch.object(ChunkReorderBuffer, "put", autospec=True) as queue_put,
+        ):
+            queue_put.side_effect = record
+            with PigzReader(self.output, workers=4) as reader:
+                # pylint: disable-next=protected-access
+                self.assertIsNotNone(reader._pool)
+                result = reader.read()
+
+        self.assertEqual(result, data)
+        self.assertEqual(len(buffered), 2)
+        self.assertLessEqual(max(buffered), 16 * 1024)
+
+    def test_scan_stays_near_reader(self):
+        """
+        Test that members are looked for as the file is read: the scan is
+        only a few steps ahead of the reader, and skips what the reader
+        has inflated since
+        """
+        data = self.data * 40
+        self.write_members([data], compresslevel=0)
+        size = self.output.stat().st_size
+        scan_size = 64 * 1024
+
+        with (
+            patch.object(decompressor, "MEMBER_SCAN_SIZE", scan_size),
+            patch.object(
+                decompressor,
+                "find_member_candidates",
+                wraps=decompressor.find_member_candidates,
+            ) as find,
+        ):
+            with PigzReader(self.output, workers=2, max_inflight_members=2) as reader:
+                self.assertEqual(reader.read(100), data[:100])
+                scanned = max(call.args[2] for call in find.call_args_list)
+                self.assertLessEqual(scanned, 4 * scan_size)
+                self.assertEqual(reader.read(), data[100:])
+
+        scanned = sum(call.args[2] - call.args[1] for call in find.call_args_list)
+        self.assertLess(scanned, size // 2)
+
+    def test_bgzf_then_other_members(self):
+        """
+        Test a BGZF file followed by members that aren't BGZF
+        """
+        pigz_python.compress_file(self.source, bgzf=True)
+        extra = gzip.compress(self.data)
+        with open(self.output, "ab") as output:
+            output.write(extra + extra)
+
+        self.assertEqual(self.read_all(workers=4), self.data * 3)
+
+    def test_serial_multiple_members(self):
+        """
+        Test several members inflated on one thread
+        """
+        self.write_members([self.data, b"", self.data])
+
+        self.assertEqual(self.read_all(workers=1), self.data * 2)
+
+    def test_zero_padding(self):
+        """
+        Test that zeros after the last member are ignored
+        """
+        members = self.write_members([self.data, self.data])
+        self.output.write_bytes(b"".join(members) + bytes(512))
+
+        self.assertEqual(self.read_all(workers=4), self.data * 2)
+        self.assertEqual(self.read_all(workers=1), self.data * 2)
+
+    def test_corrupt_crc(self):
+        """
+        Test that a member with a wrong CRC-32 is rejected
+        """
+        members = self.write_members([self.data, self.data])
+        corrupt = bytearray(members[1])
+        corrupt[-8] ^= 0xFF
+        self.output.write_bytes(members[0] + bytes(corrupt))
+
+        with self.assertRaises(gzip.BadGzipFile):
+            self.read_all(workers=4)
+        with self.assertRaises(gzip.BadGzipFile):
+            self.read_all(workers=1)
+
+    def test_trailing_garbage(self):
+        """
+        Test that bytes after the last member are rejected
+        """
+        members = self.write_members([self.data, self.data])
+        self.output.write_bytes(b"".join(members) + b"garbage")
+
+        with self.assertRaises(gzip.BadGzipFile):
+            self.read_all(workers=4)
+
+    def test_truncated(self):
+        """
+        Test that a file cut short is reported
+        """
+        members = self.write_members([self.data, self.data])
+        self.output.write_bytes(b"".join(members)[:-100])
+
+        with self.assertRaises(EOFError):
+            self.read_all(workers=4)
+        with self.assertRaises(EOFError):
+            self.read_all(workers=1)
+
+    def test_small_reads(self):
+        """
+        Test reading a few bytes at a time through a buffered reader
+        """
+        self.write_members([self.data, self.data])
+        result = io.BytesIO()
+        with io.BufferedReader(PigzReader(self.output, workers=2)) as reader:
+            while True:
+                piece = reader.read(777)
+                if not piece:
+                    break
+                result.write(piece)
+
+        self.assertEqual(result.getvalue(), self.data * 2)
+
+    def test_early_close(self):
+        """
+        Test closing the reader before the end with work still in flight
+        """
+        pigz_python.compress_file(self.source, bgzf=True)
+        reader = PigzReader(self.output, workers=2, max_inflight_members=2)
+        self.assertEqual(reader.read(100), self.data[:100])
+
+        reader.close()
+
+        self.assertTrue(reader.closed)
+        with self.assertRaises(ValueError):
+            reader.read(100)
+
+    def test_empty_file(self):
+        """
+        Test that an empty file decompresses to nothing
+        """
+        self.output.write_bytes(b"")
+
+        self.assertEqual(self.read_all(workers=4), b"")
+
+    def test_decompress_file(self):
+        """
+        Test decompressing to the name without .gz
+        """
+        pigz_python.compress_file(self.source, bgzf=True)
+        self.source.unlink()
+
+        result = decompress_file(self.output)
+
+        self.assertEqual(result, self.source)
+        self.assertEqual(self.source.read_bytes(), self.data)
+
+    def test_decompress_file_failure(self):
+        """
+        Test that no partial output is left behind after an error
+        """
+        self.output.write_bytes(gzip.compress(self.data)[:-100])
+        target = Path(self.temp_dir, "output.txt")
+
+        with self.assertRaises(EOFError):
+            decompress_file(self.output, target)
+        self.assertFalse(target.exists())
+        with self.assertRaises(ValueError):
+            decompress_file(self.source)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Unit tests for random access with the Pigz Python index
+"""
+
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pigz_python.pigz_python as pigz_python
+from pigz_python import index
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+class TestIndex(unittest.TestCase):
+    """Unit tests for the index file format and IndexedGzipReader"""
+
+    def setUp(self):
+        """
+        Compress a few hundred KB of text with an index in a temp directory.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.data = Path("tests", LOREM_IPSUM_FILE).read_bytes() * 100
+        self.target = Path(self.temp_dir, LOREM_IPSUM_FILE)
+        self.target.write_bytes(self.data)
+        self.compressed = Path(self.temp_dir, LOREM_IPSUM_FILE + ".gz")
+
+    def compress(self, **kwargs):
+        """Compress the test file with small chunks and access points"""
+        pigz_python.compress_file(
+            self.target, blocksize=10, index=True, index_spacing=20000, **kwargs
+        )
+
+    def test_write_read_index_round_trip(self):
+        """
+        Test that points survive writing and reading the index
+        """
+        points = [
+            index.IndexPoint(0, 10),
+            index.IndexPoint(70000, 1234, b"window" * 100),
+        ]
+        index_file = io.BytesIO()
+        index.write_index(index_file, points, 99999)
+        index_file.seek(0)
+
+        self.assertEqual(index.read_index(index_file), (points, 99999))
+
+    def test_read_index_bad_magic(self):
+        """
+        Test that a file that isn't an index is rejected
+        """
+        with self.assertRaises(ValueError):
+            index.read_index(io.BytesIO(b"\0" * 32))
+
+    def test_index_points_spacing(self):
+        """
+        Test that access points are written at least index_spacing apart
+        """
+        self.compress()
+        with open(Path(str(self.compressed) + index.INDEX_SUFFIX), "rb") as handle:
+            points, size = index.read_index(handle)
+
+        self.assertEqual(size, len(self.data))
+        self.assertEqual(points[0].uncompressed_offset, 0)
+        self.assertEqual(points[0].window, b"")
+        offsets = [point.uncompressed_offset for point in points]
+        self.assertTrue(all(b - a >= 20000 for a, b in zip(offsets, offsets[1:])))
+        for point in points[1:]:
+            end = point.uncompressed_offset
+            start = max(0, end - pigz_python.DICT_SIZE)
+            self.assertEqual(point.window, self.data[start:end])
+
+    def test_read_range(self):
+        """
+        Test reading ranges at the start, middle, across points and at the end
+        """
+        self.compress()
+        for offset, length in (
+            (0, 100),
+            (25000, 5000),
+            (39990, 30000),
+            (len(self.data) - 10, 100),
+        ):
+            end = offset + length
+            self.assertEqual(
+                index.read_range(self.compressed, offset, length),
+                self.data[offset:end],
+            )
+
+    def test_read_range_independent_chunks(self):
+        """
+        Test that files with independent chunks need no windows
+        """
+        self.compress(independent=True)
+        self.assertEqual(
+            index.read_range(self.compressed, 123456, 1000),
+            self.data[123456:124456],
+        )
+
+    def test_reader_seek_backwards(self):
+        """
+        Test seeking back and forth with the reader
+        """
+        self.compress()
+        with index.IndexedGzipReader(self.compressed) as reader:
+            reader.seek(-50, io.SEEK_END)
+            self.assertEqual(reader.read(50), self.data[-50:])
+            reader.seek(10)
+            self.assertEqual(reader.read(20), self.data[10:30])
+            reader.seek(5, io.SEEK_CUR)
+            self.assertEqual(reader.tell(), 35)
+            self.assertEqual(reader.read(10), self.data[35:45])
+            reader.seek(len(self.data))
+            self.assertEqual(reader.read(10), b"")
@@ -0,0 +1,165 @@
+"""
+Unit tests for compressing and decompressing data held in memory
+"""
+
+import array
+import gzip
+import io
+import random
+import threading
+import unittest
+from pathlib import Path
+
+import pigz_python.pigz_python as pigz_python
+from pigz_python.decompressor import PigzReader, decompress_bytes
+from pigz_python.pool import PigzPool
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+class TestCompressBytes(unittest.TestCase):
+    """Unit tests for compress_bytes"""
+
+    def setUp(self):
+        """
+        Create test data several blocks long.
+        """
+        self.data = Path("tests", LOREM_IPSUM_FILE).read_bytes() * 30
+
+    def test_round_trip(self):
+        """
+        Test that the output is one valid gzip stream
+        """
+        compressed = pigz_python.compress_bytes(self.data, blocksize=8, workers=2)
+
+        self.assertEqual(gzip.decompress(compressed), self.data)
+        self.assertEqual(compressed[:2], b"\x1f\x8b")
+
+    def test_buffer_types(self):
+        """
+        Test bytearray, memoryview and non-byte buffers
+        """
+        numbers = array.array("i", range(20000))
+        view = memoryview(self.data)[100:-100]
+
+        for data, expected in (
+            (bytearray(self.data), self.data),
+            (view, bytes(view)),
+            (numbers, numbers.tobytes()),
+        ):
+            compressed = pigz_python.compress_bytes(data, blocksize=8)
+            self.assertEqual(gzip.decompress(compressed), expected)
+
+    def test_empty(self):
+        """
+        Test compressing nothing
+        """
+        self.assertEqual(gzip.decompress(pigz_python.compress_bytes(b"")), b"")
+
+    def test_header(self):
+        """
+        Test that `filename` and `mtime` go in the header
+        """
+        compressed = pigz_python.compress_bytes(
+            self.data, mtime=1234567890, filename="cache.bin"
+        )
+
+        with gzip.GzipFile(fileobj=io.BytesIO(compressed)) as gzip_file:
+            self.assertEqual(gzip_file.read(), self.data)
+            self.assertEqual(gzip_file.mtime, 1234567890)
+        self.assertIn(b"cache.bin\0", compressed[:30])
+
+    def test_options(self):
+        """
+        Test auto settings, worker processes, BGZF and a shared pool
+        """
+        with PigzPool(workers=2) as pool:
+            for options in (
+                {"blocksize": "auto", "workers": "auto"},
+                {"executor": "process", "blocksize": 8},
+                {"bgzf": True},
+                {"pool": pool, "blocksize": 8},
+            ):
+                compressed = pigz_python.compress_bytes(self.data, **options)
+                self.assertEqual(gzip.decompress(compressed), self.data, options)
+
+    def test_error(self):
+        """
+        Test that a failure in the pipeline is raised
+        """
+        with self.assertRaises(ValueError):
+            pigz_python.compress_bytes(self.data, executor="fork")
+        with self.assertRaises(TypeError):
+            pigz_python.compress_bytes("not bytes")
+
+    def test_closed_pool(self):
+        """
+        Test that a pool refusing work is raised and stops the write thread
+        """
+        with PigzPool(workers=2) as pool:
+            pool.close()
+            with self.assertRaisesRegex(ValueError, "Pool not running"):
+                pigz_python.compress_bytes(self.data, blocksize=8, pool=pool)
+
+            # The write thread is the only one keeping the process alive
+            self.assertEqual(
+                [thread for thread in threading.enumerate() if not thread.daemon],
+                [threading.main_thread()],
+            )
+
+
+class TestDecompressBytes(unittest.TestCase):
+    """Unit tests for decompress_bytes"""
+
+    def setUp(self):
+        """
+        Create test data and split it into several gzip members.
+        """
+        self.data = Path("tests", LOREM_IPSUM_FILE).read_bytes() * 30
+        rng = random.Random(0)
+        cuts = sorted(rng.sample(range(len(self.data)), 5))
+        pieces = [self.data[start:end] for start, end in zip([0] + cuts, cuts + [None])]
+        self.members = b"".join(gzip.compress(piece) for piece in pieces)
+
+    def test_members(self):
+        """
+        Test multi-member, single-member and BGZF data
+        """
+        bgzf = pigz_python.compress_bytes(self.data, bgzf=True)
+
+        for compressed in (self.members, gzip.compress(self.data), bgzf):
+            for workers in (1, 4):
+                self.assertEqual(decompress_bytes(compressed, workers), self.data)
+
+    def test_buffer_types(self):
+        """
+        Test bytearray and memoryview input
+        """
+        self.assertEqual(decompress_bytes(bytearray(self.members)), self.data)
+        self.assertEqual(decompress_bytes(memoryview(self.members)), self.data)
+        self.assertEqual(decompress_bytes(b""), b"")
+
+    def test_corrupt(self):
+        """
+        Test that corrupt data is rejected
+        """
+        with self.assertRaises(EOFError):
+            decompress_bytes(self.members[:-10])
+        with self.assertRaises(gzip.BadGzipFile):
+            decompress_bytes(self.members + b"garbage")
+
+    def test_reader_file_object(self):
+        """
+        Test PigzReader on a file object, which it leaves open
+        """
+        source = io.BytesIO(self.members)
+
+        with PigzReader(source, workers=2) as reader:
+            self.assertEqual(reader.read(10), self.data[:10])
+            self.assertEqual(reader.readall(), self.data[10:])
+
+        self.assertFalse(source.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,13 +2,19 @@
 Unit tests for Pigz Python
 """
 
-import sys
+import gzip
+import os
+import shutil
+import tarfile
+import tempfile
 import unittest
 import zlib
 from pathlib import Path
-from unittest.mock import MagicMock, Mock, call, mock_open, patch
+from threading import Thread
+from unittest.mock import MagicMock, Mock, patch
 
 import pigz_python.pigz_python as pigz_python
+from pigz_python import workers as pigz_workers
 
 LOREM_IPSUM_FILE = "lorem_ipsum.txt"
 
@@ -23,13 +29,53 @@ class TestPigzPython(unittest.TestCase):
         """
         test_file = Path("tests", LOREM_IPSUM_FILE)
         self.pigz_file = pigz_python.PigzFile(test_file)
-
-    def test_compress_directory_raise_error(self):
-        """
-        Test that PigzFile raises NotImplementedError when given a directory
-        """
-        with self.assertRaises(NotImplementedError):
-            pigz_python.PigzFile(Path("tests"))
+        # Don't leave the pool's threads to be collected during later tests
+        pool = self.pigz_file.pool
+        self.addCleanup(pool.join)
+        self.addCleanup(pool.close)
+
+    def test_compress_directory(self):
+        """
+        Test that a directory is compressed into a tar.gz next to it
+        """
+        source = Path("tests", LOREM_IPSUM_FILE)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = Path(temp_dir, "dataset")
+            Path(target, "nested").mkdir(parents=True)
+            Path(target, "empty").mkdir()
+            shutil.copyfile(source, Path(target, "b.txt"))
+            Path(target, "a.bin").write_bytes(bytes(range(256)) * 1000)
+            Path(target, "nested", "c.txt").write_bytes(b"nested file")
+            Path(target, "link").symlink_to("b.txt")
+
+            pigz_file = pigz_python.PigzFile(target, blocksize=4, workers=4)
+            pigz_file.process_compression_target()
+
+            output = Path(temp_dir, "dataset.tar.gz")
+            self.assertEqual(output.read_bytes()[10:22], b"dataset.tar\0")
+            with tarfile.open(output, "r:gz") as tar:
+                names = tar.getnames()
+                self.assertEqual(
+                    tar.extractfile("dataset/b.txt").read(), source.read_bytes()
+                )
+                self.assertEqual(
+                    tar.extractfile("dataset/a.bin").read(),
+                    bytes(range(256)) * 1000,
+                )
+                self.assertTrue(tar.getmember("dataset/link").issym())
+
+        self.assertEqual(
+            names,
+            [
+                "dataset",
+                "dataset/a.bin",
+                "dataset/b.txt",
+                "dataset/empty",
+                "dataset/link",
+                "dataset/nested",
+                "dataset/nested/c.txt",
+            ],
+        )
 
     def test_compress_nonexistant_file_raise_error(self):
         """
@@ -215,6 +261,23 @@ class TestPigzPython(unittest.TestCase):
         )
         self.assertEqual(compressed_data, expected_output)
 
+    def test_compress_chunk_with_dictionary(self):
+        """
+        Test that a chunk primed with a dictionary inflates with that dictionary
+        """
+        zdict = b"This is a test string that came before. "
+        input_data = b"This is a test string"
+        compressed_data = self.pigz_file._compress_chunk(
+            input_data, is_last_chunk=True, zdict=zdict
+        )
+
+        decompressor = zlib.decompressobj(wbits=-zlib.MAX_WBITS, zdict=zdict)
+        self.assertEqual(decompressor.decompress(compressed_data), input_data)
+        self.assertLess(
+            len(compressed_data),
+            len(self.pigz_file._compress_chunk(input_data, is_last_chunk=True)),
+        )
+
     def test_close_workers(self):
         """
         Test that compression worker pool closed.
@@ -254,16 +317,43 @@ class TestPigzPython(unittest.TestCase):
         self.pigz_file.output_filename = output_filename
         self.pigz_file.compression_target = compressed_file_path
 
-        with patch("builtins.open", mock_open(read_data="data")) as mock_file:
+        with patch.object(pigz_python, "OutputSink") as mock_sink:
             self.pigz_file._setup_output_file()
 
             self.pigz_file._set_output_filename.assert_called_once()
 
             # Assert output file opened appropriately
-            mock_file.assert_called_with(compressed_file_path, "wb")
+            mock_sink.assert_called_with(
+                compressed_file_path, pigz_python.DEFAULT_WRITE_BUFFER_SIZE
+            )
+            self.assertEqual(self.pigz_file.output_path, compressed_file_path)
 
             self.pigz_file._write_output_header.assert_called_once()
 
+    def test_output_file_path(self):
+        """
+        Test that the output can be written to a path of our choosing
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output = Path(temp_dir, "elsewhere.bin")
+            pigz_python.compress_file(
+                Path("tests", LOREM_IPSUM_FILE), output_file=str(output), index=True
+            )
+            self.assertEqual(
+                gzip.decompress(output.read_bytes()),
+                Path("tests", LOREM_IPSUM_FILE).read_bytes(),
+            )
+            self.assertTrue(Path(str(output) + ".pgzi").exists())
+
+    def test_output_file_index_needs_path(self):
+        """
+        Test that an index can't be asked for with a file descriptor output
+        """
+        with self.assertRaises(ValueError):
+            pigz_python.PigzFile(
+                Path("tests", LOREM_IPSUM_FILE), index=True, output_file=1
+            )
+
     def test_calculate_chunk_check_from_zero(self):
         """
         Test that the crc32 check is properly handled from 0
@@ -293,127 +383,68 @@ class TestPigzPython(unittest.TestCase):
 
         self.assertEqual(self.pigz_file.checksum, expected_checksum)
 
-    def test_write_header_id(self):
+    def test_combine_chunk_check(self):
         """
-        Test that we properly write the ID1 and ID2 fields of the gzip header
+        Test that combining per-chunk checksums matches a running checksum
         """
-        self.pigz_file.output_file = MagicMock()
-        ID1 = (0x1F).to_bytes(1, sys.byteorder)  # pylint: disable=invalid-name
-        ID2 = (0x8B).to_bytes(1, sys.byteorder)  # pylint: disable=invalid-name
-        with patch("sys.byteorder", "little"):
-            self.pigz_file._write_header_id()
-            self.pigz_file.output_file.write.assert_has_calls([call(ID1), call(ID2)])
+        input_data1 = b"really fun data"
+        input_data2 = b"MORE fun data!"
+        expected_checksum = zlib.crc32(input_data1 + input_data2)
 
-    def test_write_header_cm(self):
-        """
-        Test that we properly write the CM field of the gzip header
-        """
-        self.pigz_file.output_file = MagicMock()
-        CM = (8).to_bytes(1, sys.byteorder)  # pylint: disable=invalid-name
-        with patch("sys.byteorder", "little"):
-            self.pigz_file._write_header_cm()
-            self.pigz_file.output_file.write.assert_has_calls([call(CM)])
+        self.pigz_file.combine_chunk_check(zlib.crc32(input_data1), len(input_data1))
+        self.pigz_file.combine_chunk_check(zlib.crc32(input_data2), len(input_data2))
 
-    def test_write_header_flg(self):
+        self.assertEqual(self.pigz_file.checksum, expected_checksum)
+
+    def test_crc32_combine(self):
         """
-        Test that we properly write the FLG field of the gzip header
+        Test crc32_combine against zlib.crc32 for a range of split points
         """
-        self.pigz_file.output_file = MagicMock()
-        flags = 0xA
-        write_flags = (flags).to_bytes(1, sys.byteorder)
-        with patch("sys.byteorder", "little"):
-            self.pigz_file._write_header_flg(flags)
-            self.pigz_file.output_file.write.assert_has_calls([call(write_flags)])
+        with open(Path("tests", LOREM_IPSUM_FILE), "rb") as input_file:
+            data = input_file.read()
+        for split in (0, 1, 7, 512, 1024, len(data) - 1, len(data)):
+            first, second = data[:split], data[split:]
+            combined = pigz_python.crc32_combine(
+                zlib.crc32(first), zlib.crc32(second), len(second)
+            )
+            self.assertEqual(combined, zlib.crc32(data))
 
     def test_write_output_header_with_fname(self):
         """
-        Test that the output header is written with the FNAME field
+        Test that the output header is written at once with the FNAME field
         """
-        # Setup mocks
         self.pigz_file.output_file = MagicMock()
         self.pigz_file.compression_target = "foo.txt"
-        self.pigz_file._write_header_id = MagicMock()
-        self.pigz_file._write_header_cm = MagicMock()
-        self.pigz_file._write_header_flg = MagicMock()
-        self.pigz_file._write_header_mtime = MagicMock()
-        self.pigz_file._write_header_xfl = MagicMock()
-        self.pigz_file._write_header_os = MagicMock()
-        # Make the call
+        self.pigz_file._determine_mtime = MagicMock(return_value=8675309)
+        self.pigz_file._determine_operating_system = MagicMock(return_value=3)
+        self.pigz_file.output_size = 0
+
         self.pigz_file._write_output_header()
-        # Assertions
-        self.pigz_file._write_header_id.assert_called_once()
-        self.pigz_file._write_header_cm.assert_called_once()
-        self.pigz_file._write_header_flg.assert_called_with(pigz_python.FNAME)
-        self.pigz_file._write_header_mtime.assert_called_once()
-        self.pigz_file._write_header_xfl.assert_called_once()
-        self.pigz_file._write_header_os.assert_called_once()
+
+        header = (
+            b"\x1f\x8b\x08"
+            + bytes([pigz_python.FNAME])
+            + (8675309).to_bytes(4, "little")
+            + b"\x02\x03foo.txt\0"
+        )
+        self.pigz_file.output_file.write.assert_called_once_with(header)
+        self.assertEqual(self.pigz_file.output_size, len(header))
 
     def test_write_output_header_without_fname(self):
         """
         Test that the output header is written without the FNAME field
         """
-        # Setup mocks
         self.pigz_file.output_file = MagicMock()
         self.pigz_file.compression_target = "В Питере — пить.mp3"
-        self.pigz_file._write_header_id = MagicMock()
-        self.pigz_file._write_header_cm = MagicMock()
-        self.pigz_file._write_header_flg = MagicMock()
-        self.pigz_file._write_header_mtime = MagicMock()
-        self.pigz_file._write_header_xfl = MagicMock()
-        self.pigz_file._write_header_os = MagicMock()
-        # Make the call
-        self.pigz_file._write_output_header()
-        # Assertions
-        self.pigz_file._write_header_id.assert_called_once()
-        self.pigz_file._write_header_cm.assert_called_once()
-
-        self.pigz_file._write_header_flg.assert_called_with(0x0)
-
-        self.pigz_file._write_header_mtime.assert_called_once()
-        self.pigz_file._write_header_xfl.assert_called_once()
-        self.pigz_file._write_header_os.assert_called_once()
-
-    def test_write_header_mtime(self):
-        """
-        Test writing out the mtime to the header
-        """
-        test_time = 8675309
-        test_time_bytes = (test_time).to_bytes(4, sys.byteorder)
-        self.pigz_file._determine_mtime = MagicMock()
-        self.pigz_file._determine_mtime.return_value = test_time
-        self.pigz_file.output_file = MagicMock()
-
-        self.pigz_file._write_header_mtime()
-
-        self.pigz_file.output_file.write.assert_called_with(test_time_bytes)
-
-    def test_write_header_xfl(self):
-        """
-        Test writing out xfl to the header
-        """
-        extra_flags = 2
-        extra_flags_bytes = (extra_flags).to_bytes(1, sys.byteorder)
-        self.pigz_file._determine_extra_flags = MagicMock()
-        self.pigz_file._determine_extra_flags.return_value = extra_flags
-        self.pigz_file.output_file = MagicMock()
-
-        self.pigz_file._write_header_xfl()
-
-        self.pigz_file.output_file.write.assert_called_with(extra_flags_bytes)
+        self.pigz_file._determine_mtime = MagicMock(return_value=0)
+        self.pigz_file._determine_operating_system = MagicMock(return_value=255)
+        self.pigz_file.compression_level = 1
 
-    def test_write_header_os(self):
-        """
-        Test writing out os to the header
-        """
-        os_field = 3
-        os_field_bytes = (os_field).to_bytes(1, sys.byteorder)
-        self.pigz_file._determine_operating_system = MagicMock()
-        self.pigz_file._determine_operating_system.return_value = os_field
-        self.pigz_file.output_file = MagicMock()
-
-        self.pigz_file._write_header_os()
+        self.pigz_file._write_output_header()
 
-        self.pigz_file.output_file.write.assert_called_with(os_field_bytes)
+        self.pigz_file.output_file.write.assert_called_once_with(
+            b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x04\xff"
+        )
 
     def test_process_chunk(self):
         """
@@ -431,9 +462,10 @@ class TestPigzPython(unittest.TestCase):
         self.pigz_file._process_chunk(chunk_num, chunk, is_last)
 
         # Second arg is True since we've setup the test data as last chunk
-        self.pigz_file._compress_chunk.assert_called_with(chunk, True)
+        self.pigz_file._compress_chunk.assert_called_with(chunk, True, None, 9)
+        # The raw chunk is replaced by its CRC-32 and length
         self.pigz_file.chunk_queue.put.assert_called_with(
-            (chunk_num, chunk, compressed_chunk)
+            (chunk_num, zlib.crc32(chunk), len(chunk), compressed_chunk)
         )
 
     def test_clean_up(self):
@@ -456,9 +488,9 @@ class TestPigzPython(unittest.TestCase):
         Test writing the file trailer
         """
         checksum = 8675309
-        checksum_bytes = (checksum).to_bytes(4, sys.byteorder)
+        checksum_bytes = (checksum).to_bytes(4, "little")
         input_size = 42069
-        input_size_bytes = (input_size & 0xFFFFFFFF).to_bytes(4, sys.byteorder)
+        input_size_bytes = (input_size & 0xFFFFFFFF).to_bytes(4, "little")
 
         self.pigz_file.output_file = MagicMock()
         self.pigz_file.checksum = checksum
@@ -466,8 +498,8 @@ class TestPigzPython(unittest.TestCase):
 
         self.pigz_file.write_file_trailer()
 
-        self.pigz_file.output_file.write.assert_has_calls(
-            [call(checksum_bytes), call(input_size_bytes)]
+        self.pigz_file.output_file.write.assert_called_once_with(
+            checksum_bytes + input_size_bytes
         )
 
     def test_determine_mtime_normal(self):
@@ -497,3 +529,308 @@ class TestPigzPython(unittest.TestCase):
                 mtime = self.pigz_file._determine_mtime()
                 assert isinstance(mtime, int)
                 self.assertEqual(mtime, 9440351000)
+
+    def test_compress_file_round_trip(self):
+        """
+        Test that a compressed file decompresses back to the original data
+        with several chunks written out of order by the pool
+        """
+        source = Path("tests", LOREM_IPSUM_FILE)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = Path(temp_dir, LOREM_IPSUM_FILE)
+            shutil.copyfile(source, target)
+
+            pigz_python.compress_file(target, blocksize=1, workers=4)
+
+            with gzip.open(Path(temp_dir, LOREM_IPSUM_FILE + ".gz"), "rb") as result:
+                self.assertEqual(result.read(), source.read_bytes())
+
+    def test_compress_empty_file(self):
+        """
+        Test that an empty file produces a valid, empty gzip stream
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = Path(temp_dir, "empty.txt")
+            target.write_bytes(b"")
+
+            pigz_python.compress_file(target)
+
+            compressed = Path(temp_dir, "empty.txt.gz").read_bytes()
+            self.assertEqual(gzip.decompress(compressed), b"")
+
+    def test_compress_file_bounded_window_round_trip(self):
+        """
+        Test that a one-chunk in-flight window still compresses correctly
+        """
+        source = Path("tests", LOREM_IPSUM_FILE)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = Path(temp_dir, LOREM_IPSUM_FILE)
+            shutil.copyfile(source, target)
+
+            pigz_python.compress_file(
+                target,
+                blocksize=1,
+                workers=4,
+                max_inflight_blocks=1,
+                max_buffer_bytes=1000,
+            )
+
+            with gzip.open(Path(temp_dir, LOREM_IPSUM_FILE + ".gz"), "rb") as result:
+                self.assertEqual(result.read(), source.read_bytes())
+
+    def test_compress_file_dictionary_chaining(self):
+        """
+        Test that chained chunks round trip and beat independent chunks
+        """
+        source = Path("tests", LOREM_IPSUM_FILE)
+        sizes = {}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = Path(temp_dir, LOREM_IPSUM_FILE)
+            shutil.copyfile(source, target)
+            compressed = Path(temp_dir, LOREM_IPSUM_FILE + ".gz")
+
+            for independent in (True, False):
+                pigz_python.compress_file(
+                    target, blocksize=1, workers=4, independent=independent
+                )
+                with gzip.open(compressed, "rb") as result:
+                    self.assertEqual(result.read(), source.read_bytes())
+                sizes[independent] = compressed.stat().st_size
+
+        self.assertLess(sizes[False], sizes[True])
+
+    def test_compress_file_process_executor(self):
+        """
+        Test compressing on worker processes fed through shared memory
+        """
+        source = Path("tests", LOREM_IPSUM_FILE)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = Path(temp_dir, LOREM_IPSUM_FILE)
+            shutil.copyfile(source, target)
+
+            pigz_python.compress_file(
+                target, blocksize=1, workers=2, executor="process"
+            )
+
+            with gzip.open(Path(temp_dir, LOREM_IPSUM_FILE + ".gz"), "rb") as result:
+                self.assertEqual(result.read(), source.read_bytes())
+
+    def test_compress_file_mmap_and_read_paths(self):
+        """
+        Test that the memory-mapped and the block reading paths both
+        round trip, and that only the first maps the file
+        """
+        source = Path("tests", LOREM_IPSUM_FILE)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = Path(temp_dir, LOREM_IPSUM_FILE)
+            shutil.copyfile(source, target)
+
+            for use_mmap in (True, False):
+                pigz_file = pigz_python.PigzFile(
+                    target, blocksize=1, workers=4, use_mmap=use_mmap
+                )
+                with patch.object(
+                    pigz_file,
+                    "_emit_mapped_chunks",
+                    wraps=pigz_file._emit_mapped_chunks,
+                ) as emit_mapped_chunks:
+                    pigz_file.process_compression_target()
+
+                self.assertEqual(emit_mapped_chunks.called, use_mmap)
+                self.assertIsNone(pigz_file._input_map)
+                with gzip.open(Path(temp_dir, LOREM_IPSUM_FILE + ".gz")) as result:
+                    self.assertEqual(result.read(), source.read_bytes())
+
+    def test_compress_file_mmap_releases_written_input(self):
+        """
+        Test that mapped input is released behind the writer
+        """
+        data = Path("tests", LOREM_IPSUM_FILE).read_bytes() * 200
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = Path(temp_dir, LOREM_IPSUM_FILE)
+            target.write_bytes(data)
+            pigz_file = pigz_python.PigzFile(target, blocksize=16, workers=2)
+            pigz_file.process_compression_target()
+
+            # All but the last partial block and page were released
+            self.assertGreater(
+                pigz_file._released_offset, len(data) - 2 * pigz_file.blocksize
+            )
+            with gzip.open(Path(temp_dir, LOREM_IPSUM_FILE + ".gz")) as result:
+                self.assertEqual(result.read(), data)
+
+    def test_map_input_empty_file(self):
+        """
+        Test that an empty file is not mapped
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = Path(temp_dir, "empty.txt")
+            target.write_bytes(b"")
+            with open(target, "rb") as input_file:
+                self.assertIsNone(pigz_python.PigzFile._map_input(input_file))
+
+    def test_unknown_executor_raise_error(self):
+        """
+        Test that an unknown executor is rejected
+        """
+        with self.assertRaises(ValueError):
+            pigz_python.PigzFile(Path("tests", LOREM_IPSUM_FILE), executor="gpu")
+
+    def test_close_workers_shared_pool(self):
+        """
+        Test that a pool passed in by the caller is left open.
+        """
+        pool = MagicMock()
+        pigz_file = pigz_python.PigzFile(Path("tests", LOREM_IPSUM_FILE), pool=pool)
+        pigz_file._close_workers()
+        pool.close.assert_not_called()
+        pool.join.assert_not_called()
+
+
+class TestSharedBlockRing(unittest.TestCase):
+    """Unit tests for SharedBlockRing and timed_compress_shared_block"""
+
+    def setUp(self):
+        """
+        Create a ring with two small slots.
+        """
+        self.ring = pigz_python.SharedBlockRing(2, 100)
+        self.addCleanup(self.ring.close)
+
+    def test_store_uses_free_slots(self):
+        """
+        Test that chunks are copied into distinct slots which can be reused
+        """
+        first = self.ring.store(b"first")
+        second = self.ring.store(b"second")
+        self.assertEqual({first, second}, {(0, 0), (1, 100)})
+        self.assertEqual(bytes(self.ring.segment.buf[100:106]), b"second")
+
+        self.ring.release(first[0])
+        self.assertEqual(self.ring.store(b"third"), first)
+
+    def test_compress_shared_block(self):
+        """
+        Test compressing a chunk straight from its slot
+        """
+        chunk = b"This is a test string"
+        _, offset = self.ring.store(chunk)
+
+        result, start, end, pid = pigz_workers.timed_compress_shared_block(
+            self.ring.name, offset, len(chunk), 9, True
+        )
+
+        chunk_crc, compressed_chunk, stored = result
+        self.assertEqual(chunk_crc, zlib.crc32(chunk))
+        self.assertEqual(compressed_chunk, pigz_python.compress_block(chunk, 9, True))
+        self.assertFalse(stored)
+        self.assertLessEqual(start, end)
+        self.assertEqual(pid, os.getpid())
+
+
+class TestInflightLimiter(unittest.TestCase):
+    """Unit tests for InflightLimiter class"""
+
+    def test_acquire_blocks_when_block_window_full(self):
+        """
+        Test that the reader waits until the writer releases a slot
+        """
+        limiter = pigz_python.InflightLimiter(max_blocks=1)
+        limiter.acquire(10)
+        reader = Thread(target=limiter.acquire, args=(10,))
+        reader.start()
+
+        reader.join(timeout=0.05)
+        self.assertTrue(reader.is_alive())
+
+        limiter.release(10)
+        reader.join(timeout=5)
+        self.assertFalse(reader.is_alive())
+        self.assertEqual((limiter.blocks, limiter.bytes), (1, 10))
+
+    def test_acquire_blocks_when_byte_budget_full(self):
+        """
+        Test that raw and compressed bytes both count against the budget
+        """
+        limiter = pigz_python.InflightLimiter(max_bytes=100)
+        limiter.acquire(60)
+        limiter.add(30)
+
+        self.assertTrue(limiter._is_full(20))
+        self.assertFalse(limiter._is_full(10))
+
+    def test_acquire_allows_oversized_block_when_empty(self):
+        """
+        Test that a single block larger than the byte budget is let through
+        """
+        limiter = pigz_python.InflightLimiter(max_bytes=100)
+        limiter.acquire(1000)
+        self.assertEqual(limiter.blocks, 1)
+
+    def test_close_wakes_blocked_reader(self):
+        """
+        Test that closing the limiter makes a blocked acquire fail
+        """
+        limiter = pigz_python.InflightLimiter(max_blocks=1)
+        limiter.acquire(10)
+        errors = []
+
+        def acquire():
+            try:
+                limiter.acquire(10)
+            except RuntimeError as error:
+                errors.append(error)
+
+        reader = Thread(target=acquire)
+        reader.start()
+        limiter.close()
+        reader.join(timeout=5)
+
+        self.assertEqual(len(errors), 1)
+
+
+class TestChunkReorderBuffer(unittest.TestCase):
+    """Unit tests for ChunkReorderBuffer class"""
+
+    def test_get_returns_chunks_in_order(self):
+        """
+        Test that chunks put out of order are returned in chunk order
+        """
+        reorder_buffer = pigz_python.ChunkReorderBuffer()
+        for chunk_num in (3, 1, 2):
+            reorder_buffer.put((chunk_num, b"data"))
+
+        chunk_nums = [reorder_buffer.get()[0] for _ in range(3)]
+
+        self.assertEqual(chunk_nums, [1, 2, 3])
+        self.assertEqual(reorder_buffer.qsize(), 0)
+
+    def test_get_blocks_until_next_chunk_arrives(self):
+        """
+        Test that the writer is woken once the expected chunk is put
+        """
+        reorder_buffer = pigz_python.ChunkReorderBuffer()
+        reorder_buffer.put((2, b"second"))
+        results = []
+        getter = Thread(target=lambda: results.append(reorder_buffer.get()))
+        getter.start()
+
+        getter.join(timeout=0.05)
+        self.assertTrue(getter.is_alive())
+
+        reorder_buffer.put((1, b"first"))
+        getter.join(timeout=5)
+        self.assertEqual(results, [(1, b"first")])
+        # It waited with a later chunk already buffered
+        self.assertEqual(reorder_buffer.stalls, 1)
+        self.assertGreater(reorder_buffer.wait_seconds, 0)
+
+    def test_set_error_raises_in_get(self):
+        """
+        Test that a reported error is raised to the waiting writer
+        """
+        reorder_buffer = pigz_python.ChunkReorderBuffer()
+        reorder_buffer.set_error(OSError("disk on fire"))
+
+        with self.assertRaises(OSError):
+            reorder_buffer.get()
@@ -0,0 +1,174 @@
+"""
+Unit tests for the Pigz Python shared worker pool
+"""
+
+import gzip
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pigz_python.pigz_python as pigz_python
+from pigz_python.pool import PigzPool
+from pigz_python.writer import PigzWriter
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+class TestPigzPool(unittest.TestCase):
+    """Unit tests for PigzPool"""
+
+    def setUp(self):
+        """
+        Create a few test files.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        lorem_ipsum = Path("tests", LOREM_IPSUM_FILE).read_bytes()
+        self.sources = []
+        for number in range(6):
+            source = Path(self.temp_dir, f"input{number}.txt")
+            source.write_bytes(lorem_ipsum * 20 * (number + 1))
+            self.sources.append(source)
+
+    def check_output(self, source):
+        """Check that `source` was compressed correctly."""
+        compressed = source.with_name(source.name + ".gz").read_bytes()
+        self.assertEqual(gzip.decompress(compressed), source.read_bytes())
+
+    def test_concurrent_compress_file(self):
+        """
+        Test many concurrent compress_file calls on one pool
+        """
+        with PigzPool(workers=3) as pool:
+            threads_before = threading.active_count()
+            with ThreadPoolExecutor(max_workers=6) as callers:
+                for source in self.sources * 3:
+                    callers.submit(
+                        pigz_python.compress_file, source, blocksize=8, pool=pool
+                    )
+            # No compression threads were started beyond the pool's
+            self.assertEqual(threading.active_count(), threads_before)
+
+        for source in self.sources:
+            self.check_output(source)
+
+    def test_process_executor(self):
+        """
+        Test compressing on a pool of worker processes
+        """
+        with PigzPool(workers=2, executor="process") as pool:
+            for source in self.sources[:2]:
+                stats = pigz_python.compress_file(source, blocksize=8, pool=pool)
+                self.assertGreater(stats.chunks_out, 1)
+
+        for source in self.sources[:2]:
+            self.check_output(source)
+
+    def test_process_executor_fresh_process(self):
+        """
+        Test that a process pool made before any shared memory exists leaves
+        no shared memory warnings at exit, over several compressions
+        """
+        script = (
+            "import sys\n"
+            "from pigz_python import compress_file\n"
+            "from pigz_python.pool import PigzPool\n"
+            "for source in sys.argv[1:]:\n"
+            "    with PigzPool(workers=2, executor='process') as pool:\n"
+            "        compress_file(source, blocksize=8, pool=pool)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script, *map(str, self.sources[:3])],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertNotIn("resource_tracker", result.stderr)
+        for source in self.sources[:3]:
+            self.check_output(source)
+
+    def test_writer(self):
+        """
+        Test PigzWriter on a shared pool
+        """
+        output = Path(self.temp_dir, "writer.gz")
+        data = self.sources[2].read_bytes()
+        with PigzPool(workers=2) as pool:
+            with PigzWriter(output, blocksize=8, pool=pool) as writer:
+                writer.write(data)
+
+        self.assertEqual(gzip.decompress(output.read_bytes()), data)
+
+    def test_worker_cap(self):
+        """
+        Test that a job can't have more workers than the pool
+        """
+        with PigzPool(workers=2) as pool:
+            pigz_file = pigz_python.PigzFile(self.sources[0], workers=16, pool=pool)
+            pigz_file.process_compression_target()
+
+        self.assertEqual(pigz_file.workers, 2)
+        self.check_output(self.sources[0])
+
+    def test_fair_scheduling(self):
+        """
+        Test that jobs take turns on the workers, in the order they queued
+        """
+        order = []
+        release = threading.Event()
+        with PigzPool(workers=1) as pool:
+            blocker = pool.job()
+            blocker.apply_async(release.wait)
+            first, second = pool.job(), pool.job()
+            for number in range(3):
+                first.apply_async(order.append, (("first", number),))
+            for number in range(2):
+                second.apply_async(order.append, (("second", number),))
+            release.set()
+            for job in (blocker, first, second):
+                job.close()
+                job.join()
+
+        self.assertEqual(
+            order,
+            [("first", 0), ("second", 0), ("first", 1), ("second", 1), ("first", 2)],
+        )
+
+    def test_callbacks(self):
+        """
+        Test that results and errors reach their callbacks
+        """
+        results, errors = [], []
+        with PigzPool(workers=2) as pool:
+            job = pool.job()
+            job.apply_async(sum, ([1, 2],), callback=results.append)
+            job.apply_async(int, ("x",), error_callback=errors.append)
+            job.close()
+            job.join()
+            with self.assertRaises(ValueError):
+                job.apply_async(sum, ([],))
+
+        self.assertEqual(results, [3])
+        self.assertIsInstance(errors[0], ValueError)
+
+    def test_closed_pool(self):
+        """
+        Test that a closed pool takes no more work
+        """
+        pool = PigzPool(workers=1)
+        pool.close()
+        pool.join()
+
+        with self.assertRaises(ValueError):
+            pool.apply_async(sum, ([],))
+        with self.assertRaises(ValueError):
+            PigzPool(executor="fork")
+
+
+if __name__ == "__main__":
+    unittest.main()
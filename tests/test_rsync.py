@@ -0,0 +1,168 @@
+"""
+Unit tests for the Pigz Python rsyncable mode
+"""
+
+import gzip
+import io
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pigz_python.pigz_python as pigz_python
+from pigz_python import rsync
+from pigz_python.writer import PigzWriter
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+def naive_boundaries(data):
+    """pigz's rolling hash, one byte at a time."""
+    rolling_hash = 0
+    boundaries = []
+    for position, byte in enumerate(data):
+        rolling_hash = ((rolling_hash << 1) ^ byte) & rsync.RSYNC_MASK
+        if rolling_hash == rsync.RSYNC_HIT:
+            boundaries.append(position + 1)
+    return boundaries
+
+
+class TestRsync(unittest.TestCase):
+    """Unit tests for rsyncable output"""
+
+    def setUp(self):
+        """
+        Create a test file of shuffled words, so chunks don't repeat.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        words = Path("tests", LOREM_IPSUM_FILE).read_bytes().split()
+        rng = random.Random(0)
+        self.data = b" ".join(rng.choice(words) for _ in range(100000))
+        self.source = Path(self.temp_dir, "input.txt")
+        self.output = Path(self.temp_dir, "input.txt.gz")
+
+    def compress(self, data, **options):
+        """Compress `data` to the output file and return the output."""
+        self.source.write_bytes(data)
+        pigz_python.compress_file(self.source, **options)
+        output = self.output.read_bytes()
+        self.assertEqual(gzip.decompress(output), data)
+        return output
+
+    @staticmethod
+    def common_suffix(first, second):
+        """Length of the common suffix of two outputs, ignoring trailers."""
+        first, second = first[:-8], second[:-8]
+        length = 0
+        while length < min(len(first), len(second)):
+            if first[-1 - length] != second[-1 - length]:
+                break
+            length += 1
+        return length
+
+    def test_boundaries(self):
+        """
+        Test that the batched hash matches pigz's byte by byte
+        """
+        data = random.Random(1).randbytes(100000)
+
+        self.assertEqual(rsync.rsync_boundaries(data), naive_boundaries(data))
+        self.assertEqual(rsync.rsync_boundaries(self.data), naive_boundaries(self.data))
+
+    def test_boundaries_context(self):
+        """
+        Test that boundaries are the same whatever span the data is split at
+        """
+        expected = naive_boundaries(self.data)
+
+        for split in (1, 5, 30000):
+            boundaries = rsync.rsync_boundaries(self.data[split:], self.data[:split])
+            self.assertEqual(
+                [split + boundary for boundary in boundaries],
+                [boundary for boundary in expected if boundary > split],
+            )
+
+    def test_last_boundary(self):
+        """
+        Test finding the last boundary, over several scan spans
+        """
+        expected = naive_boundaries(self.data[:100000])
+
+        self.assertEqual(rsync.last_rsync_boundary(self.data[:100000]), expected[-1])
+        # Only the bytes after `start` are scanned
+        self.assertEqual(
+            rsync.last_rsync_boundary(self.data[:100000], start=expected[-2]),
+            expected[-1],
+        )
+        self.assertIsNone(
+            rsync.last_rsync_boundary(self.data[:100000], start=expected[-1])
+        )
+        self.assertIsNone(rsync.last_rsync_boundary(bytes(100000)))
+        self.assertIsNone(rsync.last_rsync_boundary(b""))
+
+    def test_resync_after_insertion(self):
+        """
+        Test that the output resyncs after a byte is inserted near the start
+        """
+        edited = self.data[:5000] + b"!" + self.data[5000:]
+
+        original = self.compress(self.data, blocksize=32, rsyncable=True)
+        changed = self.compress(edited, blocksize=32, rsyncable=True)
+        self.assertGreater(self.common_suffix(original, changed), len(original) // 2)
+
+        original = self.compress(self.data, blocksize=32)
+        changed = self.compress(edited, blocksize=32)
+        self.assertLess(self.common_suffix(original, changed), 100)
+
+    def test_chunk_sizes(self):
+        """
+        Test that chunks end at boundaries and never exceed the block size
+        """
+        self.source.write_bytes(self.data + bytes(100000))
+        pigz_file = pigz_python.PigzFile(self.source, blocksize=16, rsyncable=True)
+        sizes = []
+        emit_chunk = pigz_file.emit_chunk
+
+        def record_chunk(chunk, is_last):
+            sizes.append(len(chunk))
+            emit_chunk(chunk, is_last)
+
+        pigz_file.emit_chunk = record_chunk
+        pigz_file.process_compression_target()
+
+        self.assertEqual(sum(sizes), len(self.data) + 100000)
+        self.assertLessEqual(max(sizes), 16000)
+        # Each chunk ends at a boundary, or is cut at the block size when
+        # there is none
+        boundaries = set(naive_boundaries(self.data))
+        end = 0
+        for size in sizes[:-1]:
+            end += size
+            if size < 16000:
+                self.assertIn(end, boundaries)
+        # No boundaries in the zeros, so they're cut at the block size
+        self.assertIn(16000, sizes[-5:])
+
+    def test_writer_and_bgzf(self):
+        """
+        Test rsyncable output through PigzWriter, and as BGZF
+        """
+        sink = io.BytesIO()
+        with PigzWriter(sink, rsyncable=True, bgzf=True) as writer:
+            for start in range(0, len(self.data), 1000):
+                end = start + 1000
+                writer.write(self.data[start:end])
+
+        self.assertEqual(gzip.decompress(sink.getvalue()), self.data)
+
+    def test_empty_file(self):
+        """
+        Test an empty file in rsyncable mode
+        """
+        self.compress(b"", rsyncable=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Unit tests for the output sink
+"""
+
+import gzip
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from threading import Thread
+from unittest.mock import patch
+
+from pigz_python import PigzWriter, compress_file
+from pigz_python.sink import OutputSink
+
+LOREM_IPSUM = Path("tests", "lorem_ipsum.txt")
+
+
+class TestOutputSink(unittest.TestCase):
+    """Unit tests for OutputSink"""
+
+    def test_coalesces_writes(self):
+        """
+        Test that pieces are buffered and written in one writev call
+        """
+        read_fd, write_fd = os.pipe()
+        try:
+            sink = OutputSink(write_fd, buffer_size=1000)
+            with patch("os.writev", wraps=os.writev) as writev:
+                for piece in (b"a" * 300, b"b" * 300, b"c" * 300):
+                    sink.write(piece)
+                writev.assert_not_called()
+                sink.write(b"d" * 300)
+                writev.assert_called_once()
+                self.assertEqual(len(writev.call_args[0][1]), 4)
+            self.assertEqual(sink.buffered, 0)
+            sink.close()
+            self.assertEqual(
+                os.read(read_fd, 2000),
+                b"a" * 300 + b"b" * 300 + b"c" * 300 + b"d" * 300,
+            )
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def test_partial_writes(self):
+        """
+        Test that what a short writev left out is written by the next call
+        """
+        written = []
+
+        def short_writev(_, pieces):
+            # Take at most 5 bytes per call
+            data = b"".join(bytes(piece) for piece in pieces)[:5]
+            written.append(data)
+            return len(data)
+
+        sink = OutputSink(-1, buffer_size=0)
+        with patch("os.writev", short_writev):
+            sink.write(b"abc")
+            sink.write(b"defghijkl")
+        self.assertEqual(b"".join(written), b"abcdefghijkl")
+
+    def test_file_object(self):
+        """
+        Test that buffered pieces reach a file object joined, on flush
+        """
+        output = io.BytesIO()
+        sink = OutputSink(output)
+        sink.write(b"abc")
+        sink.write(b"def")
+        self.assertEqual(output.getvalue(), b"")
+        sink.close()
+        self.assertEqual(output.getvalue(), b"abcdef")
+        self.assertFalse(output.closed)
+
+    def test_path_is_owned(self):
+        """
+        Test that a path is created, and closed with the sink
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir, "out.bin")
+            sink = OutputSink(path)
+            sink.write(b"data")
+            sink.close()
+            self.assertEqual(path.read_bytes(), b"data")
+            with self.assertRaises(OSError):
+                os.fstat(sink.fd)
+
+
+class TestOutputTargets(unittest.TestCase):
+    """Tests of compressing to other outputs than a file next to the input"""
+
+    def test_compress_file_to_pipe(self):
+        """
+        Test compressing a file into a pipe read by another thread
+        """
+        read_fd, write_fd = os.pipe()
+        received = []
+        with os.fdopen(read_fd, "rb") as reader:
+            reading = Thread(target=lambda: received.append(reader.read()))
+            reading.start()
+            try:
+                compress_file(LOREM_IPSUM, blocksize=1, workers=2, output_file=write_fd)
+            finally:
+                os.close(write_fd)
+            reading.join()
+        self.assertEqual(gzip.decompress(received[0]), LOREM_IPSUM.read_bytes())
+
+    def test_writer_to_fd(self):
+        """
+        Test that PigzWriter writes to a file descriptor and leaves it open
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir, "out.gz")
+            with open(path, "wb") as output:
+                with PigzWriter(output.fileno(), blocksize=1) as writer:
+                    writer.write(LOREM_IPSUM.read_bytes())
+                self.assertFalse(output.closed)
+            self.assertEqual(
+                gzip.decompress(path.read_bytes()), LOREM_IPSUM.read_bytes()
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Unit tests for the Pigz Python runtime metrics
+"""
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pigz_python.pigz_python as pigz_python
+from pigz_python import stats as pigz_stats
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """Unit tests for LatencyHistogram class"""
+
+    def test_record_and_percentile(self):
+        """
+        Test that durations land in their buckets and percentiles use them
+        """
+        histogram = pigz_stats.LatencyHistogram(bounds=(0.001, 0.01, 0.1))
+        for seconds in (0.0005, 0.0005, 0.005, 0.05, 1.0):
+            histogram.record(seconds)
+
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.percentile(40), 0.001)
+        self.assertEqual(histogram.percentile(60), 0.01)
+        self.assertEqual(histogram.percentile(100), 1.0)
+        self.assertAlmostEqual(histogram.mean, 1.056 / 5)
+
+    def test_empty(self):
+        """
+        Test that an empty histogram reports zeros
+        """
+        histogram = pigz_stats.LatencyHistogram()
+
+        self.assertEqual(histogram.mean, 0.0)
+        self.assertEqual(histogram.percentile(99), 0.0)
+
+
+class TestCompressionStats(unittest.TestCase):
+    """Unit tests for the stats, progress and trace of a compression"""
+
+    def setUp(self):
+        """
+        Copy the lorem ipsum text into a temp directory.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.source = Path(self.temp_dir, LOREM_IPSUM_FILE)
+        shutil.copy(Path("tests", LOREM_IPSUM_FILE), self.source)
+        self.size = self.source.stat().st_size
+
+    def test_stats_after_compression(self):
+        """
+        Test that compress_file returns stats matching the output
+        """
+        stats = pigz_python.compress_file(self.source, blocksize=1, workers=2)
+
+        output_size = Path(str(self.source) + ".gz").stat().st_size
+        chunks = -(-self.size // 1000)
+        self.assertEqual(stats.bytes_in, self.size)
+        self.assertEqual(stats.bytes_out, output_size)
+        self.assertEqual(stats.chunks_in, chunks)
+        self.assertEqual(stats.chunks_out, chunks)
+        self.assertEqual(stats.block_latency.count, chunks)
+        self.assertGreater(stats.compress_seconds, 0)
+        self.assertGreater(stats.write_seconds, 0)
+        self.assertGreater(stats.read_seconds, 0)
+        self.assertLessEqual(stats.max_queue_depth, 2 * 4)
+        self.assertIsNotNone(stats.finished)
+        json.dumps(stats.as_dict())
+
+    def test_progress_callback(self):
+        """
+        Test that progress is reported after every chunk, in order
+        """
+        reported = []
+
+        def progress(stats):
+            reported.append((stats.chunks_out, stats.bytes_in))
+
+        pigz_python.compress_file(
+            self.source, blocksize=1, workers=2, progress=progress
+        )
+
+        chunks = -(-self.size // 1000)
+        self.assertEqual([chunk for chunk, _ in reported], list(range(1, chunks + 1)))
+        self.assertEqual(reported[-1][1], self.size)
+
+    def test_progress_callback_error_aborts(self):
+        """
+        Test that an exception raised by the callback fails compression
+        """
+
+        def progress(_stats):
+            raise ValueError("stop")
+
+        with self.assertRaises(ValueError):
+            pigz_python.compress_file(self.source, blocksize=1, progress=progress)
+
+    def test_chrome_trace(self):
+        """
+        Test that the trace has a compress and a write span for every chunk
+        """
+        trace_file = Path(self.temp_dir, "trace.json")
+
+        pigz_python.compress_file(
+            self.source, blocksize=1, workers=2, trace_file=trace_file
+        )
+
+        events = json.loads(trace_file.read_text(encoding="utf-8"))["traceEvents"]
+        chunks = -(-self.size // 1000)
+        for name in ("submit", "compress", "write"):
+            spans = [event for event in events if event["name"] == name]
+            self.assertEqual(
+                sorted(span["args"]["chunk"] for span in spans),
+                list(range(1, chunks + 1)),
+            )
+            self.assertTrue(all(span["dur"] >= 0 for span in spans))
+        thread_names = {event["args"]["name"] for event in events if event["ph"] == "M"}
+        self.assertTrue({"reader", "worker", "writer"} <= thread_names)
+
+
+if __name__ == "__main__":
+    unittest.main()
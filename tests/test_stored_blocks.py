@@ -0,0 +1,143 @@
+"""
+Unit tests for storing incompressible chunks without deflating them
+"""
+
+import gzip
+import random
+import shutil
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+
+import pigz_python.pigz_python as pigz_python
+from pigz_python import workers
+from pigz_python.writer import PigzWriter
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+class TestStoredBlocks(unittest.TestCase):
+    """Unit tests for incompressible chunk detection"""
+
+    def setUp(self):
+        """
+        Create random (incompressible) and text data.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.random = random.Random(0).randbytes(256000)
+        self.text = Path("tests", LOREM_IPSUM_FILE).read_bytes() * 60
+        self.source = Path(self.temp_dir, "input.bin")
+        self.output = Path(self.temp_dir, "input.bin.gz")
+
+    def test_byte_entropy(self):
+        """
+        Test the entropy of some simple byte strings
+        """
+        self.assertEqual(workers.byte_entropy(b""), 0.0)
+        self.assertEqual(workers.byte_entropy(b"aaaa"), 0.0)
+        self.assertAlmostEqual(workers.byte_entropy(bytes(range(256))), 8.0)
+        self.assertAlmostEqual(workers.byte_entropy(b"abab"), 1.0)
+
+    def test_is_incompressible(self):
+        """
+        Test which chunks are found incompressible
+        """
+        self.assertTrue(workers.is_incompressible(self.random[:128000]))
+        self.assertTrue(workers.is_incompressible(memoryview(self.random)))
+        self.assertFalse(workers.is_incompressible(self.text[:128000]))
+        self.assertFalse(workers.is_incompressible(bytes(128000)))
+        # Too small to sample
+        self.assertFalse(workers.is_incompressible(self.random[:1000]))
+        # Mostly random, but ending in text deflate can shrink
+        self.assertFalse(
+            workers.is_incompressible(self.random[:120000] + self.text[:8000])
+        )
+
+    def test_repeats_are_deflated(self):
+        """
+        Test that random data deflate can shrink by repeats within its
+        window, of the chunk itself or of the dictionary, isn't stored
+        """
+        repeated = self.random[:16384] * 64
+        self.assertFalse(workers.is_incompressible(repeated[:128000]))
+
+        zdict = self.random[-32768:]
+        chunk = self.random[:2048] + zdict[-10240:-8192] + self.random[4096:16384]
+        self.assertTrue(workers.is_incompressible(chunk))
+        self.assertFalse(workers.is_incompressible(chunk, zdict))
+
+    def test_compress_repeated_random(self):
+        """
+        Test that repeated random data compresses as well as with every
+        chunk deflated
+        """
+        repeated = self.random[:16384] * 64
+
+        compressed = pigz_python.compress_bytes(repeated)
+        deflated = pigz_python.compress_bytes(repeated, store_incompressible=False)
+
+        self.assertEqual(gzip.decompress(compressed), repeated)
+        self.assertLessEqual(len(compressed), len(deflated) + 100)
+        self.assertLess(len(compressed), len(repeated) // 20)
+
+    def test_store_block(self):
+        """
+        Test that stored chunks append like deflated ones
+        """
+        first = workers.store_block(self.random[:50000], False)
+        last = workers.compress_block(self.text, 9, True)
+
+        inflated = zlib.decompress(first + last, -zlib.MAX_WBITS)
+
+        self.assertEqual(inflated, self.random[:50000] + self.text)
+        self.assertLess(len(first), 50100)
+
+    def test_compress_file(self):
+        """
+        Test that incompressible chunks of a mixed file are stored and counted
+        """
+        data = self.text + self.random + self.text
+        self.source.write_bytes(data)
+
+        stats = pigz_python.compress_file(self.source, blocksize=64, workers=2)
+        stored_size = self.output.stat().st_size
+
+        self.assertEqual(gzip.decompress(self.output.read_bytes()), data)
+        self.assertEqual(stats.stored_blocks, 3)
+        self.assertEqual(stats.as_dict()["stored_blocks"], 3)
+
+        stats = pigz_python.compress_file(
+            self.source, blocksize=64, workers=2, store_incompressible=False
+        )
+
+        self.assertEqual(gzip.decompress(self.output.read_bytes()), data)
+        self.assertEqual(stats.stored_blocks, 0)
+        # Deflating the random data gains nothing
+        self.assertLessEqual(stored_size, self.output.stat().st_size + 100)
+
+    def test_process_executor(self):
+        """
+        Test that worker processes store incompressible chunks too
+        """
+        self.source.write_bytes(self.random)
+
+        stats = pigz_python.compress_file(self.source, executor="process", workers=2)
+
+        self.assertEqual(gzip.decompress(self.output.read_bytes()), self.random)
+        self.assertEqual(stats.stored_blocks, 2)
+
+    def test_writer(self):
+        """
+        Test storing incompressible chunks through PigzWriter, last one included
+        """
+        with PigzWriter(self.output, blocksize=64) as writer:
+            writer.write(self.random)
+
+        self.assertEqual(gzip.decompress(self.output.read_bytes()), self.random)
+        self.assertEqual(writer.stats.stored_blocks, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Unit tests for the Pigz Python automatic tuning
+"""
+
+import gzip
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pigz_python.pigz_python as pigz_python
+from pigz_python import tuning
+from pigz_python.workers import InlinePool
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+class TestEffectiveCpuCount(unittest.TestCase):
+    """Unit tests for effective_cpu_count"""
+
+    def setUp(self):
+        """
+        Create a fake cgroup filesystem in a temp directory.
+        """
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+    def patch_cgroup(self, cpu_max=None, quota=None, period=None):
+        """Point the tuning module at fake cgroup v2 or v1 files."""
+        cpu_max_file = self.temp_dir / "cpu.max"
+        if cpu_max is not None:
+            cpu_max_file.write_text(cpu_max, encoding="ascii")
+        v1_dir = self.temp_dir / "cpu"
+        v1_dir.mkdir()
+        if quota is not None:
+            (v1_dir / "cpu.cfs_quota_us").write_text(quota, encoding="ascii")
+            (v1_dir / "cpu.cfs_period_us").write_text(period, encoding="ascii")
+        for name, value in (
+            ("_CGROUP_V2_CPU_MAX", cpu_max_file),
+            ("_CGROUP_V1_CPU", v1_dir),
+        ):
+            patcher = patch.object(tuning, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch("os.sched_getaffinity", create=True, return_value={0, 1, 2, 3, 4, 5})
+    def test_cgroup_v2_quota(self, _):
+        """
+        Test that a cgroup v2 quota of 1.5 CPUs limits us to 2
+        """
+        self.patch_cgroup(cpu_max="150000 100000\n")
+
+        self.assertEqual(tuning.effective_cpu_count(), 2)
+
+    @patch("os.sched_getaffinity", create=True, return_value={0, 1, 2})
+    def test_cgroup_v2_unlimited(self, _):
+        """
+        Test that without a quota the affinity mask decides
+        """
+        self.patch_cgroup(cpu_max="max 100000\n")
+
+        self.assertEqual(tuning.effective_cpu_count(), 3)
+
+    @patch("os.sched_getaffinity", create=True, return_value=set(range(16)))
+    def test_cgroup_v1_quota(self, _):
+        """
+        Test that a cgroup v1 CFS quota is honoured
+        """
+        self.patch_cgroup(quota="400000\n", period="100000\n")
+
+        self.assertEqual(tuning.effective_cpu_count(), 4)
+
+    @patch("os.sched_getaffinity", create=True, return_value=set(range(8)))
+    def test_no_cgroup(self, _):
+        """
+        Test that missing cgroup files are ignored
+        """
+        self.patch_cgroup()
+
+        self.assertEqual(tuning.effective_cpu_count(), 8)
+
+
+@patch.object(tuning, "effective_cpu_count", return_value=8)
+class TestChooseSettings(unittest.TestCase):
+    """Unit tests for choose_settings"""
+
+    def test_small_input_is_serial(self, _):
+        """
+        Test that a small input is compressed on one thread
+        """
+        self.assertEqual(
+            tuning.choose_settings(50_000, 9),
+            (tuning.AUTO_MAX_BLOCK_SIZE_KB, 1, True),
+        )
+
+    @patch.object(tuning, "measure_throughput", return_value=20e6)
+    def test_large_input_uses_all_cpus(self, *_):
+        """
+        Test that a large input gets every CPU and several blocks per worker
+        """
+        blocksize, workers, serial = tuning.choose_settings(16_000_000, 9, sample=b"x")
+
+        self.assertFalse(serial)
+        self.assertEqual(workers, 8)
+        self.assertEqual(blocksize, 16_000_000 // (8 * 4) // 1000)
+
+    @patch.object(tuning, "measure_throughput", return_value=1e9)
+    def test_fast_input_is_serial(self, *_):
+        """
+        Test that an input one core gets through quickly is not split up
+        """
+        self.assertTrue(tuning.choose_settings(4_000_000, 1, sample=b"x")[2])
+
+    def test_explicit_values_are_kept(self, _):
+        """
+        Test that only "auto" values are chosen
+        """
+        self.assertEqual(tuning.choose_settings(50_000, 9, blocksize=32)[0], 32)
+        self.assertEqual(tuning.choose_settings(50_000, 9, workers=3)[1], 3)
+
+    def test_unknown_size(self, _):
+        """
+        Test that an input of unknown size gets every CPU
+        """
+        self.assertEqual(
+            tuning.choose_settings(None, 9),
+            (tuning.AUTO_UNKNOWN_SIZE_BLOCK_SIZE_KB, 8, False),
+        )
+
+
+class TestAutoCompression(unittest.TestCase):
+    """Unit tests for compressing with "auto" settings"""
+
+    def test_compress_small_file_serially(self):
+        """
+        Test that a small file is compressed without a pool, correctly
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory, LOREM_IPSUM_FILE)
+            shutil.copy(Path("tests", LOREM_IPSUM_FILE), source)
+
+            pigz_file = pigz_python.PigzFile(source, blocksize="auto", workers="auto")
+            self.assertIsInstance(pigz_file.pool, InlinePool)
+            pigz_file.process_compression_target()
+
+            with gzip.open(str(source) + ".gz") as compressed:
+                self.assertEqual(compressed.read(), source.read_bytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
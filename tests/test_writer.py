@@ -0,0 +1,125 @@
+"""
+Unit tests for the Pigz Python streaming writer
+"""
+
+import gzip
+import io
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pigz_python.pigz_python as pigz_python
+from pigz_python import writer as pigz_writer
+from pigz_python.pool import PigzPool
+
+LOREM_IPSUM_FILE = "lorem_ipsum.txt"
+
+
+class TestPigzWriter(unittest.TestCase):
+    """Unit tests for PigzWriter class"""
+
+    def setUp(self):
+        """
+        Load the lorem ipsum text used as test data.
+        """
+        self.data = Path("tests", LOREM_IPSUM_FILE).read_bytes()
+
+    def test_write_to_file_object(self):
+        """
+        Test that many small writes produce one valid gzip stream
+        """
+        sink = io.BytesIO()
+        with pigz_writer.PigzWriter(sink, blocksize=1, workers=4) as writer:
+            for start in range(0, len(self.data), 100):
+                end = start + 100
+                writer.write(self.data[start:end])
+            self.assertEqual(writer.tell(), len(self.data))
+
+        self.assertFalse(sink.closed)
+        self.assertEqual(gzip.decompress(sink.getvalue()), self.data)
+
+    def test_write_buffer_types(self):
+        """
+        Test that bytearray and memoryview writes are accepted
+        """
+        sink = io.BytesIO()
+        with pigz_writer.PigzWriter(sink, blocksize=1) as writer:
+            self.assertEqual(writer.write(bytearray(self.data[:10])), 10)
+            self.assertEqual(
+                writer.write(memoryview(self.data)[10:]), len(self.data) - 10
+            )
+
+        self.assertEqual(gzip.decompress(sink.getvalue()), self.data)
+
+    def test_write_nothing(self):
+        """
+        Test that closing straight away writes an empty gzip stream
+        """
+        sink = io.BytesIO()
+        pigz_writer.PigzWriter(sink).close()
+
+        self.assertEqual(gzip.decompress(sink.getvalue()), b"")
+
+    def test_write_to_path_sets_fname(self):
+        """
+        Test writing to a path, which is closed and named in the header
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output = Path(temp_dir, "data.txt.gz")
+            with patch("os.writev", wraps=os.writev) as writev:
+                with pigz_writer.PigzWriter(output, mtime=8675309) as writer:
+                    writer.write(self.data)
+            # The path is written through a file descriptor, not a file object
+            writev.assert_called()
+
+            with gzip.open(output, "rb") as result:
+                self.assertEqual(result.read(), self.data)
+            compressed = output.read_bytes()
+
+        self.assertEqual(compressed[3], pigz_python.FNAME)
+        self.assertEqual(compressed[4:8], (8675309).to_bytes(4, "little"))
+        self.assertEqual(compressed[10:19], b"data.txt\0")
+
+    def test_write_process_executor(self):
+        """
+        Test that the writer can compress on worker processes
+        """
+        sink = io.BytesIO()
+        with pigz_writer.PigzWriter(
+            sink, blocksize=1, workers=2, executor="process"
+        ) as writer:
+            writer.write(self.data)
+
+        self.assertEqual(gzip.decompress(sink.getvalue()), self.data)
+
+    def test_write_closed_pool(self):
+        """
+        Test that a pool refusing work is raised and stops the write thread
+        """
+        with PigzPool(workers=2) as pool:
+            pool.close()
+            writer = pigz_writer.PigzWriter(io.BytesIO(), blocksize=1, pool=pool)
+            with self.assertRaisesRegex(ValueError, "Pool not running"):
+                writer.write(self.data)
+            with self.assertRaisesRegex(ValueError, "Pool not running"):
+                writer.close()
+
+            self.assertTrue(writer.closed)
+            # The write thread is the only one keeping the process alive
+            self.assertEqual(
+                [thread for thread in threading.enumerate() if not thread.daemon],
+                [threading.main_thread()],
+            )
+
+    def test_write_after_close_raises(self):
+        """
+        Test that writing to a closed writer raises ValueError
+        """
+        writer = pigz_writer.PigzWriter(io.BytesIO())
+        writer.close()
+
+        with self.assertRaises(ValueError):
+            writer.write(b"too late")